@@ -4,6 +4,12 @@ import shutil
 import subprocess
 import re
 import configparser
+import datetime
+import sys
+
+# Shares the GUI's parallel folder remover
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gui'))
+from unlinker import DEFAULT_DELETE_WORKERS, remove_trees
 
 # CoolSync Backup
 # Console Version: v0.1.0
@@ -17,6 +23,11 @@ DEFAULT_SOURCE_DIR = config.get('DEFAULT', 'SOURCE_DIR', fallback='Your\\Default
 DEFAULT_DEST_DIR = config.get('DEFAULT', 'DEST_DIR', fallback='Your\\Default\\Destination\\Directory')
 DEFAULT_START_TEMP = 30  # Example start temperature in Celsius
 DEFAULT_STOP_TEMP = 47  # Updated default stop temperature in Celsius
+# Days deleted files stay in the destination's trash folder; empty deletes them at once
+QUARANTINE_DAYS = config.get('DEFAULT', 'QUARANTINE_DAYS', fallback='')
+TRASH_DIR = '.coolsync-trash'  # Same folder name the GUI daemon uses
+TRASH_RUN_FORMAT = '%Y-%m-%d_%H%M%S'
+DELETE_WORKERS = DEFAULT_DELETE_WORKERS  # Threads removing folders that vanished from the source
 
 # Function to get user input for directories and temperatures
 def get_user_input():
@@ -63,17 +74,66 @@ def get_drive_temperature(drive_letter):
         print(f"Error getting temperature for drive {drive_letter}: {e}")
         return None
 
+# Function to move a deleted file or folder into this run's trash folder (or delete it); False if it was left in place
+def remove_from_destination(path, dest_dir, trash_run_dir):
+    if trash_run_dir is not None:
+        target = os.path.join(trash_run_dir, os.path.relpath(path, dest_dir))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.rename(path, target)  # Same filesystem, so as fast for a folder as for a file
+            return True
+        except OSError as e:
+            # Never fall back to deleting: the trash is there so nothing is lost by mistake
+            print(f"Could not move {path} to the trash, leaving it in place: {e}")
+            return False
+    if os.path.isdir(path):
+        remove_trees([path], lambda: True, DELETE_WORKERS)
+    else:
+        os.remove(path)
+    return True
+
+# Function to purge trash folders older than QUARANTINE_DAYS, pausing while the drives are hot
+def purge_trash(dest_dir, days, drive_letters, stop_temp):
+    trash_dir = os.path.join(dest_dir, TRASH_DIR)
+    if not os.path.isdir(trash_dir):
+        return
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    for name in sorted(os.listdir(trash_dir)):
+        try:
+            if datetime.datetime.strptime(name, TRASH_RUN_FORMAT) >= cutoff:
+                continue
+        except ValueError:
+            continue
+        # Bottom-up, so a hot drive can pause the purge between folders
+        for root, dirs, files in os.walk(os.path.join(trash_dir, name), topdown=False):
+            while any((get_drive_temperature(drive_letter) or 0) >= stop_temp for drive_letter in drive_letters):
+                time.sleep(60)
+            for file in files:
+                os.remove(os.path.join(root, file))
+            os.rmdir(root)
+        print(f"Purged expired trash: {name}")
+
 # Function to perform mirror sync
 def mirror_sync(source_dir, dest_dir, script_dir):
     synced_files = []  # List to store the first 5 synced files and their status
+    trash_run_dir = None
+    if QUARANTINE_DAYS:
+        trash_run_dir = os.path.join(dest_dir, TRASH_DIR, datetime.datetime.now().strftime(TRASH_RUN_FORMAT))
+
+    directories = []  # (destination folder, source atime_ns, source mtime_ns), parents before children
 
     # Copy new and updated files from source to destination
     for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        files.sort()
+        # Each destination folder is created once, before anything is copied into it
+        dest_root = os.path.normpath(os.path.join(dest_dir, os.path.relpath(root, source_dir)))
+        os.makedirs(dest_root, exist_ok=True)
+        root_stat = os.stat(root)
+        directories.append((dest_root, root_stat.st_atime_ns, root_stat.st_mtime_ns))
         for file in files:
             src_file = os.path.join(root, file)
-            dest_file = os.path.join(dest_dir, os.path.relpath(src_file, source_dir))
-            dest_dir_path = os.path.dirname(dest_file)
-            os.makedirs(dest_dir_path, exist_ok=True)
+            dest_file = os.path.join(dest_root, file)
 
             if os.path.exists(dest_file):
                 # Check if the source file is newer than the destination file
@@ -90,18 +150,40 @@ def mirror_sync(source_dir, dest_dir, script_dir):
                 synced_files.append(f"{os.path.relpath(src_file, source_dir)} - {status}")
     
     # Delete files and directories from destination that are not in source
+    vanished = []  # Folders gone from the source, deleted as whole trees after the walk
+    skipped = []  # Entries that could not be moved to the trash and were left in place
     for root, dirs, files in os.walk(dest_dir):
+        if root == dest_dir and TRASH_DIR in dirs:
+            dirs.remove(TRASH_DIR)  # Never walk or delete the trash itself
         for file in files:
             dest_file = os.path.join(root, file)
             src_file = os.path.join(source_dir, os.path.relpath(dest_file, dest_dir))
             if not os.path.exists(src_file):
-                os.remove(dest_file)
+                if not remove_from_destination(dest_file, dest_dir, trash_run_dir):
+                    skipped.append(dest_file)
                 
-        for dir in dirs:
+        for dir in list(dirs):
             dest_dir_path = os.path.join(root, dir)
             src_dir_path = os.path.join(source_dir, os.path.relpath(dest_dir_path, dest_dir))
             if not os.path.exists(src_dir_path) and dest_dir_path != script_dir:
-                shutil.rmtree(dest_dir_path)
+                if trash_run_dir is not None:
+                    if not remove_from_destination(dest_dir_path, dest_dir, trash_run_dir):
+                        skipped.append(dest_dir_path)
+                else:
+                    vanished.append(dest_dir_path)
+                dirs.remove(dir)  # Gone, so os.walk must not descend into it
+    if vanished:
+        delete_started = time.monotonic()
+        deleted = remove_trees(vanished, lambda: True, DELETE_WORKERS)["files"]
+        seconds = time.monotonic() - delete_started
+        print(f"Deleted {len(vanished)} vanished folders with {deleted} files in {seconds:.1f}s ({deleted / max(seconds, 1e-6):.0f} files/s)")
+    if skipped:
+        print(f"Skipped {len(skipped)} entries that could not be moved to the trash; they are still in the destination")
+
+    # Copying and deleting changed the folder times; restore them once, children before parents
+    for dest_root, atime_ns, mtime_ns in reversed(directories):
+        if os.path.isdir(dest_root):
+            os.utime(dest_root, ns=(atime_ns, mtime_ns))
 
     # Print the first 5 files that were synced and their status
     print("First 5 files that were synced:")
@@ -167,6 +249,8 @@ def monitor_and_backup(source_dir, dest_dir, start_temp, stop_temp):
                     mirror_sync(source_dir, dest_dir, script_dir)
                     backup_in_progress = False
                     print("Backup process finished.")
+                    if QUARANTINE_DAYS:
+                        purge_trash(dest_dir, float(QUARANTINE_DAYS), drive_letters, stop_temp)
                     return  # Exit after backup completes
             elif temp >= stop_temp:
                 if backup_in_progress:
@@ -7,6 +7,7 @@ import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import configparser
+from logview import LogModel, LogView
 
 # CoolSync Backup
 # Version: v0.2.0
@@ -16,6 +17,7 @@ import configparser
 config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
 config = configparser.ConfigParser()
 config.read(config_path)
+log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CoolSyncBackup.log')
 
 DEFAULT_SOURCE_DIR = config.get('SETTINGS', 'SOURCE_DIR', fallback='Your/Default/Source/Directory').replace("\\", "/")
 DEFAULT_DEST_DIR = config.get('SETTINGS', 'DEST_DIR', fallback='Your/Default/Destination/Directory').replace("\\", "/")
@@ -34,9 +36,11 @@ class CoolSyncBackupApp:
         self.stop_temp = tk.DoubleVar(value=DEFAULT_STOP_TEMP)
         self.is_dark_mode = tk.BooleanVar(value=DEFAULT_DARK_MODE)
         self.stop_backup_flag = threading.Event()
+        self.log_model = LogModel(log_path)  # Recent lines in memory, the full history on disk
 
         self.create_widgets()
         self.apply_saved_mode()  # Apply the saved mode on initialization
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def create_widgets(self):
         self.style = ttk.Style()
@@ -68,8 +72,9 @@ class CoolSyncBackupApp:
         self.dark_mode_button.grid(row=5, column=2, padx=5, pady=5)
         self.update_checkbox_state()
 
-        self.log_text = tk.Text(self.root, state="disabled", width=80, height=10)
-        self.log_text.grid(row=6, column=0, columnspan=3, padx=5, pady=5)
+        self.log_view = LogView(self.root, self.log_model, height=10, width=80)
+        self.log_view.grid(row=6, column=0, columnspan=3, padx=5, pady=5)
+        self.log_text = self.log_view.text
 
     def apply_light_mode(self):
         self.root.config(bg="white")
@@ -150,11 +155,14 @@ class CoolSyncBackupApp:
             config.write(configfile)
         self.log("Settings saved successfully.")
 
-    def log(self, message):
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)  # Ensure the most recent log message is visible
-        self.log_text.config(state='disabled')
+    def log(self, message, level="INFO"):
+        # Safe from the backup thread; the view picks new lines up on its next refresh
+        self.log_model.append(message, level)
+
+    def on_closing(self):
+        self.stop_backup_flag.set()
+        self.log_model.close()
+        self.root.destroy()
 
     def stop_backup(self):
         self.stop_backup_flag.set()
@@ -173,10 +181,10 @@ class CoolSyncBackupApp:
         stop_temp = self.stop_temp.get()
 
         if not os.path.exists(source_dir):
-            self.log(f"Error: Source directory '{source_dir}' does not exist.")
+            self.log(f"Error: Source directory '{source_dir}' does not exist.", "ERROR")
             return
         if not os.path.exists(dest_dir):
-            self.log(f"Error: Destination directory '{dest_dir}' does not exist.")
+            self.log(f"Error: Destination directory '{dest_dir}' does not exist.", "ERROR")
             return
         
         drive_letters = self.get_drive_letters([source_dir, dest_dir])
@@ -189,7 +197,7 @@ class CoolSyncBackupApp:
                 for drive_letter in drive_letters:
                     temp = self.get_drive_temperature(drive_letter)
                     if temp is None:
-                        self.log(f"Error: Could not get the temperature for drive {drive_letter}.")
+                        self.log(f"Error: Could not get the temperature for drive {drive_letter}.", "ERROR")
                         return
                     
                     self.log(f"Current temperature for drive {drive_letter}: {temp}°C")
@@ -205,7 +213,7 @@ class CoolSyncBackupApp:
                             return  # Exit after backup completes
                     elif temp >= stop_temp:
                         if backup_in_progress:
-                            self.log("Temperature is too high. Pausing backup...")
+                            self.log("Temperature is too high. Pausing backup...", "WARNING")
                             backup_in_progress = False
                         self.log("Waiting for temperature to drop within the User specified safe range...")
 
@@ -237,7 +245,7 @@ class CoolSyncBackupApp:
                     else:
                         raise Exception("Temperature value not found")
         except Exception as e:
-            self.log(f"Error getting temperature for drive {drive_letter}: {e}")
+            self.log(f"Error getting temperature for drive {drive_letter}: {e}", "ERROR")
             return None
 
     def mirror_sync(self, source_dir, dest_dir):
@@ -1,176 +1,74 @@
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, simpledialog
 import threading
-import queue
-import os
-import shutil
-import subprocess
 import json
+from coolsync_client import DaemonClient, ensure_daemon
+from metrics import format_duration
+from settings import CONFIG_FILE, find_job, load_config, update_config
+from ui_bridge import UIBridge
 
-CONFIG_FILE = "config.json"
-
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as file:
-            config = json.load(file)
-            return config
-    return {"source_folder": "", "destination_folder": "", "safe_temp": 31.0, "high_temp": 42.0, "monitor_interval": 1}
-
-def save_config(config):
-    with open(CONFIG_FILE, 'w') as file:
-        json.dump(config, file)
-
-def run_smartctl_command(command, device_name):
-    try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        temperature = None
-        model_number = device_name  # Default to device name if model number is not found
-        for line in result.stdout.splitlines():
-            if "Temperature_Celsius" in line:
-                temp_str = line.split()[-1]
-                if temp_str == '-' or not temp_str.replace('.', '', 1).isdigit():
-                    continue
-                try:
-                    temperature = float(temp_str)
-                except ValueError:
-                    pass
-            elif device_name == "/dev/sda" and "Model Number" in line:
-                model_number = ' '.join(line.split()[2:])  # Extract model number for /dev/sda
-            elif device_name == "/dev/sdb" and "Device Model" in line:
-                model_number = ' '.join(line.split()[2:])  # Extract device model for /dev/sdb
-            elif "Temperature" in line:  # Try alternative keyword for temperature
-                temp_str = line.split()[-2]
-                if temp_str.isdigit():
-                    try:
-                        temperature = float(temp_str)
-                    except ValueError:
-                        pass
-        return temperature, model_number
-    except Exception as e:
-        print(f'Error fetching data with command {command}: {e}')
-    return None, device_name  # Default to device name if there's an error
-
-def get_specific_device_temperatures():
-    temperatures = {}
-    commands = {
-        "/dev/sda": ["smartctl", "-A", "/dev/sda"],
-        "/dev/sdb": ["smartctl", "-A", "/dev/sdb"]
-    }
-    for device, command in commands.items():
-        temp, model = run_smartctl_command(command, device)
-        if temp is None:
-            temperatures[model] = 'N/A'
-        else:
-            temperatures[model] = temp
-    return temperatures
-
-def sync_files(source, destination, stop_event, app, queue):
-    app.update_status("Sync in progress...")
-
-    while not stop_event.is_set():
-        temperatures = get_specific_device_temperatures()
-        safe_temp = queue.get()  # Get safe_temp from the queue
-        high_temp = queue.get()  # Get high_temp from the queue
-        
-        safe_temp_met = all(temp <= safe_temp for temp in temperatures.values() if temp != 'N/A')
-        high_temp_met = any(temp >= high_temp for temp in temperatures.values() if temp != 'N/A')
-
-        if high_temp_met:
-            app.update_status("High temperature detected. Pausing sync.")
-            while high_temp_met:
-                if stop_event.is_set():
-                    app.update_status("Sync stopped by user")
-                    return
-                temperatures = get_specific_device_temperatures()
-                high_temp_met = any(temp >= high_temp for temp in temperatures.values() if temp != 'N/A')
-            app.update_status("Temperature dropped to safe level. Resuming sync.")
-
-        if not safe_temp_met:
-            app.update_status("Safe temperature not met. Waiting to start sync.")
-            while not safe_temp_met:
-                if stop_event.is_set():
-                    app.update_status("Sync stopped by user")
-                    return
-                temperatures = get_specific_device_temperatures()
-                safe_temp_met = all(temp <= safe_temp for temp in temperatures.values() if temp != 'N/A')
-            app.update_status("Safe temperature met. Starting sync.")
-
-        sync_performed = False
-        file_count = 0  # Counter for the number of synced files
-
-        # Add or update files from source to destination
-        for root_dir, dirs, files in os.walk(source):
-            if stop_event.is_set():
-                app.update_status("Sync stopped by user")
-                return
-            dest_dir = root_dir.replace(source, destination)
-            if not os.path.exists(dest_dir):
-                os.makedirs(dest_dir)
-            for file in files:
-                if stop_event.is_set():
-                    app.update_status("Sync stopped by user")
-                    return
-                src_file = os.path.join(root_dir, file)
-                dest_file = os.path.join(dest_dir, file)
-                if not os.path.exists(dest_file) or os.path.getmtime(src_file) > os.path.getmtime(dest_file):
-                    shutil.copy2(src_file, dest_file)
-                    sync_performed = True
-                    file_count += 1  # Increment file count
-
-        # Remove files from destination that no longer exist in source
-        for root_dir, dirs, files in os.walk(destination):
-            if stop_event.is_set():
-                app.update_status("Sync stopped by user")
-                return
-            src_dir = root_dir.replace(destination, source)
-            for file in files:
-                if stop_event.is_set():
-                    app.update_status("Sync stopped by user")
-                    return
-                dest_file = os.path.join(root_dir, file)
-                src_file = os.path.join(src_dir, file)
-                if not os.path.exists(src_file):
-                    os.remove(dest_file)
-                    sync_performed = True
-
-        if sync_performed:
-            app.update_status(f"Sync completed successfully.\nSource: {source}\nDestination: {destination}\nFiles synced: {file_count}")
-        else:
-            app.update_status("No files to sync or already synced")
-
-        # Wait for the monitor interval before checking temperatures again
-        stop_event.wait(app.monitor_interval.get() * 60)
+# The sync itself runs in coolsyncd; this window is a client of it and can be
+# closed without stopping a backup.
+
+SPARKLINE_WIDTH = 160
+SPARKLINE_HEIGHT = 24
 
 class CoolSyncBackup:
     def __init__(self, root):
         self.root = root
         self.root.title('CoolSyncBackup - Storage Sync and Temp Monitor')
-        self.root.geometry('400x500')
+        self.root.geometry('420x800')
 
         config = load_config()
 
-        # Load source and destination folders from config
-        self.source_folder = tk.StringVar(value=config.get('source_folder', ''))
-        self.destination_folder = tk.StringVar(value=config.get('destination_folder', ''))
-        self.safe_temp = tk.DoubleVar(value=config.get('safe_temp', 31.0))
-        self.high_temp = tk.DoubleVar(value=config.get('high_temp', 42.0))
+        # Sync jobs; the folder fields below edit the selected one
+        self.jobs = config['jobs'] or [{"name": "default", "source_folder": "", "destination_folder": ""}]
+        self.selected_job = tk.StringVar(value=self.jobs[0]['name'])
+        self.source_folder = tk.StringVar()
+        self.destination_folder = tk.StringVar()
+        self.select_job(self.selected_job.get())
+        self.devices = config['devices']  # Per-device mount and safe/high temperatures
+        self.selected_device = tk.StringVar(value=next(iter(self.devices)))
+        self.device_mount = tk.StringVar()
+        self.safe_temp = tk.DoubleVar()
+        self.high_temp = tk.DoubleVar()
+        self.select_device(self.selected_device.get())
         self.monitor_interval = tk.IntVar(value=config.get('monitor_interval', 1))
         self.device_temps = {}  # Store current temperatures for all devices
-        self.sync_in_progress = False
-        self.sync_thread = None
-        self.stop_event = threading.Event()  # Stop event for clean stopping
-        self.queue = queue.Queue()  # Create a queue to communicate with the sync thread
+        self.io_pool = None  # Config writes and daemon requests, kept off the Tk main loop
+        self.client = DaemonClient()
+        self.disconnect_event = threading.Event()  # Ends the daemon subscription on close
+        self.latest_metrics = None
+
+        # Worker threads post here; only the Tk main loop touches widgets
+        self.bridge = UIBridge(self.root)
+        self.bridge.register('status', self.show_status)
+        self.bridge.register('temperatures', self.show_temperatures)
+        self.bridge.register('metrics', self.show_metrics)
 
         # Define the temp_display widget
         self.temp_display = tk.Text(self.root, height=10, state='disabled')
         self.temp_display.pack()
 
         self.create_widgets()
-        self.update_temperature_display()  # Start updating the temperature display
+        self.bridge.start()
+        # Paint placeholders now; readings arrive from the daemon once it is connected
+        self.show_temperatures({device: '--' for device in self.devices})
+        self.root.after_idle(self.connect_to_daemon)
+        self.update_latency_display()
+        self.update_dashboard()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)  # Handle window close event
 
     def create_widgets(self):
+        # Job whose folders are being edited
+        tk.Label(self.root, text='Job').pack()
+        job_frame = tk.Frame(self.root)
+        job_frame.pack()
+        self.job_menu = tk.OptionMenu(job_frame, self.selected_job, *[job['name'] for job in self.jobs], command=self.select_job)
+        self.job_menu.pack(side=tk.LEFT)
+        tk.Button(job_frame, text='New Job', command=self.new_job).pack(side=tk.LEFT)
+
         # Source Folder
         tk.Label(self.root, text='Source Folder').pack()
         frame_source = tk.Frame(self.root)
@@ -187,6 +85,16 @@ class CoolSyncBackup:
         self.destination_folder_display.pack(side=tk.LEFT)
         tk.Button(frame_destination, text='Browse', command=self.browse_destination).pack(side=tk.LEFT)
 
+        # Device whose mount and temperature limits are being edited
+        tk.Label(self.root, text='Device').pack()
+        tk.OptionMenu(self.root, self.selected_device, *self.devices, command=self.select_device).pack()
+
+        tk.Label(self.root, text='Device Mount / Drive').pack()
+        mount_frame = tk.Frame(self.root)
+        mount_frame.pack()
+        tk.Entry(mount_frame, textvariable=self.device_mount).pack(side=tk.LEFT)
+        tk.Button(mount_frame, text='💾', command=self.save_device_mount).pack(side=tk.LEFT)
+
         # Safe and High Temps
         tk.Label(self.root, text='Safe Temp (°C)').pack()
         temp_frame = tk.Frame(self.root)
@@ -215,23 +123,69 @@ class CoolSyncBackup:
         tk.Button(self.root, text='Start Sync', command=self.start_sync).pack()
         tk.Button(self.root, text='Stop Sync', command=self.stop_sync).pack()
 
+        # Dashboard: rolling throughput, remaining work and temperature history
+        dashboard = tk.LabelFrame(self.root, text='Dashboard')
+        dashboard.pack(fill=tk.X, padx=5, pady=5)
+        self.throughput_label = tk.Label(dashboard, text='Throughput: --')
+        self.throughput_label.pack(anchor=tk.W)
+        self.remaining_label = tk.Label(dashboard, text='Remaining: --')
+        self.remaining_label.pack(anchor=tk.W)
+        self.eta_label = tk.Label(dashboard, text='ETA: --')
+        self.eta_label.pack(anchor=tk.W)
+        self.sparkline_frame = tk.Frame(dashboard)
+        self.sparkline_frame.pack(fill=tk.X)
+        self.sparklines = {}  # Device -> canvas
+
+        self.latency_label = tk.Label(self.root, text='', fg='grey')
+        self.latency_label.pack()
+
     def update_status(self, message):
+        # Called from worker threads as well; the bridge hands it to the main loop
+        self.bridge.post('status', message)
+
+    def show_status(self, message):
         self.status.set(f"Status: {message}")
 
+    def select_job(self, name):
+        job = find_job(self.jobs, name)
+        self.source_folder.set(job['source_folder'])
+        self.destination_folder.set(job['destination_folder'])
+
+    def new_job(self):
+        name = simpledialog.askstring('New Job', 'Job name:', parent=self.root)
+        if not name:
+            return
+        if find_job(self.jobs, name):
+            messagebox.showerror('Error', f'A job named {name} already exists')
+            return
+        self.jobs.append({"name": name, "source_folder": "", "destination_folder": ""})
+        self.job_menu['menu'].add_command(label=name, command=tk._setit(self.selected_job, name, self.select_job))
+        self.selected_job.set(name)
+        self.select_job(name)
+
+    def current_job(self):
+        return find_job(self.jobs, self.selected_job.get())
+
+    def select_device(self, device):
+        settings = self.devices[device]
+        self.device_mount.set(settings.get('mount', ''))
+        self.safe_temp.set(settings['safe_temp'])
+        self.high_temp.set(settings['high_temp'])
+
+    def save_device_mount(self):
+        self.devices[self.selected_device.get()]['mount'] = self.device_mount.get()
+        self.save_config()
+
     def save_safe_temp(self):
-        config = load_config()
-        config['safe_temp'] = self.safe_temp.get()
-        save_config(config)
+        self.devices[self.selected_device.get()]['safe_temp'] = self.safe_temp.get()
+        self.save_config()
 
     def save_high_temp(self):
-        config = load_config()
-        config['high_temp'] = self.high_temp.get()
-        save_config(config)
+        self.devices[self.selected_device.get()]['high_temp'] = self.high_temp.get()
+        self.save_config()
 
     def save_monitor_interval(self):
-        config = load_config()
-        config['monitor_interval'] = self.monitor_interval.get()
-        save_config(config)
+        self.save_config()
         print(f'Update interval set to: {self.monitor_interval.get()} minutes')  # Debug print
         messagebox.showinfo('Saved', f'Update interval saved: {self.monitor_interval.get()} minutes')
 
@@ -248,8 +202,11 @@ class CoolSyncBackup:
             self.set_destination_path(folder_selected)
 
     def on_closing(self):
-        if self.sync_in_progress:
-            self.stop_sync()
+        # The daemon keeps syncing; only this client goes away
+        self.disconnect_event.set()
+        self.bridge.stop()
+        if self.io_pool:
+            self.io_pool.shutdown()
         self.root.destroy()
 
     def set_source_path(self, path):
@@ -258,7 +215,7 @@ class CoolSyncBackup:
             return
         print(f'Setting source folder to: {path}')  # Debug print
         self.source_folder.set(path)
-        self.source_folder_display.config(textvariable=tk.StringVar(value=path))
+        self.current_job()['source_folder'] = path
         self.save_config()
 
     def set_destination_path(self, path):
@@ -267,50 +224,120 @@ class CoolSyncBackup:
             return
         print(f'Setting destination folder to: {path}')  # Debug print
         self.destination_folder.set(path)
-        self.destination_folder_display.config(textvariable=tk.StringVar(value=path))
+        self.current_job()['destination_folder'] = path
         self.save_config()
 
     def save_config(self):
-        config = {
-            "source_folder": self.source_folder.get(),
-            "destination_folder": self.destination_folder.get(),
-            "safe_temp": self.safe_temp.get(),
-            "high_temp": self.high_temp.get(),
-            "monitor_interval": self.monitor_interval.get()
+        # Only the keys edited here are rewritten; schedule, filters and the rest stay as they are.
+        # A new job is saved once both its folders are set, since the daemon will not start one without them.
+        jobs = [job for job in self.jobs if job['source_folder'] and job['destination_folder']]
+        changes = {
+            "jobs": json.loads(json.dumps(jobs)),  # Snapshots for the writer thread
+            "monitor_interval": self.monitor_interval.get(),
+            "devices": json.loads(json.dumps(self.devices))
         }
-        save_config(config)
+        self.submit_io(update_config, changes)
+        self.send_command('reload')  # Same writer thread, so the daemon reads the new file
+
+    def submit_io(self, function, *args):
+        if self.io_pool is None:
+            # Imported on first use so the executor machinery is not on the startup path
+            from concurrent.futures import ThreadPoolExecutor
+            self.io_pool = ThreadPoolExecutor(max_workers=1)
+        return self.io_pool.submit(function, *args)
+
+    def connect_to_daemon(self):
+        def connect():
+            if not ensure_daemon(self.client, CONFIG_FILE):
+                self.update_status("Could not start the sync daemon")
+                return
+            self.client.subscribe(self.on_daemon_event, self.disconnect_event)
+
+        threading.Thread(target=connect, daemon=True).start()
+
+    def on_daemon_event(self, message):
+        # Runs on the subscription thread
+        event = message.get('event')
+        if event == 'hello':
+            self.update_status(message['status'])
+            if message['temperatures']:
+                self.bridge.post('temperatures', message['temperatures'])
+        elif event == 'status':
+            self.update_status(message['message'])
+        elif event == 'temperatures':
+            self.bridge.post('temperatures', message['temperatures'])
+        elif event == 'metrics':
+            self.bridge.post('metrics', message['metrics'])
+        elif event == 'disconnected':
+            self.update_status("Lost connection to the sync daemon, reconnecting...")
+
+    def send_command(self, cmd, **fields):
+        def send():
+            try:
+                response = self.client.request(cmd, **fields)
+            except OSError as e:
+                self.update_status(f"Sync daemon unavailable: {e}")
+                return
+            self.update_status(response.get('message') or response.get('error', ''))
+
+        self.submit_io(send)
 
     def start_sync(self):
-        if not self.sync_in_progress:
-            self.sync_in_progress = True
-            self.stop_event.clear()
-            self.queue.put(self.safe_temp.get())
-            self.queue.put(self.high_temp.get())
-            self.sync_thread = threading.Thread(target=sync_files, args=(self.source_folder.get(), self.destination_folder.get(), self.stop_event, self, self.queue))
-            self.sync_thread.start()
-            self.update_status("Sync started")
+        # Starts every configured job; the daemon runs them side by side where the disks allow
+        self.send_command('start', monitor_interval=self.monitor_interval.get())
 
     def stop_sync(self):
-        self.stop_event.set()
-        self.update_status("Sync stopped by user")
+        self.send_command('stop')
 
-    def stop_sync_func(self):
-        self.stop_event.set()
-        if self.sync_thread:
-            self.sync_thread.join()
-        self.update_status("Sync stopped by user")
-
-    def update_temperature_display(self):
+    def show_temperatures(self, temperatures):
         self.temp_display.configure(state='normal')
         self.temp_display.delete(1.0, tk.END)
-        temperatures = get_specific_device_temperatures()
         for device, temp in temperatures.items():
             self.temp_display.insert(tk.END, f"{device}: {temp}°C\n")
         self.temp_display.configure(state='disabled')
-        self.root.after(60000, self.update_temperature_display)  # Update every 60 seconds
 
-    def update_status(self, message):
-        self.status_label.config(text=message)
+    def show_metrics(self, snapshot):
+        self.latest_metrics = snapshot
+
+    def update_dashboard(self):
+        self.root.after(1000, self.update_dashboard)
+        snapshot = self.latest_metrics
+        if snapshot is None:
+            return
+        self.throughput_label.config(text=f"Throughput: {snapshot['files_per_s']:.1f} files/s, {snapshot['mb_per_s']:.1f} MB/s")
+        remaining = f"Remaining: {snapshot['bytes_remaining'] / (1024 * 1024):.1f} MB ({snapshot['files_done']}/{snapshot['files_planned']} files)"
+        if not snapshot['scan_finished']:
+            remaining += " + still scanning"
+        self.remaining_label.config(text=remaining)
+        self.eta_label.config(text=f"ETA: {format_duration(snapshot['eta_seconds'])} (paused {snapshot['pause_fraction'] * 100:.0f}% of the time)")
+        for device, history in snapshot['temperatures'].items():
+            self.draw_sparkline(device, history)
+
+    def draw_sparkline(self, device, history):
+        if device not in self.sparklines:
+            row = tk.Frame(self.sparkline_frame)
+            row.pack(fill=tk.X)
+            tk.Label(row, text=device, width=20, anchor=tk.W).pack(side=tk.LEFT)
+            self.sparklines[device] = tk.Canvas(row, width=SPARKLINE_WIDTH, height=SPARKLINE_HEIGHT, bg='white')
+            self.sparklines[device].pack(side=tk.LEFT)
+        canvas = self.sparklines[device]
+        canvas.delete('all')
+        readings = [temp for temp in history if temp is not None]
+        if len(readings) < 2:
+            return
+        low, high = min(readings), max(readings)
+        spread = max(high - low, 1.0)
+        step = SPARKLINE_WIDTH / max(len(history) - 1, 1)
+        points = []
+        for i, temp in enumerate(history):
+            if temp is not None:
+                points.extend((i * step, SPARKLINE_HEIGHT - 2 - (temp - low) / spread * (SPARKLINE_HEIGHT - 4)))
+        canvas.create_line(*points, fill='red')
+        canvas.create_text(SPARKLINE_WIDTH - 2, 2, text=f"{readings[-1]:.0f}°C", anchor=tk.NE, font=('Arial', 7))
+
+    def update_latency_display(self):
+        self.latency_label.config(text=self.bridge.latency_report())
+        self.root.after(1000, self.update_latency_display)
 
 if __name__ == '__main__':
     root = tk.Tk()
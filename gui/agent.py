@@ -0,0 +1,508 @@
+import argparse
+import hmac
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import urllib.parse
+
+from coolsync_client import connect, format_address, parse_address
+from quarantine import TRASH_DIR
+from unlinker import remove_trees
+
+# CoolSync Backup
+# Destination agent, for backing up to another machine.
+# Run it where the backup disk is, with a shared token in COOLSYNC_AGENT_TOKEN
+# or a file:
+#   python agent.py --root /mnt/backup --token-file ~/.coolsync/agent-token --address 0.0.0.0:47801
+# and give a job the destination agent://host:47801/photos (or
+# agent+unix:///run/coolsync-agent.sock?path=photos) and the same
+# "agent_token". The path is taken relative to --root; anything that leads
+# outside it, through ".." or a symlink, is refused. The agent listens on
+# 127.0.0.1 unless told otherwise.
+#
+# The protocol is binary frames (FRAME: op, request id, payload length)
+# over one connection, and the agent answers requests strictly in order.
+# HELLO carries the token and the destination folder; a wrong token ends
+# the connection. The client never waits on a single file:
+#   LIST    one folder's source names in a batch; the reply has the remote
+#           kind, size and mtime of each and the names only the remote has
+#   PUT     a file's metadata, followed by DATA frames with its body (an
+#           empty one ends it); written to a part file and renamed into place
+#   DIR     create a folder if needed and set its times
+#   DELETE  a file, or a folder with everything in it
+# Every request gets an OK (with a count) or an ERROR reply. The client
+# keeps up to WINDOW requests unacknowledged.
+
+PROTOCOL_VERSION = 2  # 2: HELLO carries the token
+DEFAULT_AGENT_PORT = 47801
+DEFAULT_AGENT_ADDRESS = f"127.0.0.1:{DEFAULT_AGENT_PORT}"
+TOKEN_ENV = 'COOLSYNC_AGENT_TOKEN'
+FRAME = struct.Struct('<BIQ')  # Op, request id, payload length
+LENGTH = struct.Struct('<I')
+STAT = struct.Struct('<Bqq')  # Kind, size, mtime_ns
+PUT = struct.Struct('<qqqI')  # Size, mtime_ns, atime_ns, mode
+TIMES = struct.Struct('<qq')  # atime_ns, mtime_ns
+COUNT = struct.Struct('<q')
+VERSION = struct.Struct('<H')
+
+HELLO, LIST, PUT_FILE, DATA, DIR, DELETE, BYE = 1, 2, 3, 4, 5, 6, 7
+OK, ERROR, LISTING = 64, 65, 66
+MISSING, FILE, DIRECTORY = 0, 1, 2
+
+DATA_CHUNK = 1024 * 1024
+WINDOW = 256  # Requests in flight before the client waits for acknowledgements
+PART_SUFFIX = '.coolsync-part'
+CONNECT_TIMEOUT = 10
+
+
+def pack_bytes(value):
+    return LENGTH.pack(len(value)) + value
+
+
+def unpack_bytes(payload, offset):
+    (length,) = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    return payload[offset:offset + length], offset + length
+
+
+def pack_path(rel_path):
+    return pack_bytes(os.fsencode(rel_path.replace(os.sep, '/')))
+
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ConnectionError("connection closed")
+    return data
+
+
+def read_frame(stream):
+    op, request, length = FRAME.unpack(read_exact(stream, FRAME.size))
+    return op, request, read_exact(stream, length) if length else b''
+
+
+def frame(op, request, payload=b''):
+    return FRAME.pack(op, request, len(payload)) + payload
+
+
+def is_agent_url(path):
+    return isinstance(path, str) and path.startswith(('agent://', 'agent+unix://'))
+
+
+def parse_agent_url(url):
+    """(address, path) from agent://host:port/path or agent+unix:///socket?path=path."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme == 'agent':
+        if not parts.hostname:
+            raise ValueError(f"No host in {url}")
+        return (parts.hostname, parts.port or DEFAULT_AGENT_PORT), urllib.parse.unquote(parts.path).lstrip('/')
+    if parts.scheme == 'agent+unix':
+        path = urllib.parse.parse_qs(parts.query).get('path', [''])[0]
+        return urllib.parse.unquote(parts.path), path.lstrip('/')
+    raise ValueError(f"Not an agent URL: {url}")
+
+
+# Agent side
+
+class AgentSession:
+    def __init__(self, root, token, rfile, wfile):
+        self.root = os.path.realpath(root)
+        self.token = token
+        self.base = None  # Destination folder chosen by HELLO
+        self.rfile = rfile
+        self.wfile = wfile
+
+    def resolve(self, rel_path, follow_last=True):
+        """
+        The real path of rel_path under the destination. Symlinks are
+        resolved, so one cannot lead outside it; with follow_last False the
+        last part is kept as it is, for ops that replace or remove a link
+        itself rather than what it points to.
+        """
+        rel_path = os.fsdecode(rel_path)
+        parts = [part for part in rel_path.split('/') if part not in ('', '.')]
+        if '..' in parts or os.path.isabs(rel_path):
+            raise ValueError(f"Path outside the destination: {rel_path}")
+        if not parts:
+            return self.base
+        if follow_last:
+            path = os.path.realpath(os.path.join(self.base, *parts))
+        else:
+            path = os.path.join(os.path.realpath(os.path.join(self.base, *parts[:-1])), parts[-1])
+        if os.path.commonpath([path, self.base]) != self.base:
+            raise ValueError(f"Path outside the destination: {rel_path}")
+        return path
+
+    def reply(self, op, request, payload=b''):
+        self.wfile.write(frame(op, request, payload))
+
+    def run(self):
+        while True:
+            try:
+                op, request, payload = read_frame(self.rfile)
+            except ConnectionError:
+                return
+            if op == BYE:
+                return
+            if op != HELLO and self.base is None:
+                self.reply(ERROR, request, pack_bytes(b"HELLO first"))
+                continue
+            if op == HELLO:
+                try:
+                    self.reply(*self.hello(request, payload))
+                except (OSError, ValueError, struct.error) as e:
+                    self.reply(ERROR, request, pack_bytes(str(e).encode('utf-8', 'replace')))
+                    return  # Nothing else is served on a connection that failed HELLO
+                continue
+            try:
+                handler = {LIST: self.list, PUT_FILE: self.put, DIR: self.dir, DELETE: self.delete}[op]
+            except KeyError:
+                self.reply(ERROR, request, pack_bytes(f"Unknown op {op}".encode()))
+                continue
+            try:
+                self.reply(*handler(request, payload))
+            except ConnectionError:
+                return  # A file body was cut off; the client is gone or confused
+            except (OSError, ValueError) as e:
+                self.reply(ERROR, request, pack_bytes(str(e).encode('utf-8', 'replace')))
+
+    def hello(self, request, payload):
+        (version,) = VERSION.unpack_from(payload)
+        if version != PROTOCOL_VERSION:
+            raise ValueError(f"Protocol version {version} not supported (agent speaks {PROTOCOL_VERSION})")
+        path, offset = unpack_bytes(payload, VERSION.size)
+        token, _ = unpack_bytes(payload, offset)
+        if not hmac.compare_digest(token, self.token):
+            raise ValueError("Wrong agent token")
+        self.base = self.root
+        try:
+            base = self.resolve(path)
+            os.makedirs(base, exist_ok=True)
+        finally:
+            self.base = None
+        self.base = os.path.realpath(base)
+        return OK, request, COUNT.pack(0)
+
+    def list(self, request, payload):
+        rel_dir, offset = unpack_bytes(payload, 0)
+        (count,) = LENGTH.unpack_from(payload, offset)
+        offset += LENGTH.size
+        names = []
+        for _ in range(count):
+            name, offset = unpack_bytes(payload, offset)
+            names.append(name)
+        present = {}
+        try:
+            with os.scandir(os.fsencode(self.resolve(rel_dir))) as entries:
+                for entry in entries:
+                    present[entry.name] = entry
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        out = [LENGTH.pack(len(names))]
+        for name in names:
+            entry = present.pop(name, None)
+            out.append(entry_stat(entry))
+        if not rel_dir.strip(b'/.'):
+            present.pop(os.fsencode(TRASH_DIR), None)  # Never reported, so never deleted
+        out.append(LENGTH.pack(len(present)))
+        for name, entry in present.items():
+            out.append(struct.pack('<B', DIRECTORY if entry.is_dir(follow_symlinks=False) else FILE) + pack_bytes(name))
+        return LISTING, request, b''.join(out)
+
+    def put(self, request, payload):
+        rel_path, offset = unpack_bytes(payload, 0)
+        size, mtime_ns, atime_ns, mode = PUT.unpack_from(payload, offset)
+        error = None
+        file = part = None
+        try:
+            path = self.resolve(rel_path, follow_last=False)
+            part = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + PART_SUFFIX)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file = open(part, 'wb')
+        except (OSError, ValueError) as e:
+            error = e
+        # The body follows whatever happens, so it is always read to the end
+        while True:
+            op, data_request, data = read_frame(self.rfile)
+            if op != DATA or data_request != request:
+                raise ConnectionError("file body interrupted")
+            if not data:
+                break
+            if error is None:
+                try:
+                    file.write(data)
+                except OSError as e:
+                    error = e
+        if file is not None:
+            file.close()
+        if error is None:
+            try:
+                if os.path.getsize(part) != size:
+                    raise ValueError(f"{os.fsdecode(rel_path)}: received {os.path.getsize(part)} of {size} bytes")
+                os.chmod(part, mode & 0o7777)
+                os.utime(part, ns=(atime_ns, mtime_ns))
+                os.replace(part, path)
+                return OK, request, COUNT.pack(size)
+            except (OSError, ValueError) as e:
+                error = e
+        if part is not None and os.path.exists(part):
+            os.remove(part)
+        raise error
+
+    def dir(self, request, payload):
+        rel_dir, offset = unpack_bytes(payload, 0)
+        atime_ns, mtime_ns = TIMES.unpack_from(payload, offset)
+        path = self.resolve(rel_dir)
+        os.makedirs(path, exist_ok=True)
+        if os.stat(path).st_mtime_ns != mtime_ns:
+            os.utime(path, ns=(atime_ns, mtime_ns))
+        return OK, request, COUNT.pack(0)
+
+    def delete(self, request, payload):
+        rel_path, _ = unpack_bytes(payload, 0)
+        path = self.resolve(rel_path, follow_last=False)
+        if path == self.base:
+            raise ValueError("Refusing to delete the destination itself")
+        if os.path.isdir(path) and not os.path.islink(path):
+            summary = remove_trees([path], lambda: True)
+            return OK, request, COUNT.pack(summary["files"])
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return OK, request, COUNT.pack(0)
+        return OK, request, COUNT.pack(1)
+
+
+def entry_stat(entry):
+    if entry is None:
+        return STAT.pack(MISSING, 0, 0)
+    try:
+        if entry.is_dir():
+            return STAT.pack(DIRECTORY, 0, 0)
+        stat = entry.stat()
+    except OSError:
+        return STAT.pack(MISSING, 0, 0)
+    return STAT.pack(FILE, stat.st_size, stat.st_mtime_ns)
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        if self.request.family != getattr(socket, 'AF_UNIX', None):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        AgentSession(self.server.root, self.server.token, self.rfile, self.wfile).run()
+
+
+class AgentTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class AgentUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def make_agent_server(address, root, token):
+    if isinstance(address, tuple):
+        server = AgentTCPServer(address, AgentHandler)
+    else:
+        if os.path.exists(address):
+            os.remove(address)  # Stale socket
+        server = AgentUnixServer(address, AgentHandler)
+        os.chmod(address, 0o600)
+    server.root = root
+    server.token = token.encode() if isinstance(token, str) else token
+    return server
+
+
+# Client side
+
+class AgentError(Exception):
+    pass
+
+
+class AgentClient:
+    """
+    One connection to an agent. Requests are sent without waiting; a reader
+    thread matches replies to them and calls each request's on_done(error,
+    value) with value the reply's count, or the parsed listing for LIST.
+    """
+
+    def __init__(self, url, token=None, timeout=CONNECT_TIMEOUT):
+        address, self.path = parse_agent_url(url)
+        token = token or os.environ.get(TOKEN_ENV, '')
+        self.address = address
+        self.sock = connect(address, timeout)
+        self.sock.settimeout(None)
+        if isinstance(address, tuple):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb', buffering=DATA_CHUNK)
+        self.send_lock = threading.Lock()
+        self.window = threading.BoundedSemaphore(WINDOW)
+        self.callbacks = {}
+        self.callbacks_lock = threading.Lock()
+        self.idle = threading.Condition(self.callbacks_lock)
+        self.next_request = 0
+        self.failure = None  # Set when the connection is lost
+        self.reader = threading.Thread(target=self.read_loop, name='agent-reader', daemon=True)
+        self.reader.start()
+        done = threading.Event()
+        result = {}
+
+        def hello_done(error, value):
+            result['error'] = error
+            done.set()
+
+        self.send(HELLO, VERSION.pack(PROTOCOL_VERSION) + pack_path(self.path) + pack_bytes(token.encode()), hello_done)
+        done.wait()
+        if result['error'] is not None:
+            self.close()
+            raise AgentError(f"Agent {format_address(address)} refused {self.path or '/'}: {result['error']}")
+
+    def send(self, op, payload, on_done, body=None):
+        """Queue one request; body is an open file streamed as DATA frames after it."""
+        self.window.acquire()
+        with self.callbacks_lock:
+            if self.failure is not None:
+                self.window.release()
+                raise AgentError(self.failure)
+            self.next_request = (self.next_request + 1) & 0xFFFFFFFF
+            request = self.next_request
+            self.callbacks[request] = on_done
+        with self.send_lock:
+            try:
+                self.sock.sendall(frame(op, request, payload))
+                if body is not None:
+                    while True:
+                        chunk = body.read(DATA_CHUNK)
+                        self.sock.sendall(frame(DATA, request, chunk))
+                        if not chunk:
+                            break
+            except OSError as e:
+                self.lost(f"Lost the connection to the agent: {e}")
+                raise AgentError(self.failure)
+        return request
+
+    def read_loop(self):
+        try:
+            while True:
+                op, request, payload = read_frame(self.rfile)
+                with self.callbacks_lock:
+                    on_done = self.callbacks.pop(request, None)
+                    if not self.callbacks:
+                        self.idle.notify_all()
+                if on_done is None:
+                    continue
+                self.window.release()
+                if op == ERROR:
+                    on_done(os.fsdecode(unpack_bytes(payload, 0)[0]), None)
+                elif op == LISTING:
+                    on_done(None, parse_listing(payload))
+                else:
+                    on_done(None, COUNT.unpack_from(payload)[0])
+        except (ConnectionError, OSError, ValueError, struct.error) as e:
+            self.lost(f"Lost the connection to the agent: {e}")
+
+    def lost(self, message):
+        with self.callbacks_lock:
+            if self.failure is None:
+                self.failure = message
+            pending = list(self.callbacks.values())
+            self.callbacks.clear()
+            self.idle.notify_all()
+        for on_done in pending:
+            self.window.release()
+            on_done(message, None)
+
+    def list(self, rel_dir, names, on_done):
+        payload = [pack_path(rel_dir), LENGTH.pack(len(names))]
+        payload.extend(pack_bytes(os.fsencode(name)) for name in names)
+        return self.send(LIST, b''.join(payload), on_done)
+
+    def put(self, rel_path, src_file, stat, on_done):
+        with open(src_file, 'rb') as body:
+            return self.send(PUT_FILE, pack_path(rel_path) + PUT.pack(stat.st_size, stat.st_mtime_ns, stat.st_atime_ns, stat.st_mode),
+                             on_done, body)
+
+    def set_dir(self, rel_dir, atime_ns, mtime_ns, on_done):
+        return self.send(DIR, pack_path(rel_dir) + TIMES.pack(atime_ns, mtime_ns), on_done)
+
+    def delete(self, rel_path, on_done):
+        return self.send(DELETE, pack_path(rel_path), on_done)
+
+    def drain(self):
+        """Wait until every request sent so far is answered."""
+        with self.callbacks_lock:
+            self.idle.wait_for(lambda: not self.callbacks)
+        if self.failure is not None:
+            raise AgentError(self.failure)
+
+    def close(self):
+        try:
+            with self.send_lock:
+                self.sock.sendall(frame(BYE, 0))
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.reader.join(timeout=5)
+        self.rfile.close()
+
+
+def parse_listing(payload):
+    """([(kind, size, mtime_ns)] in request order, [(kind, name)] only on the agent)."""
+    (count,) = LENGTH.unpack_from(payload, 0)
+    offset = LENGTH.size
+    entries = []
+    for _ in range(count):
+        entries.append(STAT.unpack_from(payload, offset))
+        offset += STAT.size
+    (count,) = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    extras = []
+    for _ in range(count):
+        kind = payload[offset]
+        name, offset = unpack_bytes(payload, offset + 1)
+        extras.append((kind, os.fsdecode(name)))
+    return entries, extras
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CoolSyncBackup destination agent: receives backups from another machine.")
+    parser.add_argument('--root', required=True, help="Folder the backups are written under")
+    parser.add_argument('--address', default=DEFAULT_AGENT_ADDRESS,
+                        help="host:port or a Unix socket path to listen on (use 0.0.0.0:port to accept other machines)")
+    parser.add_argument('--token-file', help=f"File holding the token clients must send (default: ${TOKEN_ENV})")
+    args = parser.parse_args()
+    token = os.environ.get(TOKEN_ENV, '')
+    if args.token_file:
+        with open(os.path.expanduser(args.token_file)) as file:
+            token = file.read().strip()
+    if not token:
+        parser.error(f"a token is required: set {TOKEN_ENV} or pass --token-file")
+    address = parse_address(args.address)
+    os.makedirs(args.root, exist_ok=True)
+    server = make_agent_server(address, args.root, token)
+    print(f"CoolSync agent writing to {os.path.abspath(args.root)}, listening on {format_address(address)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.remove(address)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from copyexec import copy_file
+
+# CoolSync Backup
+# Copy benchmark: shutil.copy2 against the sparse-aware, preallocating copy.
+# Builds a sparse image (a large file with a few scattered data regions,
+# like a VM disk) and a dense one, copies each both ways and reports wall
+# clock, the bytes really allocated at the destination and, where filefrag
+# is installed, how many extents the copy was written in.
+#
+#   python bench_copy.py --sparse-mb 4096 --data-percent 5 --dense-mb 512 --dir /mnt/backup/bench
+
+REGION = 1024 * 1024
+
+
+def make_sparse(path, size_mb, data_percent):
+    regions = size_mb
+    step = max(1, round(100 / data_percent)) if data_percent else regions + 1
+    payload = os.urandom(REGION)
+    with open(path, 'wb') as file:
+        file.truncate(size_mb * REGION)
+        for i in range(0, regions, step):
+            file.seek(i * REGION)
+            file.write(payload)
+
+
+def make_dense(path, size_mb):
+    payload = os.urandom(REGION)
+    with open(path, 'wb') as file:
+        for _ in range(size_mb):
+            file.write(payload)
+
+
+def allocated(path):
+    return os.stat(path).st_blocks * 512
+
+
+def extents(path):
+    try:
+        output = subprocess.run(['filefrag', path], capture_output=True, text=True, check=True).stdout
+        return int(output.rsplit(':', 1)[1].split()[0])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+
+def timed_copy(copy, source, target):
+    if os.path.exists(target):
+        os.remove(target)
+    os.sync()
+    started = time.perf_counter()
+    copy(source, target)
+    os.sync()  # Count the writeback too, or zeros cost nothing until later
+    return {"seconds": time.perf_counter() - started, "allocated_bytes": allocated(target), "extents": extents(target)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare shutil.copy2 with the sparse-aware copy.")
+    parser.add_argument("--sparse-mb", type=int, default=2048, help="Logical size of the sparse image")
+    parser.add_argument("--data-percent", type=float, default=5.0, help="Share of the sparse image holding data")
+    parser.add_argument("--dense-mb", type=int, default=512)
+    parser.add_argument("--dir", help="Where to write the images (default: a temporary directory)")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as work:
+        sparse = os.path.join(work, "sparse.img")
+        dense = os.path.join(work, "dense.img")
+        make_sparse(sparse, args.sparse_mb, args.data_percent)
+        make_dense(dense, args.dense_mb)
+        for name, source in (("sparse", sparse), ("dense", dense)):
+            target = os.path.join(work, "copy.img")
+            results[name] = {
+                "logical_bytes": os.path.getsize(source),
+                "source_allocated_bytes": allocated(source),
+                "copy2": timed_copy(shutil.copy2, source, target),
+                "coolsync": timed_copy(copy_file, source, target),
+            }
+            os.remove(target)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import fnmatch
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from filters import FileFilter, join_rel
+
+# CoolSync Backup
+# Filter benchmark.
+# Measures the cost per path of the compiled filters against checking each
+# rule with fnmatch in turn, and how much of a tree with node_modules-style
+# junk the pruning walk skips.
+#
+#   python bench_filters.py --paths 200000 --rules 50
+
+SEGMENTS = ["src", "lib", "docs", "photos", "2023", "2024", "music", "projects", "app", "test"]
+EXTENSIONS = [".py", ".jpg", ".txt", ".tmp", ".js", ".pdf", ".log", ".mp3"]
+
+
+def make_rules(count):
+    rules = ["node_modules/", ".cache/", "*.tmp", "*.log", "__pycache__/", "/build", "!keep.log"]
+    rng = random.Random(1)
+    while len(rules) < count:
+        rules.append(f"*{rng.choice(SEGMENTS)}{rng.randint(0, 999)}*{rng.choice(EXTENSIONS)}")
+    return rules[:count]
+
+
+def make_paths(count):
+    rng = random.Random(2)
+    paths = []
+    for i in range(count):
+        depth = rng.randint(0, 6)
+        parts = [rng.choice(SEGMENTS) for _ in range(depth)]
+        parts.append(f"file{i}{rng.choice(EXTENSIONS)}")
+        paths.append('/'.join(parts))
+    return paths
+
+
+def naive_excluded(rules, path):
+    # One fnmatch per rule and per path segment, last match wins
+    name = path.rsplit('/', 1)[-1]
+    excluded = False
+    for rule in rules:
+        negated = rule.startswith('!')
+        pattern = rule.lstrip('!').rstrip('/')
+        if rule.endswith('/'):
+            continue  # Directory rules only apply while walking
+        if '/' in pattern:
+            hit = fnmatch.fnmatchcase(path, pattern.lstrip('/'))
+        else:
+            hit = fnmatch.fnmatchcase(name, pattern)
+        if hit:
+            excluded = not negated
+    return excluded
+
+
+def time_per_path(function, paths):
+    started = time.perf_counter()
+    for path in paths:
+        function(path)
+    return (time.perf_counter() - started) / len(paths)
+
+
+def walk_entries(root, filters):
+    entries = 0
+    for root_dir, dirs, files in os.walk(root):
+        if filters is not None:
+            filters.prune(os.path.relpath(root_dir, root), dirs)
+        rel_dir = os.path.relpath(root_dir, root)
+        for name in files:
+            if filters is None or filters.accepts_file(join_rel(rel_dir, name)):
+                entries += 1
+        entries += len(dirs)
+    return entries
+
+
+def make_tree(root, projects, junk_files):
+    for p in range(projects):
+        project = os.path.join(root, f"project{p}")
+        os.makedirs(os.path.join(project, "src"))
+        for i in range(10):
+            open(os.path.join(project, "src", f"module{i}.py"), 'w').close()
+        for i in range(junk_files):
+            junk = os.path.join(project, "node_modules", f"pkg{i % 20}")
+            os.makedirs(junk, exist_ok=True)
+            open(os.path.join(junk, f"index{i}.js"), 'w').close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure include/exclude filter cost.")
+    parser.add_argument("--paths", type=int, default=100000)
+    parser.add_argument("--rules", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=20, help="Projects in the pruning tree")
+    parser.add_argument("--junk-files", type=int, default=200, help="node_modules files per project")
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    paths = make_paths(args.paths)
+    started = time.perf_counter()
+    filters = FileFilter({"exclude": rules})
+    compile_s = time.perf_counter() - started
+
+    compiled = time_per_path(filters.excludes_name, paths)
+    naive = time_per_path(lambda path: naive_excluded(rules, path), paths)
+    mismatches = sum(filters.excludes_name(path) != naive_excluded(rules, path) for path in paths[:10000])
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, args.projects, args.junk_files)
+        started = time.perf_counter()
+        unfiltered = walk_entries(root, None)
+        unfiltered_s = time.perf_counter() - started
+        started = time.perf_counter()
+        pruned = walk_entries(root, filters)
+        pruned_s = time.perf_counter() - started
+
+    print(json.dumps({
+        "rules": args.rules,
+        "paths": args.paths,
+        "compile_ms": compile_s * 1000,
+        "compiled_ns_per_path": compiled * 1e9,
+        "fnmatch_ns_per_path": naive * 1e9,
+        "mismatches_in_first_10000": mismatches,
+        "walk_entries": {"unfiltered": unfiltered, "pruned": pruned},
+        "walk_ms": {"unfiltered": unfiltered_s * 1000, "pruned": pruned_s * 1000},
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
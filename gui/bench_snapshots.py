@@ -0,0 +1,111 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from metrics import SyncMetrics
+from snapshots import list_snapshots, prune_snapshots, snapshot_pass
+from thermal import ThermalGate
+
+# CoolSync Backup
+# Snapshot benchmark.
+# Builds a synthetic tree, takes a first (full) snapshot, changes a few
+# percent of the files and takes a second one, then expires the first.
+# Reports wall clock, cost per file and the bytes and inodes each snapshot
+# really added.
+#
+#   python bench_snapshots.py --files 1000000 --changed 1 --dir /mnt/backup/bench
+
+FILES_PER_DIR = 1000
+
+
+def make_tree(root, files, size):
+    payload = b'x' * size
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // FILES_PER_DIR:05d}")
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f"f{i}"), 'wb') as file:
+            file.write(payload)
+
+
+def change_files(root, files, percent, size):
+    rng = random.Random(3)
+    changed = rng.sample(range(files), int(files * percent / 100))
+    payload = b'y' * size
+    future = time.time() + 10  # Make sure the mtime moves even on coarse filesystems
+    for i in changed:
+        path = os.path.join(root, f"d{i // FILES_PER_DIR:05d}", f"f{i}")
+        with open(path, 'wb') as file:
+            file.write(payload)
+        os.utime(path, (future, future))
+    return len(changed)
+
+
+def new_space(snapshot):
+    # Bytes and inodes only this snapshot holds (files with a single link)
+    blocks = inodes = 0
+    for root_dir, dirs, files in os.walk(snapshot):
+        inodes += len(dirs)
+        for name in files:
+            stat = os.lstat(os.path.join(root_dir, name))
+            if stat.st_nlink == 1:
+                blocks += getattr(stat, 'st_blocks', (stat.st_size + 511) // 512)
+                inodes += 1
+    return blocks * 512, inodes
+
+
+def timed_snapshot(source, destination, when):
+    gate = ThermalGate({})
+    started = time.perf_counter()
+    snapshot_pass(source, destination, threading.Event(), lambda message: None, gate, SyncMetrics(), clock=lambda: when)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of hardlink snapshots.")
+    parser.add_argument("--files", type=int, default=1000000)
+    parser.add_argument("--size", type=int, default=100, help="Bytes per file")
+    parser.add_argument("--changed", type=float, default=1.0, help="Percent of files changed between snapshots")
+    parser.add_argument("--dir", help="Where to build the tree (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as work:
+        source = os.path.join(work, "source")
+        destination = os.path.join(work, "backup")
+        started = time.perf_counter()
+        make_tree(source, args.files, args.size)
+        build_s = time.perf_counter() - started
+
+        now = datetime.datetime.now().replace(microsecond=0)
+        first_s = timed_snapshot(source, destination, now)
+        changed = change_files(source, args.files, args.changed, args.size)
+        second_s = timed_snapshot(source, destination, now + datetime.timedelta(seconds=1))
+        first, second = list_snapshots(destination)
+        second_bytes, second_inodes = new_space(os.path.join(destination, second))
+
+        started = time.perf_counter()
+        prune_snapshots(destination, {"keep_last": 1}, threading.Event(), lambda message: None, ThermalGate({}))
+        prune_s = time.perf_counter() - started
+
+    print(json.dumps({
+        "files": args.files,
+        "changed_files": changed,
+        "build_tree_s": build_s,
+        "full_snapshot_s": first_s,
+        "incremental_snapshot_s": second_s,
+        "incremental_us_per_file": second_s / args.files * 1e6,
+        "incremental_new_bytes": second_bytes,
+        "incremental_new_inodes": second_inodes,
+        "prune_one_snapshot_s": prune_s,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
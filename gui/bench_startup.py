@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# CoolSync Backup
+# Startup benchmark for the GUI.
+# Each run starts a coolsyncd whose smartctl is deliberately slow in a process
+# of its own, as it runs for real, then builds the CoolSyncBackup window in a
+# fresh interpreter against it. The window's imports are therefore cold and it
+# does not share a GIL with the daemon. It reports how long it took until the
+# window first painted and until the first real temperature reading arrived.
+#
+#   python bench_startup.py --runs 10 --smartctl-delay 3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(HERE, "CoolSyncBackup_v0.2.6.py")
+
+DAEMON = r'''
+import os, sys, time
+sys.path.insert(0, {here!r})
+import thermal
+
+def slow_smartctl(command, device_name):
+    time.sleep({delay})  # A drive spinning up
+    return 35.0, device_name
+
+thermal.run_smartctl_command = slow_smartctl
+os.chdir({workdir!r})  # Keep the benchmark away from the real config.json
+import coolsyncd
+coolsyncd.serve(coolsyncd.SyncDaemon("config.json", state_dir={workdir!r}), {address!r})
+'''
+
+# The window talks to the daemon above, already running
+CHILD = r'''
+import importlib.util, json, sys, os, time
+sys.path.insert(0, {here!r})
+os.chdir({workdir!r})
+os.environ["COOLSYNC_ADDRESS"] = {address!r}
+
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("coolsync_app", {app!r})
+app_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app_module)
+imported = time.perf_counter()
+
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError as e:
+    print(json.dumps({{"error": str(e)}}))
+    sys.exit(0)
+app = app_module.CoolSyncBackup(root)
+root.update()
+painted = time.perf_counter()
+
+first_reading = None
+def check():
+    global first_reading
+    if "35.0" in app.temp_display.get("1.0", "end"):
+        first_reading = time.perf_counter()
+        root.quit()
+    else:
+        root.after(10, check)
+root.after(10, check)
+root.after(int(({delay} + 10) * 1000), root.quit)
+root.mainloop()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_paint_s": painted - started,
+    "first_reading_s": (first_reading - started) if first_reading else None,
+}}))
+app.on_closing()
+'''
+
+
+def start_daemon(delay, workdir, address, timeout=30):
+    if os.path.exists(address):
+        os.remove(address)  # Left by the previous run's daemon
+    daemon = subprocess.Popen([sys.executable, "-c", DAEMON.format(here=HERE, delay=delay, workdir=workdir, address=address)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(address):
+        if daemon.poll() is not None or time.monotonic() > deadline:
+            daemon.kill()
+            raise RuntimeError(daemon.stderr.read().strip() or "the benchmark daemon did not start")
+        time.sleep(0.01)
+    return daemon
+
+
+def run_once(delay, workdir):
+    address = os.path.join(workdir, "coolsyncd.sock")
+    daemon = start_daemon(delay, workdir, address)
+    try:
+        code = CHILD.format(here=HERE, app=APP_FILE, delay=delay, workdir=workdir, address=address)
+        result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(result.stderr.strip() or "benchmark child produced no output")
+    return json.loads(lines[-1])
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {"median_ms": statistics.median(values) * 1000, "max_ms": max(values) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CoolSyncBackup GUI startup time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--smartctl-delay", type=float, default=3.0, help="Seconds each fake smartctl call takes")
+    args = parser.parse_args()
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = []
+        for _ in range(args.runs):
+            run = run_once(args.smartctl_delay, workdir)
+            if "error" in run:
+                print(f"Cannot open a Tk window here: {run['error']}")
+                return 1
+            runs.append(run)
+
+    report = {key: summarize([run[key] for run in runs]) for key in ("import_s", "first_paint_s", "first_reading_s")}
+    report["runs"] = args.runs
+    report["smartctl_delay_s"] = args.smartctl_delay
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from extsort import sort_space
+from metrics import SyncMetrics
+from syncengine import sync_pass
+from thermal import ThermalGate
+
+# CoolSync Backup
+# Sync benchmark suite.
+# Builds reproducible synthetic trees, then times each phase of a backup on
+# its own: walking the source, the first full copy, a pass with nothing to
+# do (the change check), a pass after a percentage of the files changed and
+# a pass after a percentage was deleted. It runs the daemon's sync engine
+# and, with --engines, the console mirror_sync on the same trees, on tmpfs
+# and on a loop-mounted ext4 image (which needs root), so two versions can
+# be compared on equal terms. Temperatures come from a simulated disk that
+# warms with every byte written and cools over time, so no smartctl or
+# real drive is needed and the thermal gate still does its work.
+#
+#   python bench_sync.py --shapes tiny,wide --fs tmpfs,loop --output results.json
+#   python bench_sync.py --shapes tiny --tiny-files 2000000 --fs dir:/mnt/backup/bench
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONSOLE_FILE = os.path.join(HERE, "..", "console", "CoolSyncBackup_v0.1.0.py")
+SHAPES = ("tiny", "huge", "deep", "wide")
+ENGINES = ("daemon", "console")
+FILES_PER_DIR = 1000
+BASE_MTIME = 1_600_000_000  # Every generated file gets the same timestamps, so trees are identical run to run
+BLOCK = 1024 * 1024
+
+
+class SimulatedDisk:
+    """Temperature source for the gate: heats up per byte written, cools towards ambient."""
+
+    def __init__(self, ambient=30.0, heat_per_gb=4.0, cool_per_s=0.5, clock=time.monotonic):
+        self.ambient = ambient
+        self.heat_per_gb = heat_per_gb
+        self.cool_per_s = cool_per_s  # Share of the excess over ambient lost per second
+        self.clock = clock
+        self.temp = ambient
+        self.peak = ambient
+        self.written = 0
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def wrote(self, size):
+        with self.lock:
+            self.written += size
+
+    def sample(self, device):
+        with self.lock:
+            now = self.clock()
+            self.temp = self.ambient + (self.temp - self.ambient) * (1 - self.cool_per_s) ** (now - self.last)
+            self.temp += self.written / (1024 ** 3) * self.heat_per_gb
+            self.written = 0
+            self.last = now
+            self.peak = max(self.peak, self.temp)
+            return round(self.temp, 1)
+
+
+class BenchMetrics(SyncMetrics):
+    def __init__(self, disk):
+        super().__init__()
+        self.disk = disk
+
+    def file_copied(self, size, seconds):
+        super().file_copied(size, seconds)
+        self.disk.wrote(size)
+
+
+def write_file(path, size, rng):
+    with open(path, 'wb') as file:
+        block = rng.randbytes(min(size, BLOCK))
+        remaining = size
+        while remaining > 0:
+            file.write(block[:remaining])
+            remaining -= len(block)
+    os.utime(path, (BASE_MTIME, BASE_MTIME))
+
+
+def make_tree(root, shape, args, seed):
+    """Build one shape under root; the same seed always gives the same tree."""
+    rng = random.Random(seed)
+    os.makedirs(root)
+    if shape == "tiny":
+        for i in range(args.tiny_files):
+            directory = os.path.join(root, f"d{i // FILES_PER_DIR:05d}")
+            if i % FILES_PER_DIR == 0:
+                os.makedirs(directory)
+            write_file(os.path.join(directory, f"f{i}"), rng.randint(0, args.tiny_max_bytes), rng)
+    elif shape == "huge":
+        for i in range(args.huge_files):
+            write_file(os.path.join(root, f"huge{i}.img"), args.huge_mb * BLOCK, rng)
+    elif shape == "deep":
+        directory = root
+        for level in range(args.deep_levels):
+            directory = os.path.join(directory, f"level{level}")
+            os.makedirs(directory)
+            for i in range(args.deep_files):
+                write_file(os.path.join(directory, f"f{i}"), rng.randint(0, args.tiny_max_bytes), rng)
+    elif shape == "wide":
+        for i in range(args.wide_files):
+            write_file(os.path.join(root, f"f{i:07d}"), rng.randint(0, args.tiny_max_bytes), rng)
+    else:
+        raise ValueError(f"Unknown shape: {shape}")
+
+
+def list_files(root):
+    paths = []
+    for root_dir, dirs, files in os.walk(root):
+        dirs.sort()
+        paths.extend(os.path.join(root_dir, name) for name in sorted(files))
+    return paths
+
+
+def modify_tree(root, percent, seed):
+    """Rewrite percent of the files with new content and a newer mtime."""
+    rng = random.Random(seed)
+    paths = list_files(root)
+    changed = rng.sample(paths, min(len(paths), max(1, int(len(paths) * percent / 100)))) if percent else []
+    for path in changed:
+        size = os.path.getsize(path)
+        write_file(path, size or 1, rng)
+        os.utime(path, (BASE_MTIME + 60, BASE_MTIME + 60))
+    return len(changed)
+
+
+def delete_from_tree(root, percent, seed):
+    rng = random.Random(seed)
+    paths = list_files(root)
+    deleted = rng.sample(paths, min(len(paths), max(1, int(len(paths) * percent / 100)))) if percent else []
+    for path in deleted:
+        os.remove(path)
+    return len(deleted)
+
+
+def tree_size(root):
+    files = size = 0
+    for path in list_files(root):
+        files += 1
+        size += os.path.getsize(path)
+    return files, size
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def scan_phase(source):
+    # The raw walk and stat every engine pays at least once per pass
+    def walk():
+        for root_dir, dirs, files in os.walk(source):
+            for name in files:
+                os.lstat(os.path.join(root_dir, name))
+    return timed(walk)
+
+
+def daemon_pass(source, destination, gate, metrics, stream_memory_mb=None):
+    def run():
+        with sort_space(stream_memory_mb, os.path.dirname(destination)) as space:
+            sync_pass(source, destination, threading.Event(), lambda message: None, gate, metrics, sort_space=space)
+    return timed(run)
+
+
+def console_pass(module, source, destination):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.mirror_sync(source, destination, HERE)
+    return timed(run)
+
+
+def load_console():
+    spec = importlib.util.spec_from_file_location("coolsync_console", CONSOLE_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def phase(seconds, files, size, waited=0.0):
+    return {"seconds": seconds, "files": files, "bytes": size, "files_per_s": files / seconds if seconds else None,
+            "mb_per_s": size / BLOCK / seconds if seconds else None, "thermal_wait_s": waited}
+
+
+def bench_engine(engine, work, shape, args, console):
+    source = os.path.join(work, "source")
+    destination = os.path.join(work, "backup")
+    started = time.perf_counter()
+    make_tree(source, shape, args, args.seed)
+    files, size = tree_size(source)
+    results = {"generate": phase(time.perf_counter() - started, files, size), "scan": phase(scan_phase(source), files, 0)}
+    os.makedirs(destination)
+
+    disk = SimulatedDisk(heat_per_gb=args.heat_per_gb)
+    gate = ThermalGate({"bench": {"mount": work, "safe_temp": args.safe_temp, "high_temp": args.high_temp, "min_dwell": 0}},
+                       sample=disk.sample, poll_interval=0.2)
+
+    def run_pass(name, files, size):
+        metrics = BenchMetrics(disk)
+        waited = gate.total_wait_seconds()
+        if engine == "daemon":
+            seconds = daemon_pass(source, destination, gate, metrics, args.stream_memory_mb)
+        else:
+            seconds = console_pass(console, source, destination)
+        results[name] = phase(seconds, files, size, gate.total_wait_seconds() - waited)
+
+    run_pass("copy", files, size)
+    run_pass("diff", files, 0)
+    changed = modify_tree(source, args.modified, args.seed + 1)
+    run_pass("incremental", changed, 0)
+    deleted = delete_from_tree(source, args.deleted, args.seed + 2)
+    run_pass("delete", deleted, 0)
+    if engine == "daemon":
+        results["peak_simulated_temp"] = disk.peak  # The console version has no thermal gate
+    shutil.rmtree(source)
+    shutil.rmtree(destination)
+    return results
+
+
+@contextlib.contextmanager
+def filesystem(kind, args):
+    """Yields a directory on the requested filesystem, or raises RuntimeError."""
+    if kind.startswith("dir:"):
+        with tempfile.TemporaryDirectory(dir=kind[4:]) as work:
+            yield work
+    elif kind == "tmpfs":
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        if base is None:
+            raise RuntimeError("no /dev/shm on this system")
+        with tempfile.TemporaryDirectory(dir=base) as work:
+            yield work
+    elif kind == "loop":
+        with tempfile.TemporaryDirectory(dir=args.loop_image_dir) as scratch:
+            image = os.path.join(scratch, "bench.img")
+            mount = os.path.join(scratch, "mnt")
+            os.makedirs(mount)
+            with open(image, 'wb') as file:
+                file.truncate(args.loop_mb * BLOCK)
+            try:
+                subprocess.run(["mkfs.ext4", "-q", "-F", image], check=True, capture_output=True)
+                subprocess.run(["mount", "-o", "loop", image, mount], check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                raise RuntimeError(f"cannot create the loop mount (needs root and mkfs.ext4): {e}")
+            try:
+                yield mount
+            finally:
+                subprocess.run(["umount", mount], check=False)
+    else:
+        raise RuntimeError(f"unknown filesystem {kind}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time scan, copy, change check, incremental and delete passes on synthetic trees.")
+    parser.add_argument("--shapes", default="tiny,huge,deep,wide", help=f"Comma separated, from {', '.join(SHAPES)}")
+    parser.add_argument("--fs", default="tmpfs,loop", help="Comma separated: tmpfs, loop, or dir:<path>")
+    parser.add_argument("--engines", default="daemon", help=f"Comma separated, from {', '.join(ENGINES)}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tiny-files", type=int, default=100000)
+    parser.add_argument("--tiny-max-bytes", type=int, default=4096)
+    parser.add_argument("--huge-files", type=int, default=4)
+    parser.add_argument("--huge-mb", type=int, default=64)
+    parser.add_argument("--deep-levels", type=int, default=200)
+    parser.add_argument("--deep-files", type=int, default=10)
+    parser.add_argument("--wide-files", type=int, default=50000)
+    parser.add_argument("--modified", type=float, default=5.0, help="Percent of files changed before the incremental pass")
+    parser.add_argument("--deleted", type=float, default=5.0, help="Percent of files deleted before the delete pass")
+    parser.add_argument("--stream-memory-mb", type=float, help="Run the daemon engine in streaming mode with this memory cap")
+    parser.add_argument("--safe-temp", type=float, default=40.0)
+    parser.add_argument("--high-temp", type=float, default=50.0)
+    parser.add_argument("--heat-per-gb", type=float, default=4.0, help="Simulated degrees per GB written")
+    parser.add_argument("--loop-mb", type=int, default=4096, help="Size of the loop-mounted image")
+    parser.add_argument("--loop-image-dir", help="Where the loop image lives (default: the temp directory)")
+    parser.add_argument("--output", help="Write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    shapes = [shape for shape in args.shapes.split(",") if shape]
+    engines = [engine for engine in args.engines.split(",") if engine]
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error(f"unknown shape {shape}")
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine}")
+    console = load_console() if "console" in engines else None
+
+    results = {}
+    for kind in [kind for kind in args.fs.split(",") if kind]:
+        try:
+            with filesystem(kind, args) as work:
+                results[kind] = {shape: {engine: bench_engine(engine, os.path.join(work, f"{shape}-{engine}"), shape, args, console)
+                                         for engine in engines} for shape in shapes}
+        except RuntimeError as e:
+            results[kind] = {"error": str(e)}
+    report = json.dumps({"settings": vars(args), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
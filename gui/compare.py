@@ -0,0 +1,101 @@
+import os
+import shutil
+import threading
+
+from manifest import new_hash
+
+# CoolSync Backup
+# How a sync decides that a file needs copying.
+#   "mtime"    - copy when the source is newer than the backup (the original rule)
+#   "metadata" - a newer source of the same size is first checked for real
+#                changes. If the manifest holds a hash of the backup copy and
+#                the copy is untouched since, the source is hashed and
+#                compared with it. Otherwise, with a hash cache, both files
+#                are hashed through it, after a quick look at their first and
+#                last EDGE_BYTES. If the content is the same, only timestamps
+#                and permissions are updated, so a touch, chmod or unpacked
+#                archive does not recopy the data. Without a full hash the
+#                file is copied: equal edges say nothing about the middle.
+#   "checksum" - like rsync --checksum: every file of the same size is
+#                compared by content hash, whatever its mtime says. Hashes
+#                come from the hash cache, so only files whose stat changed
+#                are read, and the backup side from the manifest when it can.
+# With a HashCache, "metadata" also takes the source hash from the cache.
+
+COMPARE_MODES = ("mtime", "metadata", "checksum")
+EDGE_BYTES = 64 * 1024
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+    digest = new_hash()
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(HASH_CHUNK)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+def same_edges(src_file, dest_file, size):
+    """Compare the first and last EDGE_BYTES of two files of the same size."""
+    with open(src_file, 'rb') as source, open(dest_file, 'rb') as dest:
+        if source.read(EDGE_BYTES) != dest.read(EDGE_BYTES):
+            return False
+        if size > EDGE_BYTES:
+            tail = max(EDGE_BYTES, size - EDGE_BYTES)
+            source.seek(tail)
+            dest.seek(tail)
+            return source.read() == dest.read()
+        return True
+
+
+class Comparator:
+    def __init__(self, mode="mtime", manifest=None, hash_cache=None):
+        if mode not in COMPARE_MODES:
+            raise ValueError(f"Unknown compare mode: {mode}")
+        self.mode = mode
+        self.manifest = manifest
+        self.hash_cache = hash_cache
+        self.lock = threading.Lock()
+        self.metadata_only = 0  # Files whose metadata was fixed up instead of copied
+        self.avoided_bytes = 0
+
+    def needs_copy(self, rel_path, src_file, dest_file):
+        """Returns the source size if the file must be copied, otherwise None."""
+        src_stat = os.stat(src_file)
+        try:
+            dest_stat = os.stat(dest_file)
+        except FileNotFoundError:
+            return src_stat.st_size
+        if self.mode != "checksum" and src_stat.st_mtime <= dest_stat.st_mtime:
+            return None
+        if self.mode == "mtime" or src_stat.st_size != dest_stat.st_size:
+            return src_stat.st_size
+        row = self.manifest.lookup(rel_path) if self.manifest is not None else None
+        if row is not None and row[:2] == (dest_stat.st_size, dest_stat.st_mtime_ns):
+            same = self.hash(src_file, src_stat) == row[2]
+        elif self.mode == "checksum":
+            row = None
+            same = self.hash(src_file, src_stat) == self.hash(dest_file, dest_stat)
+        elif self.hash_cache is not None:
+            row = None
+            same = (same_edges(src_file, dest_file, src_stat.st_size)
+                    and self.hash(src_file, src_stat) == self.hash(dest_file, dest_stat))
+        else:
+            return src_stat.st_size  # No full hash of the backup copy to trust
+        if not same:
+            return src_stat.st_size
+        if src_stat.st_mtime_ns == dest_stat.st_mtime_ns and src_stat.st_mode == dest_stat.st_mode:
+            return None  # Checksum mode: nothing changed at all
+        shutil.copystat(src_file, dest_file)
+        if row is not None:
+            # Keep the scrub from taking the new mtime for a changed file
+            self.manifest.record(rel_path, dest_stat.st_size, os.stat(dest_file).st_mtime_ns, row[2])
+        with self.lock:
+            self.metadata_only += 1
+            self.avoided_bytes += src_stat.st_size
+        return None
+
+    def hash(self, path, stat):
+        return self.hash_cache.hash(path, stat) if self.hash_cache is not None else hash_file(path)
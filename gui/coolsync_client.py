@@ -0,0 +1,187 @@
+import json
+import os
+import socket
+import sys
+import time
+
+from settings import STATE_DIR
+
+# CoolSync Backup
+# Client side of the coolsyncd JSON-lines protocol.
+# Every request is one JSON object per line, answered by one JSON line.
+# "subscribe" turns the connection into a stream of event lines instead.
+# Over TCP every request also carries the daemon's token, which it writes to
+# a file only the user can read (a Unix socket is protected by its mode).
+#
+#   python coolsync_client.py status|start|stop|metrics|reload|shutdown
+#   python coolsync_client.py scrub --job photos --fraction 0.1
+#   python coolsync_client.py restore --job photos --path 2023/holiday --target C:/Restored
+
+DEFAULT_PORT = 47800  # Used where Unix domain sockets are not available
+CONNECT_TIMEOUT = 5
+SPAWN_TIMEOUT = 10
+
+
+def default_address():
+    # COOLSYNC_ADDRESS overrides the address, e.g. to run a second daemon for testing
+    if os.environ.get('COOLSYNC_ADDRESS'):
+        return parse_address(os.environ['COOLSYNC_ADDRESS'])
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.join(STATE_DIR, 'coolsyncd.sock')
+    return ('127.0.0.1', DEFAULT_PORT)
+
+
+def parse_address(text):
+    # "host:port" is TCP, anything else is a Unix socket path
+    host, _, port = text.rpartition(':')
+    if host and port.isdigit() and not os.path.isabs(text):
+        return (host, int(port))
+    return text
+
+
+def format_address(address):
+    if isinstance(address, tuple):
+        return f"{address[0]}:{address[1]}"
+    return address
+
+
+def token_path(address):
+    return os.path.join(STATE_DIR, f'coolsyncd-{address[1]}.token')
+
+
+def read_token(address):
+    # None for a Unix socket, or when no daemon has written a token yet
+    if not isinstance(address, tuple):
+        return None
+    try:
+        with open(token_path(address)) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def connect(address, timeout=CONNECT_TIMEOUT):
+    if isinstance(address, tuple):
+        sock = socket.create_connection(address, timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+    return sock
+
+
+class DaemonClient:
+    def __init__(self, address=None):
+        self.address = address or default_address()
+
+    def request(self, cmd, **fields):
+        with connect(self.address) as sock:
+            sock.sendall(self.encode(dict(cmd=cmd, **fields)))
+            with sock.makefile('r', encoding='utf-8') as reader:
+                line = reader.readline()
+        if not line:
+            raise ConnectionError("coolsyncd closed the connection")
+        return json.loads(line)
+
+    def encode(self, request):
+        token = read_token(self.address)
+        if token:
+            request['token'] = token
+        return (json.dumps(request) + '\n').encode('utf-8')
+
+    def is_running(self):
+        try:
+            return self.request('ping').get('ok', False)
+        except OSError:
+            return False
+
+    def subscribe(self, callback, stop_event, retry_interval=2):
+        """
+        Call callback(event) for every event line until stop_event is set.
+        Reconnects after the daemon goes away; callback sees a
+        {"event": "disconnected"} message each time that happens.
+        """
+        while not stop_event.is_set():
+            try:
+                with connect(self.address) as sock:
+                    sock.sendall(self.encode({"cmd": "subscribe"}))
+                    sock.settimeout(1)
+                    buffer = b''
+                    while not stop_event.is_set():
+                        try:
+                            chunk = sock.recv(65536)
+                        except socket.timeout:
+                            continue
+                        if not chunk:
+                            break
+                        buffer += chunk
+                        *lines, buffer = buffer.split(b'\n')
+                        for line in lines:
+                            if line.strip():
+                                callback(json.loads(line))
+            except OSError:
+                pass
+            if not stop_event.is_set():
+                callback({"event": "disconnected"})
+                stop_event.wait(retry_interval)
+
+
+def spawn_daemon(config_path, address):
+    import subprocess  # Deferred: only needed when no daemon is running yet
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'coolsyncd.py')
+    command = [sys.executable, script, '--config', os.path.abspath(config_path), '--address', format_address(address)]
+    if os.name == 'nt':
+        flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        subprocess.Popen(command, creationflags=flags, close_fds=True)
+    else:
+        # A new session, so closing the GUI (or its terminal) does not stop the backup
+        subprocess.Popen(command, start_new_session=True, stdin=subprocess.DEVNULL,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True)
+
+
+def ensure_daemon(client, config_path, timeout=SPAWN_TIMEOUT):
+    """Connect to a running coolsyncd, starting one in the background if needed."""
+    if client.is_running():
+        return True
+    spawn_daemon(config_path, client.address)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.is_running():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Control a running coolsyncd.")
+    parser.add_argument('command', choices=['status', 'start', 'stop', 'metrics', 'reload', 'shutdown', 'scrub', 'restore'])
+    parser.add_argument('--address', help="Unix socket path or host:port")
+    parser.add_argument('--job', help="Job to scrub or restore (default: \"default\")")
+    parser.add_argument('--fraction', type=float, help="Share of the files to scrub")
+    parser.add_argument('--mode', choices=['rolling', 'sample'], help="Scrub mode")
+    parser.add_argument('--path', help="Folder or file inside the backup to restore (default: all of it)")
+    parser.add_argument('--snapshot', help="Snapshot to restore from (snapshot jobs; default: latest)")
+    parser.add_argument('--target', help="Folder to restore into")
+    parser.add_argument('--workers', type=int, help="Files copied at a time")
+    args = parser.parse_args()
+    client = DaemonClient(parse_address(args.address) if args.address else None)
+    options = {
+        'scrub': ('job', 'fraction', 'mode'),
+        'restore': ('job', 'path', 'snapshot', 'target', 'workers'),
+    }.get(args.command, ())
+    fields = {name: getattr(args, name) for name in options if getattr(args, name) is not None}
+    try:
+        print(json.dumps(client.request(args.command, **fields), indent=2))
+    except OSError as e:
+        print(f"Could not reach coolsyncd at {format_address(client.address)}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
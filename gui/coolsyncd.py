@@ -0,0 +1,378 @@
+import argparse
+import errno
+import hmac
+import json
+import os
+import queue
+import re
+import secrets
+import socketserver
+import sys
+import threading
+
+from coolsync_client import connect, default_address, format_address, parse_address, token_path
+from eventlog import open_event_log
+from jobs import JobScheduler
+from manifest import Manifest, manifest_path
+from metrics import SyncMetrics
+from schedule import HISTORY_SAVE_INTERVAL, BackupSchedule, TemperatureHistory
+from restore import DEFAULT_RESTORE_WORKERS, restore
+from runreport import RunReports
+from scrub import scrub
+from settings import CONFIG_FILE, STATE_DIR, find_job, load_config
+from thermal import DISPLAY_INTERVAL, ThermalGate
+
+# CoolSync Backup
+# Headless sync daemon.
+# Owns scanning, copying and thermal control, and serves status, start/stop
+# and live metrics as JSON lines over a Unix domain socket (TCP on localhost
+# where Unix sockets are not available, with a token every request must
+# carry; see coolsync_client). The Tk window is just one client;
+# the backup keeps running whether or not anyone is connected. All configured
+# jobs run under one scheduler and share one thermal gate; the "schedule"
+# section of the config decides when passes may start.
+#
+#   python coolsyncd.py --config ../config.json [--start]
+
+SUBSCRIBER_QUEUE_SIZE = 1000  # Events buffered per subscriber before it starts missing some
+METRICS_INTERVAL = 1  # Seconds between metrics events to subscribers
+
+
+class SyncDaemon:
+    def __init__(self, config_path, state_dir=STATE_DIR):
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.state_dir = state_dir
+        self.manifest_dir = os.path.join(state_dir, 'manifests')
+        self.history = TemperatureHistory(os.path.join(state_dir, 'temperature_history.json'))
+        self.metrics = SyncMetrics()
+        self.event_log = open_event_log(self.config.get('event_log'), os.path.join(state_dir, 'events.jsonl'))
+        self.status = "Ready"
+        self.temperatures = {}
+        self.gate = ThermalGate(self.config['devices'])
+        self.scheduler = None
+        self.sync_thread = None
+        self.stop_event = threading.Event()
+        self.shutdown_event = threading.Event()
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def running(self):
+        return self.sync_thread is not None and self.sync_thread.is_alive()
+
+    def add_subscriber(self, events):
+        with self.lock:
+            self.subscribers.add(events)
+
+    def remove_subscriber(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def publish(self, event, **fields):
+        message = dict(event=event, **fields)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(message)
+            except queue.Full:
+                pass  # A slow client misses events; the engine never waits for it
+
+    def report(self, message):
+        self.status = message
+        print(message)
+        self.publish('status', message=message)
+        self.event_log.emit('status', message=message)
+
+    def on_temperatures(self, temperatures):
+        self.temperatures = temperatures
+        self.metrics.record_temperatures(temperatures)
+        self.publish('temperatures', temperatures=temperatures)
+
+    def record_history(self):
+        # The display, the dashboard and the hour-of-day profile for the "coolest" schedule all take the
+        # gate's own readings, so they show the samples the gate decided on; recorded whether or not a sync runs
+        last_save = 0.0
+        while True:
+            self.gate.refresh()
+            with self.gate.lock:
+                temperatures = dict(self.gate.temperatures)
+            self.on_temperatures({device: 'N/A' if temp is None else temp for device, temp in temperatures.items()})
+            self.history.record(temperatures, self.config['devices'])
+            if self.shutdown_event.wait(DISPLAY_INTERVAL):
+                break
+            last_save += DISPLAY_INTERVAL
+            if last_save >= HISTORY_SAVE_INTERVAL:
+                self.history.save()
+                last_save = 0.0
+        self.history.save()
+
+    def publish_metrics(self):
+        while not self.shutdown_event.wait(METRICS_INTERVAL):
+            if self.subscribers:
+                self.publish('metrics', metrics=self.metrics.snapshot())
+
+    def start(self, jobs=None, monitor_interval=None):
+        with self.lock:
+            if self.running():
+                return {"ok": False, "error": "Sync already running"}
+            selected = [job for job in self.config['jobs'] if jobs is None or job['name'] in jobs]
+            interval = monitor_interval if monitor_interval is not None else self.config.get('monitor_interval', 1)
+            if not selected:
+                return {"ok": False, "error": "No sync jobs configured"}
+            for job in selected:
+                if not job.get('source_folder') or not job.get('destination_folder'):
+                    return {"ok": False, "error": f"Job {job['name']}: source and destination folders must be set"}
+            try:
+                schedule = BackupSchedule(self.config.get('schedule'), self.history, os.path.join(self.state_dir, 'last_runs.json'))
+            except (KeyError, ValueError) as e:
+                return {"ok": False, "error": f"Invalid schedule: {e}"}
+
+            def mirror_default(job, key):
+                # The trash and compare modes are for mirror jobs; a snapshot job only gets its own setting, which it rejects
+                return job.get(key, self.config.get(key) if job.get('mode', 'mirror') == 'mirror' else None)
+
+            # Jobs without their own filters, quarantine, compare, streaming or agent settings use the top-level ones
+            selected = [dict(job, filters=job.get('filters', self.config.get('filters')),
+                             quarantine_days=mirror_default(job, 'quarantine_days'),
+                             compare=mirror_default(job, 'compare'),
+                             stream_memory_mb=job.get('stream_memory_mb', self.config.get('stream_memory_mb')),
+                             agent_token=job.get('agent_token', self.config.get('agent_token')))
+                        for job in selected]
+            try:
+                scheduler = JobScheduler(selected, self.gate, self.report, self.metrics, interval, schedule, self.manifest_dir,
+                                         self.config.get('copy_workers', 1), os.path.join(self.state_dir, 'hashcache.sqlite'),
+                                         RunReports(self.config.get('reports'), os.path.join(self.state_dir, 'reports')),
+                                         self.event_log, self.config.get('sort_dir') or os.path.join(self.state_dir, 'sort'))
+            except (re.error, KeyError, TypeError, ValueError) as e:
+                return {"ok": False, "error": f"Invalid job settings: {e}"}
+            self.stop_event.clear()
+            self.scheduler = scheduler
+            self.sync_thread = threading.Thread(target=self.run_sync, daemon=True)
+            self.sync_thread.start()
+        return {"ok": True, "message": f"Sync started ({len(selected)} job{'s' if len(selected) != 1 else ''})"}
+
+    def run_sync(self):
+        try:
+            self.scheduler.run(self.stop_event)
+        except Exception as e:
+            self.report(f"Sync failed: {e}")
+
+    def start_task(self, label, job_name, task, **kwargs):
+        # One-off work on a job's destination (scrub, restore); stop_sync stops it too
+        with self.lock:
+            if self.running():
+                return {"ok": False, "error": f"Sync running; stop it before starting a {label.lower()}"}
+            job = find_job(self.config['jobs'], job_name)
+            if job is None:
+                return {"ok": False, "error": f"Unknown job: {job_name}"}
+            self.stop_event.clear()
+            self.sync_thread = threading.Thread(target=self.run_task, args=(label, job, task, kwargs), daemon=True)
+            self.sync_thread.start()
+        return {"ok": True, "message": f"{label} of {job_name} started"}
+
+    def run_task(self, label, job, task, kwargs):
+        def report(message):
+            self.report(f"[{job['name']}] {message}")
+        manifest = Manifest(manifest_path(self.manifest_dir, job['name']))
+        try:
+            task(job, manifest, report, **kwargs)
+        except Exception as e:
+            report(f"{label} failed: {e}")
+        finally:
+            manifest.close()
+
+    def run_scrub(self, job, manifest, report, fraction=None, mode=None):
+        settings = dict(job.get('scrub') or {})
+        if fraction is not None:
+            settings['fraction'] = fraction
+        if mode is not None:
+            settings['mode'] = mode
+        scrub(manifest, job['destination_folder'], self.stop_event, report, self.gate, **settings)
+
+    def run_restore(self, job, manifest, report, path='', target=None, snapshot=None, workers=None):
+        if job.get('mode') != 'snapshot' and snapshot is not None:
+            raise ValueError("Only snapshot jobs have snapshots")
+        if job.get('mode') == 'snapshot' and snapshot is None:
+            snapshot = 'latest'
+        restore(job['destination_folder'], path, target, self.stop_event, report, self.gate, manifest, snapshot,
+                workers or self.config.get('copy_workers', DEFAULT_RESTORE_WORKERS))
+
+    def stop(self):
+        self.stop_event.set()
+        return {"ok": True, "message": "Stopping sync"}
+
+    def reload(self):
+        # Takes effect now when idle, otherwise for the next sync started; the display follows the gate
+        self.config = load_config(self.config_path)
+        with self.lock:
+            if not self.running():
+                self.gate = ThermalGate(self.config['devices'])
+        return {"ok": True, "message": "Configuration reloaded"}
+
+    def status_message(self):
+        return {
+            "running": self.running(),
+            "status": self.status,
+            "temperatures": self.temperatures,
+            "states": self.gate.states(),
+            "time_in_states": self.gate.time_in_states(),  # Seconds per device and state since the gate was created
+            "jobs": self.config['jobs'],
+            "running_jobs": self.scheduler.running_jobs() if self.scheduler and self.running() else [],
+            "schedule": self.config.get('schedule', {"mode": "always"}),
+        }
+
+    def handle(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            return {"ok": True}
+        if cmd == 'status':
+            return dict(ok=True, **self.status_message())
+        if cmd == 'metrics':
+            return {"ok": True, "metrics": self.metrics.snapshot()}
+        if cmd == 'start':
+            return self.start(request.get('jobs'), request.get('monitor_interval'))
+        if cmd == 'scrub':
+            return self.start_task("Scrub", request.get('job', 'default'), self.run_scrub,
+                                   fraction=request.get('fraction'), mode=request.get('mode'))
+        if cmd == 'restore':
+            if not request.get('target'):
+                return {"ok": False, "error": "A target folder is required"}
+            return self.start_task("Restore", request.get('job', 'default'), self.run_restore, path=request.get('path', ''),
+                                   target=request['target'], snapshot=request.get('snapshot'), workers=request.get('workers'))
+        if cmd == 'stop':
+            return self.stop()
+        if cmd == 'reload':
+            return self.reload()
+        if cmd == 'shutdown':
+            self.stop()
+            self.shutdown_event.set()
+            return {"ok": True, "message": "Shutting down"}
+        return {"ok": False, "error": f"Unknown command: {cmd}"}
+
+
+class ClientHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.sync_daemon
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.send({"ok": False, "error": "Invalid JSON"})
+                continue
+            token = self.server.token
+            if token and not hmac.compare_digest(str(request.get('token', '')).encode(), token.encode()):
+                self.send({"ok": False, "error": "Wrong or missing daemon token"})
+                return
+            if request.get('cmd') == 'subscribe':
+                self.stream(daemon)
+                return
+            self.send(daemon.handle(request))
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+
+    def stream(self, daemon):
+        events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        daemon.add_subscriber(events)
+        try:
+            self.send(dict(event='hello', **daemon.status_message()))
+            while not daemon.shutdown_event.is_set():
+                try:
+                    message = events.get(timeout=1)
+                except queue.Empty:
+                    continue
+                self.send(message)
+        except OSError:
+            pass  # Client went away
+        finally:
+            daemon.remove_subscriber(events)
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def make_server(address, daemon):
+    if isinstance(address, tuple):
+        server = TCPServer(address, ClientHandler)
+        # Anyone on the machine can reach a TCP port, so clients must prove they can read the token file
+        server.token = secrets.token_urlsafe(32)
+        write_private(token_path(server.server_address), server.token)
+    else:
+        os.makedirs(os.path.dirname(address) or '.', mode=0o700, exist_ok=True)
+        if os.path.exists(address):
+            try:
+                connect(address).close()
+            except OSError:
+                os.remove(address)  # Stale socket from a daemon that did not shut down cleanly
+            else:
+                raise OSError(errno.EADDRINUSE, f"coolsyncd is already running on {address}")
+        # Created under a umask so there is no moment where others may connect; only the owner may control backups
+        umask = os.umask(0o177)
+        try:
+            server = UnixServer(address, ClientHandler)
+        finally:
+            os.umask(umask)
+        server.token = None
+    server.sync_daemon = daemon
+    return server
+
+
+def write_private(path, text):
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)  # A new file gets the umask below; an old one would keep its mode
+    umask = os.umask(0o177)
+    try:
+        with open(path, 'w') as file:
+            file.write(text)
+    finally:
+        os.umask(umask)
+
+
+def serve(daemon, address, start=False):
+    server = make_server(address, daemon)
+    history_thread = threading.Thread(target=daemon.record_history, daemon=True)
+    history_thread.start()
+    threading.Thread(target=daemon.publish_metrics, daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"coolsyncd listening on {format_address(address)}")
+    if start:
+        print(daemon.start())
+    daemon.shutdown_event.wait()
+    server.shutdown()
+    server.server_close()
+    history_thread.join()
+    if daemon.sync_thread:
+        daemon.sync_thread.join()
+    daemon.event_log.close()
+    if isinstance(address, tuple):
+        os.remove(token_path(server.server_address))
+    elif os.path.exists(address):
+        os.remove(address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CoolSyncBackup headless sync daemon.")
+    parser.add_argument('--config', default=CONFIG_FILE, help="Path to config.json")
+    parser.add_argument('--address', help="Unix socket path or host:port to listen on")
+    parser.add_argument('--start', action='store_true', help="Start syncing right away")
+    args = parser.parse_args()
+    address = parse_address(args.address) if args.address else default_address()
+    daemon = SyncDaemon(args.config)
+    try:
+        serve(daemon, address, args.start)
+    except KeyboardInterrupt:
+        daemon.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import errno
+import os
+import shutil
+import threading
+
+from manifest import new_hash
+
+# CoolSync Backup
+# Parallel copy executor shared by sync and restore.
+# Each copy waits on the thermal gate for the devices it touches before it
+# starts, so a hot disk stalls only the copies that need it. At most
+# workers * QUEUE_FACTOR copies are queued, which keeps the caller from
+# racing ahead of the disks. With one worker copies run inline on the
+# caller's thread, exactly as before there was an executor.
+#
+# Copies keep holes: a sparse source (a VM image, a database file) is copied
+# region by region with SEEK_DATA/SEEK_HOLE, so the destination stays
+# sparse instead of gaining gigabytes of zeros. Dense files of at least
+# PREALLOCATE_MIN bytes are preallocated to their final size first, so the
+# filesystem can place them in one piece rather than growing them chunk by
+# chunk. Where the OS has neither (Windows), shutil.copy2 is used.
+
+QUEUE_FACTOR = 2
+COPY_CHUNK = 1024 * 1024
+PREALLOCATE_MIN = 1024 * 1024  # Smaller files gain nothing from preallocation
+SEEK_HOLES = hasattr(os, 'SEEK_DATA')
+PREALLOCATE = hasattr(os, 'posix_fallocate')
+ZEROS = bytes(COPY_CHUNK)
+
+
+def is_sparse(stat):
+    """True if fewer blocks are allocated than the size needs, i.e. the file has holes."""
+    blocks = getattr(stat, 'st_blocks', None)
+    return blocks is not None and blocks * 512 < stat.st_size
+
+
+def data_regions(fd, size):
+    """[(start, end)] of the parts of fd holding data; everything else reads as zeros."""
+    regions = []
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # Only a hole left
+                break
+            raise
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        regions.append((start, end))
+        offset = end
+    return regions
+
+
+def copy_range(source, dest, start, end, digest):
+    """Copy bytes start..end (to end of file if end is None); returns where it stopped."""
+    source.seek(start)
+    dest.seek(start)
+    position = start
+    while end is None or position < end:
+        chunk = source.read(COPY_CHUNK if end is None else min(COPY_CHUNK, end - position))
+        if not chunk:
+            break
+        if digest is not None:
+            digest.update(chunk)
+        dest.write(chunk)
+        position += len(chunk)
+    return position
+
+
+def hash_zeros(digest, length):
+    while length > 0:
+        digest.update(ZEROS[:min(length, COPY_CHUNK)])
+        length -= COPY_CHUNK
+
+
+def copy_file(src_file, dest_file, want_hash=False):
+    """Copy data and metadata; returns the hex digest of the bytes copied if want_hash."""
+    if not (SEEK_HOLES or PREALLOCATE or want_hash):
+        shutil.copy2(src_file, dest_file)
+        return None
+    digest = new_hash() if want_hash else None
+    with open(src_file, 'rb') as source, open(dest_file, 'wb') as dest:
+        stat = os.fstat(source.fileno())
+        size = stat.st_size
+        regions = None
+        if SEEK_HOLES and is_sparse(stat):
+            try:
+                regions = data_regions(source.fileno(), size)
+            except OSError:
+                pass  # Filesystem without hole support: copy it whole
+        if regions is not None:
+            dest.truncate(size)  # Holes are simply never written
+            offset = 0
+            for start, end in regions:
+                if digest is not None:
+                    hash_zeros(digest, start - offset)
+                offset = copy_range(source, dest, start, end, digest)
+            if digest is not None:
+                hash_zeros(digest, size - offset)
+        else:
+            if PREALLOCATE and size >= PREALLOCATE_MIN:
+                try:
+                    os.posix_fallocate(dest.fileno(), 0, size)
+                except OSError:
+                    pass  # Not supported here (e.g. some network filesystems)
+            # To the end like copy2, and never keep a preallocated tail if the file shrank meanwhile
+            dest.truncate(copy_range(source, dest, 0, None, digest))
+    shutil.copystat(src_file, dest_file)
+    return digest.hexdigest() if digest is not None else None
+
+
+class CopyExecutor:
+    def __init__(self, workers, wait_for, stop_event):
+        self.workers = max(1, workers)
+        self.wait_for = wait_for  # wait_for(devices) -> False once stopped
+        self.stop_event = stop_event
+        self.pool = None
+        if self.workers > 1:
+            from concurrent.futures import ThreadPoolExecutor  # Deferred: unused with a single worker
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='copy')
+        self.slots = threading.BoundedSemaphore(self.workers * QUEUE_FACTOR)
+        self.errors = []
+
+    def submit(self, devices, function, *args, on_done=None):
+        """
+        Run function(*args) once devices are cool, then on_done(result) on the
+        same thread. Returns False if stopped before it could be queued.
+        """
+        if self.pool is None:
+            if not self.wait_for(devices):
+                return False
+            result = function(*args)
+            if on_done is not None:
+                on_done(result)
+            return True
+        while not self.slots.acquire(timeout=0.5):
+            if self.stop_event.is_set():
+                return False
+        if self.errors:
+            self.slots.release()
+            raise self.errors[0]
+        self.pool.submit(self._run, devices, function, args, on_done)
+        return True
+
+    def _run(self, devices, function, args, on_done):
+        try:
+            if self.wait_for(devices):
+                result = function(*args)
+                if on_done is not None:
+                    on_done(result)
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            self.slots.release()
+
+    def join(self):
+        """Wait for every queued copy; re-raises the first copy error."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        if self.errors:
+            raise self.errors[0]
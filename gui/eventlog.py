@@ -0,0 +1,130 @@
+import json
+import os
+import queue
+import threading
+import time
+
+# CoolSync Backup
+# Structured event log.
+# Events are one JSON object per line, each with "ts" (Unix time) and "event"
+# plus numeric fields, so runs can be aggregated with jq, pandas or a log
+# shipper instead of parsing status strings:
+#   run_started     job, mode, source, destination
+#   file_copied     job, path, bytes, seconds
+#   file_failed     job, path, error
+#   thermal_pause   job, devices, temperatures
+#   thermal_resume  job, devices, paused_seconds
+#   run_finished    job, completed, seconds, files_copied, bytes_copied, files_deleted, moved_to_trash,
+#                   errors, paused_seconds
+#   status          message (the daemon's status line)
+# emit() only puts the event on a queue; a writer thread does the file work
+# and rotates the file at max_mb, keeping `backups` old files (events.jsonl.1
+# is the newest). If the writer falls QUEUE_SIZE events behind, new events
+# are dropped and counted rather than blocking a copy.
+#
+#   "event_log": {"path": "~/.coolsync/events.jsonl", "max_mb": 10, "backups": 5}   (false turns it off)
+
+QUEUE_SIZE = 100000
+DEFAULT_MAX_MB = 10
+DEFAULT_BACKUPS = 5
+
+
+def rotate_files(path, backups):
+    """Shift path.1..path.<backups - 1> up by one and move path to path.1 (or delete it with no backups)."""
+    for index in range(backups - 1, 0, -1):
+        older = f"{path}.{index}"
+        if os.path.exists(older):
+            os.replace(older, f"{path}.{index + 1}")
+    if backups:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+class EventLog:
+    def __init__(self, path, max_mb=DEFAULT_MAX_MB, backups=DEFAULT_BACKUPS):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.thread = threading.Thread(target=self.write_loop, name='event-log', daemon=True)
+        self.thread.start()
+
+    def emit(self, event, **fields):
+        try:
+            self.queue.put_nowait(dict(ts=time.time(), event=event, **fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def bind(self, **fields):
+        """An emitter that adds fields (e.g. job=name) to every event."""
+        return BoundEvents(self, fields)
+
+    def rotate(self, file):
+        file.close()
+        rotate_files(self.path, self.backups)
+        return open(self.path, 'a', encoding='utf-8')
+
+    def write_loop(self):
+        file = open(self.path, 'a', encoding='utf-8')
+        size = file.tell()
+        reported_drops = 0
+        try:
+            while True:
+                event = self.queue.get()
+                if event is None:
+                    break
+                if self.dropped != reported_drops:
+                    # Recorded late, but an analysis can see there is a gap
+                    line = json.dumps({"ts": time.time(), "event": "events_dropped", "count": self.dropped - reported_drops})
+                    reported_drops = self.dropped
+                    file.write(line + '\n')
+                    size += len(line) + 1
+                line = json.dumps(event, default=str)
+                file.write(line + '\n')
+                size += len(line) + 1
+                if self.queue.empty():
+                    file.flush()
+                if size >= self.max_bytes:
+                    file = self.rotate(file)
+                    size = 0
+        finally:
+            file.close()
+
+    def close(self):
+        """Write out everything queued and stop the writer."""
+        self.queue.put(None)
+        self.thread.join()
+
+
+class BoundEvents:
+    def __init__(self, log, fields):
+        self.log = log
+        self.fields = fields
+
+    def emit(self, event, **fields):
+        self.log.emit(event, **self.fields, **fields)
+
+
+class NullEvents:
+    """Stands in when there is no event log."""
+
+    def emit(self, event, **fields):
+        pass
+
+    def bind(self, **fields):
+        return self
+
+    def close(self):
+        pass
+
+
+def open_event_log(settings, default_path):
+    """The EventLog described by the "event_log" config value, or NullEvents if it is off."""
+    if settings is False:
+        return NullEvents()
+    settings = settings if isinstance(settings, dict) else {}
+    return EventLog(settings.get('path') or default_path, settings.get('max_mb', DEFAULT_MAX_MB),
+                    settings.get('backups', DEFAULT_BACKUPS))
@@ -0,0 +1,149 @@
+import contextlib
+import heapq
+import os
+import struct
+import tempfile
+
+from filetable import FileTable
+
+# CoolSync Backup
+# External sort for trees too big to list in memory.
+# Entries are buffered in a filetable.FileTable until a memory cap is
+# reached, sorted, and written to a run file as compact binary records. The runs are then k-way merged with
+# heapq, so memory stays near the cap however many files a tree holds. Keys
+# are relative paths with the separator turned into NUL. That way a folder
+# sorts directly before everything inside it, and a subtree is one
+# contiguous range of the merged stream.
+#
+#   "stream_memory_mb": 256, "sort_dir": "~/.coolsync/sort"   (per job or top-level; unset lists trees in memory)
+
+RECORD = struct.Struct('<IBqqq')  # Key length, kind, size, mtime_ns, atime_ns; the key bytes follow
+MAX_FAN_IN = 64  # Runs merged at once; more are first merged in rounds
+MIN_READ_BUFFER = 64 * 1024
+WRITE_BUFFER = 1024 * 1024
+SEPARATOR = os.fsencode(os.sep)
+
+
+def path_key(rel_path):
+    return b'' if rel_path == '.' else os.fsencode(rel_path).replace(SEPARATOR, b'\0')
+
+
+def key_path(key):
+    return os.fsdecode(key.replace(b'\0', SEPARATOR)) if key else '.'
+
+
+def write_record(file, key, kind, size=0, mtime_ns=0, atime_ns=0):
+    file.write(RECORD.pack(len(key), kind, size, mtime_ns, atime_ns) + key)
+
+
+def write_records(path, records):
+    with open(path, 'wb', buffering=WRITE_BUFFER) as file:
+        for record in records:
+            write_record(file, *record)
+
+
+def read_records(path, buffer_size=MIN_READ_BUFFER):
+    """Yields (key, kind, size, mtime_ns, atime_ns) from a file written by write_records."""
+    with open(path, 'rb', buffering=buffer_size) as file:
+        while True:
+            header = file.read(RECORD.size)
+            if not header:
+                return
+            length, kind, size, mtime_ns, atime_ns = RECORD.unpack(header)
+            yield file.read(length), kind, size, mtime_ns, atime_ns
+
+
+class SortedRuns:
+    def __init__(self, directory, memory_bytes, name):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.name = name
+        self.table = FileTable()
+        self.runs = []
+        self.written = 0  # Run files created so far, for unique names
+
+    def add_directory(self, key, mtime_ns=0, atime_ns=0):
+        self.table.add_directory(key, mtime_ns, atime_ns)
+        if self.table.nbytes >= self.memory_bytes:
+            self.spill()
+
+    def add_file(self, folder_key, name, size=0, mtime_ns=0):
+        """Add a file (name as bytes) in the folder with key folder_key."""
+        self.table.add_file(self.table.intern(folder_key), name, size, mtime_ns)
+        if self.table.nbytes >= self.memory_bytes:
+            self.spill()
+
+    def new_run(self):
+        self.written += 1
+        return os.path.join(self.directory, f"{self.name}-{self.written:06d}.run")
+
+    def spill(self):
+        """Sort what is buffered into a new run file and start a new table."""
+        if not self.table.dir_keys:
+            return
+        path = self.new_run()
+        write_records(path, self.table.sorted_records())
+        self.runs.append(path)
+        self.table = FileTable()
+
+    def merge(self, runs):
+        buffer_size = max(MIN_READ_BUFFER, self.memory_bytes // (2 * max(1, len(runs))))
+        return heapq.merge(*[read_records(path, buffer_size) for path in runs])
+
+    def merged(self):
+        """Every entry in key order. Only MAX_FAN_IN runs are ever open at once."""
+        self.spill()
+        while len(self.runs) > MAX_FAN_IN:
+            group, self.runs = self.runs[:MAX_FAN_IN], self.runs[MAX_FAN_IN:]
+            path = self.new_run()
+            write_records(path, self.merge(group))
+            for run in group:
+                os.remove(run)
+            self.runs.append(path)
+        return self.merge(self.runs)
+
+
+def join(left, right):
+    """Pair up two key-ordered streams: (left, right), with None on the side that lacks the key."""
+    left = iter(left)
+    right = iter(right)
+    a = next(left, None)
+    b = next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield a, None
+            a = next(left, None)
+        elif a is None or b[0] < a[0]:
+            yield None, b
+            b = next(right, None)
+        else:
+            yield a, b
+            a = next(left, None)
+            b = next(right, None)
+
+
+class SortSpace:
+    """A private scratch folder for one pass and the memory it may use."""
+
+    def __init__(self, directory, memory_bytes):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+
+    def runs(self, name):
+        return SortedRuns(self.directory, self.memory_bytes, name)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+@contextlib.contextmanager
+def sort_space(memory_mb, directory=None):
+    """A SortSpace that is removed afterwards, or None when memory_mb is not set."""
+    if not memory_mb:
+        yield None
+        return
+    if directory:
+        directory = os.path.expanduser(directory)
+        os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='coolsync-sort-', dir=directory) as scratch:
+        yield SortSpace(scratch, int(memory_mb * 1024 * 1024))
@@ -0,0 +1,226 @@
+import re
+import time
+
+# CoolSync Backup
+# Include/exclude rules for a sync job, compiled once per pass.
+#
+#   "filters": {
+#       "exclude": ["node_modules/", ".cache/", "*.tmp", "!keep.tmp"],
+#       "include": ["*.jpg", "docs/"],
+#       "max_size": "2GB", "min_size": 1,
+#       "max_age_days": 365, "min_age_days": 0.01
+#   }
+#
+# Patterns follow .gitignore: a trailing "/" matches directories only, a "/"
+# anywhere else anchors the pattern at the job's root, "*" and "?" stay
+# inside one path segment, "**" crosses segments, and "!" re-includes what
+# an earlier exclude matched (the last matching pattern wins). The exclude
+# patterns are folded into a couple of regexes, so each entry costs at most
+# two matches whatever the number of rules. Excluded directories are pruned,
+# never descended into.
+
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+DAY = 24 * 60 * 60
+
+
+def parse_size(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', value.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def glob_to_regex(pattern):
+    """
+    Translate one gitignore-style glob to (regex body, anchored, dir_only).
+    An unanchored pattern is matched against the last path segment only.
+    """
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                out.append(re.escape('['))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(out), anchored, dir_only
+
+
+def _combine(parts):
+    return re.compile('(?:' + '|'.join(parts) + r')\Z') if parts else None
+
+
+class RuleSet:
+    """
+    Exclude patterns folded into two regexes: one over the last path segment
+    for unanchored patterns and one over the whole path for anchored ones.
+    The alternatives are listed last rule first and each group is named after
+    its rule, so the rule that matches is the one .gitignore would apply.
+    """
+
+    def __init__(self, rules):
+        name_parts, path_parts = [], []
+        for index, negated, body, anchored in reversed(rules):
+            part = f"(?P<{'keep' if negated else 'drop'}{index}>{body})"
+            (path_parts if anchored else name_parts).append(part)
+        self.name_regex = _combine(name_parts)
+        self.path_regex = _combine(path_parts)
+
+    def __bool__(self):
+        return bool(self.name_regex or self.path_regex)
+
+    def excluded(self, rel_path):
+        winner = None
+        if self.name_regex is not None:
+            match = self.name_regex.match(rel_path, rel_path.rfind('/') + 1)
+            if match:
+                winner = match.lastgroup
+        if self.path_regex is not None:
+            match = self.path_regex.match(rel_path)
+            if match and (winner is None or int(match.lastgroup[4:]) > int(winner[4:])):
+                winner = match.lastgroup
+        return winner is not None and winner.startswith('drop')
+
+
+def compile_rules(patterns):
+    """Compile gitignore-style patterns into (file RuleSet, directory RuleSet)."""
+    file_rules, dir_rules = [], []
+    for index, pattern in enumerate(patterns):
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith('#'):
+            continue
+        negated = pattern.startswith('!')
+        body, anchored, dir_only = glob_to_regex(pattern[1:] if negated else pattern)
+        rule = (index, negated, body, anchored)
+        dir_rules.append(rule)
+        if not dir_only:
+            file_rules.append(rule)
+    return RuleSet(file_rules), RuleSet(dir_rules)
+
+
+class FileFilter:
+    """Compiled filters for one job. Paths are relative to the job root, with "/" separators."""
+
+    def __init__(self, rules=None, clock=time.time):
+        rules = rules or {}
+        self.exclude_files, self.exclude_dirs = compile_rules(rules.get('exclude', []))
+        include = []
+        for pattern in rules.get('include', []):
+            body, anchored, dir_only = glob_to_regex(pattern)
+            # An included directory includes everything below it
+            include.append(('' if anchored else '(?:.*/)?') + body + ('/.*' if dir_only else '(?:/.*)?'))
+        self.include = _combine(include)
+        self.min_size = parse_size(rules['min_size']) if 'min_size' in rules else None
+        self.max_size = parse_size(rules['max_size']) if 'max_size' in rules else None
+        self.max_age = rules['max_age_days'] * DAY if 'max_age_days' in rules else None
+        self.min_age = rules['min_age_days'] * DAY if 'min_age_days' in rules else None
+        self.clock = clock
+        # Size and age rules need a stat() per file; name rules do not
+        self.needs_stat = any(limit is not None for limit in (self.min_size, self.max_size, self.max_age, self.min_age))
+
+    def __bool__(self):
+        return bool(self.exclude_files or self.exclude_dirs or self.include or self.needs_stat)
+
+    def excludes_name(self, rel_path):
+        # Name rules only; the destination walk uses this so it leaves excluded files alone
+        if self.exclude_files.excluded(rel_path):
+            return True
+        return self.include is not None and not self.include.match(rel_path)
+
+    def accepts_file(self, rel_path, stat=None):
+        if self.excludes_name(rel_path):
+            return False
+        if stat is None:
+            return True
+        if self.min_size is not None and stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and stat.st_size > self.max_size:
+            return False
+        if self.max_age is not None or self.min_age is not None:
+            age = self.clock() - stat.st_mtime
+            if self.max_age is not None and age > self.max_age:
+                return False
+            if self.min_age is not None and age < self.min_age:
+                return False
+        return True
+
+    def prune(self, rel_dir, dirs):
+        """Drop excluded subdirectories from an os.walk() dirs list, in place."""
+        if not self.exclude_dirs:
+            return
+        dirs[:] = [name for name in dirs if not self.exclude_dirs.excluded(join_rel(rel_dir, name))]
+
+
+def plan_vanished(rel_root, list_dir, filters):
+    """
+    Work out how to delete a destination folder that is gone from the source
+    without touching what the filters exclude. list_dir(rel) returns the
+    (file names, folder names) in one destination folder. Returns (trees,
+    files): the topmost folders that hold nothing excluded, to be removed
+    whole, and the included files sitting next to excluded entries. When
+    nothing below rel_root is excluded that is just ([rel_root], []).
+    """
+    keeps = set()
+    files_by_dir = {}
+    order = []
+    stack = [rel_root]
+    while stack:
+        rel_dir = stack.pop()
+        order.append(rel_dir)
+        names, dirs = list_dir(rel_dir)
+        files_by_dir[rel_dir] = []
+        for name in names:
+            rel_path = join_rel(rel_dir, name)
+            if filters.excludes_name(rel_path):
+                keeps.add(rel_dir)
+            else:
+                files_by_dir[rel_dir].append(rel_path)
+        kept = list(dirs)
+        filters.prune(rel_dir, kept)
+        if len(kept) < len(dirs):
+            keeps.add(rel_dir)
+        stack.extend(join_rel(rel_dir, name) for name in kept)
+    # A folder with anything excluded at any depth stays, and so do its parents
+    for rel_dir in list(keeps):
+        while rel_dir != rel_root:
+            rel_dir = rel_dir.rpartition('/')[0]
+            keeps.add(rel_dir)
+    trees, files = [], []
+    for rel_dir in order:
+        if rel_dir in keeps:
+            files.extend(files_by_dir[rel_dir])
+        elif rel_dir == rel_root or rel_dir.rpartition('/')[0] in keeps:
+            trees.append(rel_dir)
+    return trees, files
+
+
+def join_rel(rel_dir, name):
+    # rel_dir as os.walk/os.path.relpath give it ("." for the root)
+    return name if rel_dir in ('', '.') else rel_dir.replace('\\', '/') + '/' + name
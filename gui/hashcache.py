@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import threading
+
+from compare import hash_file
+
+# CoolSync Backup
+# Persistent cache of file content hashes, shared by all jobs.
+# An entry is keyed by (st_dev, st_ino) and remembers the size, mtime_ns and
+# ctime_ns the file had when it was hashed. A file is only read again when
+# one of those changes. ctime moves on every write, even when a tool puts
+# the mtime back, so content changes cannot hide behind a preserved mtime.
+# Kept in SQLite under the state directory.
+
+COMMIT_EVERY = 500  # Hashes stored before the cache commits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+"""
+
+
+def stat_key(stat):
+    return stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+
+class HashCache:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def hash(self, path, stat=None):
+        """Hex digest of path's content, read from disk only if its stat changed since it was cached."""
+        stat = stat or os.stat(path)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, ctime_ns, hash FROM hashes WHERE dev = ? AND ino = ?",
+                (stat.st_dev, stat.st_ino)).fetchone()
+            if row is not None and row[:3] == stat_key(stat):
+                self.hits += 1
+                return row[3]
+            self.misses += 1
+        digest = hash_file(path)
+        after = os.stat(path)
+        if stat_key(after) != stat_key(stat):
+            return digest  # Changed while it was read: use it once, never cache it
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                                    (stat.st_dev, stat.st_ino, *stat_key(stat), digest))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY:
+                self.connection.commit()
+                self.pending = 0
+        return digest
+
+    def flush(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
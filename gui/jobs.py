@@ -0,0 +1,248 @@
+import contextlib
+import os
+import threading
+import time
+
+from agent import is_agent_url, parse_agent_url
+from compare import COMPARE_MODES
+from coolsync_client import format_address
+from eventlog import NullEvents
+from extsort import sort_space
+from filters import FileFilter
+from hashcache import HashCache
+from manifest import Manifest, manifest_path
+from quarantine import Quarantine, purge_trash
+from remotesync import remote_pass
+from runreport import PassProfile
+from scrub import SCRUB_INTERVAL, scrub
+from snapshots import prune_snapshots, snapshot_pass
+from syncengine import sync_pass
+from thermal import _block_device_for_path
+
+# CoolSync Backup
+# Scheduler for several sync jobs.
+# Each job is a source/destination pair. Jobs on different physical disks
+# run side by side; jobs that share a disk take turns a pass at a time, so
+# two jobs never seek against each other on the same spindle.
+
+TICK_INTERVAL = 1  # Seconds between scheduling decisions
+PURGE_INTERVAL = 24 * 60 * 60  # Expired trash is looked for at most once per this many seconds
+
+
+def physical_devices(paths, gate):
+    """The set of physical disks behind paths, monitored or not."""
+    devices = set()
+    for path in paths:
+        if is_agent_url(path):
+            devices.add(f"agent:{format_address(parse_agent_url(path)[0])}")  # Jobs to the same agent take turns
+            continue
+        device = gate.device_for_path(path) or _block_device_for_path(path)
+        if device is None:
+            # Unknown disk (e.g. not Linux): fall back to the filesystem id
+            probe = path
+            while probe and not os.path.exists(probe):
+                parent = os.path.dirname(probe)
+                if parent == probe:
+                    break
+                probe = parent
+            try:
+                device = f"st_dev:{os.stat(probe).st_dev}"
+            except OSError:
+                device = f"path:{os.path.abspath(path)}"
+        devices.add(device)
+    return devices
+
+
+MODES = ("mirror", "snapshot")
+
+
+class SyncJob:
+    def __init__(self, name, source, destination, filters=None, mode="mirror", retention=None, scrub=None,
+                 quarantine_days=None, compare="mtime", stream_memory_mb=None, agent_token=None):
+        if mode not in MODES:
+            raise ValueError(f"Job {name}: unknown mode {mode}")
+        if is_agent_url(destination) and mode != "mirror":
+            raise ValueError(f"Job {name}: agent destinations only support mirror mode")
+        if compare not in COMPARE_MODES:
+            raise ValueError(f"Job {name}: unknown compare mode {compare}")
+        if mode == "snapshot" and (quarantine_days is not None or compare != "mtime"):
+            raise ValueError(f"Job {name}: quarantine_days and compare only apply to mirror jobs")
+        self.name = name
+        self.source = source
+        self.destination = destination
+        self.filters = FileFilter(filters)
+        self.mode = mode
+        self.retention = retention  # Snapshot mode only; None keeps every snapshot
+        self.scrub = scrub  # Mirror mode only: settings for the scrub run after a pass, at most daily
+        self.quarantine_days = quarantine_days  # Mirror mode only: keep deleted files this long; None deletes at once
+        self.compare = compare  # Mirror mode only: how changed files are detected
+        self.stream_memory_mb = stream_memory_mb  # Mirror mode only: diff through sorted runs on disk within this much memory
+        self.agent_token = agent_token  # Agent destinations only; None falls back to $COOLSYNC_AGENT_TOKEN
+        self.manifest = None
+        self.monitored = set()  # Temperature-monitored devices it touches
+        self.next_due = 0.0
+        self.thread = None
+        self.passes = 0
+        self.waiting = False  # Held back by the schedule, reported once
+        self.last_purge = None  # time.time() of the last trash purge
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class JobScheduler:
+    """
+    Runs every job once per monitor_interval minutes, as many at a time as
+    the physical disks allow and whenever the schedule lets it start.
+    """
+
+    def __init__(self, jobs, gate, report, metrics, monitor_interval, schedule=None, manifest_dir=None, copy_workers=1,
+                 hash_cache_path=None, run_reports=None, events=None, sort_dir=None, clock=time.monotonic):
+        self.jobs = [SyncJob(job['name'], job['source_folder'], job['destination_folder'], job.get('filters'),
+                             job.get('mode', 'mirror'), job.get('retention'), job.get('scrub'), job.get('quarantine_days'),
+                             job.get('compare') or 'mtime', job.get('stream_memory_mb'), job.get('agent_token'))
+                     for job in jobs]
+        self.manifest_dir = manifest_dir
+        self.copy_workers = copy_workers
+        self.run_reports = run_reports  # runreport.RunReports, or None for no reports
+        self.events = events or NullEvents()
+        self.sort_dir = sort_dir  # Where streaming passes keep their sorted runs; None is the temp directory
+        self.hash_cache = None
+        if hash_cache_path is not None and any(job.compare != 'mtime' for job in self.jobs):
+            self.hash_cache = HashCache(hash_cache_path)
+        self.gate = gate
+        self.report = report
+        self.metrics = metrics
+        self.monitor_interval = monitor_interval
+        self.schedule = schedule
+        self.clock = clock
+        self.devices = {job.name: physical_devices((job.source, job.destination), gate) for job in self.jobs}
+        for job in self.jobs:
+            job.monitored = {gate.device_for_path(path) for path in (job.source, job.destination) if not is_agent_url(path)} - {None}
+        self.lock = threading.Lock()
+
+    def running_jobs(self):
+        with self.lock:
+            return [job.name for job in self.jobs if job.running()]
+
+    def busy_devices(self):
+        busy = set()
+        for job in self.jobs:
+            if job.running():
+                busy |= self.devices[job.name]
+        return busy
+
+    def start_due(self, stop_event):
+        now = self.clock()
+        with self.lock:
+            busy = self.busy_devices()
+            # Longest-waiting job first, so a busy disk cannot starve anyone
+            for job in sorted(self.jobs, key=lambda job: job.next_due):
+                if job.running() or job.next_due > now or self.devices[job.name] & busy:
+                    continue
+                if self.schedule is not None:
+                    if not self.schedule.may_start(job.name, job.monitored):
+                        if not job.waiting:
+                            self.report(f"[{job.name}] Waiting for the backup window")
+                            job.waiting = True
+                        continue
+                    job.waiting = False
+                    self.schedule.pass_started(job.name)
+                busy |= self.devices[job.name]
+                job.thread = threading.Thread(target=self.run_job, args=(job, stop_event), daemon=True)
+                job.thread.start()
+
+    def run_job(self, job, stop_event):
+        def report(message):
+            self.report(f"[{job.name}] {message}")
+        profile = PassProfile(job.name)
+        events = self.events.bind(job=job.name)
+        events.emit('run_started', mode=job.mode, source=job.source, destination=job.destination)
+        paused_before = self.gate.device_wait_seconds()
+        states_before = self.gate.time_in_states()
+        completed = False
+        try:
+            with self.run_reports.profiler(profile) if self.run_reports else contextlib.nullcontext():
+                if is_agent_url(job.destination):
+                    if job.quarantine_days is not None or job.compare != 'mtime':
+                        report("The trash and compare modes do not apply to agent destinations; comparing by mtime and deleting directly")
+                    completed = remote_pass(job.source, job.destination, stop_event, report, self.gate, self.metrics,
+                                            job.filters, profile, events, job.agent_token)
+                elif job.mode == 'snapshot':
+                    completed = snapshot_pass(job.source, job.destination, stop_event, report, self.gate, self.metrics, job.filters,
+                                              profile, events)
+                    if completed:
+                        # Also clears stale partial snapshots, so it runs without a retention policy too
+                        prune_snapshots(job.destination, job.retention, stop_event, report, self.gate)
+                else:
+                    # Only scrubs and the content compares read the manifest; hashing every copy costs CPU
+                    if job.manifest is None and self.manifest_dir is not None and (job.scrub or job.compare != 'mtime'):
+                        job.manifest = Manifest(manifest_path(self.manifest_dir, job.name))
+                    quarantine = Quarantine(job.destination) if job.quarantine_days is not None else None
+                    with sort_space(job.stream_memory_mb, self.sort_dir) as space:
+                        completed = sync_pass(job.source, job.destination, stop_event, report, self.gate, self.metrics,
+                                              job.filters, job.manifest, self.copy_workers, quarantine, job.compare,
+                                              self.hash_cache, profile, events, space)
+                    if completed:
+                        if quarantine is not None:
+                            self.purge_if_due(job, stop_event, report)
+                        self.scrub_if_due(job, stop_event, report)
+        except Exception as e:
+            profile.error(str(e))
+            report(f"Sync failed: {e}")
+        finally:
+            if job.manifest is not None:
+                job.manifest.flush()
+            if self.hash_cache is not None:
+                self.hash_cache.flush()
+        paused_after = self.gate.device_wait_seconds()
+        states_after = self.gate.time_in_states()
+        profile.finish(completed, {device: paused_after.get(device, 0.0) - paused_before.get(device, 0.0) for device in job.monitored},
+                       {device: {state: seconds - states_before.get(device, {}).get(state, 0.0)
+                                 for state, seconds in states_after[device].items()}
+                        for device in job.monitored if device in states_after})
+        if profile.state_summary():
+            report(profile.state_summary())  # Wall clock the disks spent too warm to work at full pace
+        events.emit('run_finished', completed=bool(completed), seconds=profile.seconds, files_copied=profile.counters['files_copied'],
+                    bytes_copied=profile.counters['bytes_copied'], files_deleted=profile.counters['files_deleted'],
+                    moved_to_trash=profile.counters['moved_to_trash'],
+                    errors=len(profile.errors), paused_seconds=profile.paused)
+        if self.run_reports is not None:
+            try:
+                self.run_reports.write(profile)
+            except OSError as e:
+                report(f"Could not write the run report: {e}")
+        with self.lock:
+            job.passes += 1
+            job.next_due = self.clock() + self.monitor_interval * 60
+
+    def purge_if_due(self, job, stop_event, report):
+        # Trash expires in whole days, so purging after every pass would only keep the disk busy
+        if job.last_purge is not None and time.time() - job.last_purge < PURGE_INTERVAL:
+            return
+        if purge_trash(job.destination, job.quarantine_days, stop_event, report, self.gate) is not None:
+            job.last_purge = time.time()
+
+    def scrub_if_due(self, job, stop_event, report):
+        if not job.scrub or job.manifest is None:
+            return
+        last = float(job.manifest.get_state('last_scrub', 0))
+        if time.time() - last < SCRUB_INTERVAL:
+            return
+        summary = scrub(job.manifest, job.destination, stop_event, report, self.gate, **job.scrub)
+        if not summary['stopped']:
+            job.manifest.set_state('last_scrub', time.time())
+
+    def run(self, stop_event):
+        self.report("Sync in progress...")
+        self.metrics.start_run()
+        while not stop_event.is_set():
+            self.start_due(stop_event)
+            stop_event.wait(TICK_INTERVAL)
+        for job in self.jobs:
+            if job.thread is not None:
+                job.thread.join()
+            if job.manifest is not None:
+                job.manifest.close()
+        if self.hash_cache is not None:
+            self.hash_cache.close()
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import tkinter as tk
+from collections import deque
+from itertools import islice
+
+from eventlog import rotate_files
+
+# CoolSync Backup
+# Bounded log model and a virtualized log view.
+# Only the newest RING_SIZE lines stay in memory; every line also goes to a
+# log file on disk, which is what filters search. The file rotates at
+# LOG_MAX_MB like the event log, keeping LOG_BACKUPS old files (log.1 is the
+# newest), so a long run cannot fill the disk. The view only ever holds the
+# lines that fit in the window, however long the run gets.
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+RING_SIZE = 10000  # Lines kept in memory for scrolling
+VISIBLE_LINES = 10
+REFRESH_MS = 200
+LOG_MAX_MB = 10
+LOG_BACKUPS = 5
+
+
+class LogModel:
+    def __init__(self, path, capacity=RING_SIZE, max_mb=LOG_MAX_MB, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.backups = backups
+        self.lines = deque(maxlen=capacity)  # (level, text)
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+        self.version = 0  # Bumped on every append so views know when to redraw
+        self.appended = 0  # Lines ever appended; the ring holds the last len(lines) of them
+
+    def append(self, message, level="INFO"):
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            for line in message.splitlines() or ['']:
+                entry = f"{stamp} {level:<7} {line}"
+                self.lines.append((level, entry))
+                self.appended += 1
+                self.file.write(entry + '\n')
+                self.size += len(entry.encode('utf-8')) + len(os.linesep)  # Bytes on disk, not characters
+            if self.size >= self.max_bytes:
+                self.file.close()
+                rotate_files(self.path, self.backups)
+                self.file = open(self.path, 'a', encoding='utf-8')
+                self.size = 0
+            self.version += 1
+
+    def __len__(self):
+        with self.lock:
+            return len(self.lines)
+
+    def span(self):
+        """(first, end): line numbers of the oldest line still held and one past the newest."""
+        with self.lock:
+            return self.appended - len(self.lines), self.appended
+
+    def window(self, start, count):
+        # start is a line number as span() gives them, so it keeps meaning the same line as the ring evicts
+        with self.lock:
+            offset = max(start - (self.appended - len(self.lines)), 0)
+            return [entry for _, entry in islice(self.lines, offset, offset + count)]
+
+    def search(self, level=None, substring=None, limit=RING_SIZE):
+        """
+        Scan the log files on disk, oldest backup first, not just the ring
+        buffer. Returns at most the last limit matching lines.
+        """
+        minimum = LEVELS.index(level) if level in LEVELS else 0
+        substring = substring.lower() if substring else None
+        with self.lock:
+            self.file.flush()
+            paths = [f"{self.path}.{index}" for index in range(self.backups, 0, -1)] + [self.path]
+        matches = deque(maxlen=limit)
+        for path in paths:
+            try:
+                file = open(path, 'r', encoding='utf-8', errors='replace')
+            except FileNotFoundError:
+                continue  # Not rotated that often yet, or rotated away meanwhile
+            with file:
+                for line in file:
+                    parts = line.split(None, 3)
+                    if len(parts) < 3 or parts[2] not in LEVELS or LEVELS.index(parts[2]) < minimum:
+                        continue
+                    if substring and substring not in line.lower():
+                        continue
+                    matches.append(line.rstrip('\n'))
+        return list(matches)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class LogView:
+    """
+    Text widget that renders only the visible slice of a LogModel (or of a
+    filter result) and follows the tail while scrolled to the bottom.
+    """
+
+    def __init__(self, parent, model, height=VISIBLE_LINES, width=80):
+        self.model = model
+        self.height = height
+        self.top = 0  # Line number (see LogModel.span) of the first visible line, or index into filtered
+        self.follow = True
+        self.filtered = None  # List of lines while a filter is active
+        self.pending = None  # Filter result handed over by the search thread
+        self.drawn = None
+
+        self.frame = tk.Frame(parent)
+        self.text = tk.Text(self.frame, state='disabled', width=width, height=height, wrap='none')
+        self.text.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.on_scroll)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.text.bind('<MouseWheel>', self.on_wheel)
+        self.text.bind('<Button-4>', lambda event: self.scroll_lines(-3))
+        self.text.bind('<Button-5>', lambda event: self.scroll_lines(3))
+
+        filter_bar = tk.Frame(self.frame)
+        filter_bar.grid(row=1, column=0, columnspan=2, sticky='w')
+        tk.Label(filter_bar, text="Level:").pack(side=tk.LEFT)
+        self.level = tk.StringVar(value="All")
+        tk.OptionMenu(filter_bar, self.level, "All", *LEVELS).pack(side=tk.LEFT)
+        tk.Label(filter_bar, text="Path contains:").pack(side=tk.LEFT)
+        self.substring = tk.StringVar()
+        tk.Entry(filter_bar, textvariable=self.substring, width=30).pack(side=tk.LEFT)
+        tk.Button(filter_bar, text="Filter", command=self.apply_filter).pack(side=tk.LEFT)
+        tk.Button(filter_bar, text="Clear", command=self.clear_filter).pack(side=tk.LEFT)
+
+        self.refresh()
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def bounds(self):
+        return (0, len(self.filtered)) if self.filtered is not None else self.model.span()
+
+    def visible_lines(self):
+        if self.filtered is not None:
+            return self.filtered[self.top:self.top + self.height]
+        return self.model.window(self.top, self.height)
+
+    def render(self):
+        first, end = self.bounds()
+        total = end - first
+        if self.follow:
+            self.top = end - self.height
+        self.top = max(min(self.top, end - self.height), first)
+        state = (self.model.version if self.filtered is None else id(self.filtered), self.top, total)
+        if state == self.drawn:
+            return
+        self.drawn = state
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        self.text.insert(tk.END, '\n'.join(self.visible_lines()))
+        self.text.config(state='disabled')
+        if total:
+            self.scrollbar.set((self.top - first) / total, min((self.top - first + self.height) / total, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def refresh(self):
+        if self.pending is not None:
+            self.filtered, self.pending = self.pending, None
+            self.follow = True
+        self.render()
+        self.frame.after(REFRESH_MS, self.refresh)
+
+    def scroll_lines(self, count):
+        self.top += count
+        self.follow = self.top + self.height >= self.bounds()[1]
+        self.render()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            first, end = self.bounds()
+            self.top = first + int(float(amount) * (end - first))
+            self.follow = self.top + self.height >= end
+            self.render()
+        elif action == 'scroll':
+            self.scroll_lines(int(amount) * (self.height if unit == 'pages' else 1))
+
+    def on_wheel(self, event):
+        self.scroll_lines(-3 if event.delta > 0 else 3)
+
+    def apply_filter(self):
+        level = self.level.get()
+        substring = self.substring.get()
+
+        def search():
+            self.pending = self.model.search(level, substring)
+
+        # Searching a long log file must not stall the Tk main loop
+        threading.Thread(target=search, daemon=True).start()
+
+    def clear_filter(self):
+        self.filtered = None
+        self.follow = True
+        self.drawn = None
+        self.render()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# CoolSync Backup
+# Per-job manifest of what was written to the destination.
+# For every file copied it records the size, the destination mtime and a
+# hash of the bytes as they were written, so the backup can later be
+# checked ("scrubbed") without the source. Kept in SQLite under the state
+# directory, one database per job.
+
+HASH_ALGORITHM = "blake2b"
+COMMIT_EVERY = 500  # Rows written before the manifest commits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    copied_at REAL NOT NULL,
+    verified_at REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS files_verified ON files (verified_at);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def manifest_path(manifest_dir, job_name):
+    return os.path.join(manifest_dir, re.sub(r'[^\w.-]', '_', job_name) + '.sqlite')
+
+
+def new_hash():
+    return hashlib.new(HASH_ALGORITHM)
+
+
+def hash_bytes(data):
+    digest = new_hash()
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+
+    def _changed(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.connection.commit()
+            self.pending = 0
+
+    def record(self, path, size, mtime_ns, digest):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, copied_at) VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, digest, time.time()))
+            self._changed()
+
+    def remove(self, path):
+        with self.lock:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._changed()
+
+    def remove_tree(self, path):
+        """Forget every file under the folder path."""
+        prefix = path + '/'
+        with self.lock:
+            self.connection.execute("DELETE FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            self._changed()
+
+    def lookup(self, path):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT size, mtime_ns, hash FROM files WHERE path = ?", (path,)).fetchone()
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def least_recently_verified(self, limit):
+        # Never-verified files first, then the oldest checks
+        with self.lock:
+            return self.connection.execute(
+                "SELECT path, size, mtime_ns, hash FROM files "
+                "ORDER BY verified_at IS NOT NULL, verified_at LIMIT ?", (limit,)).fetchall()
+
+    def random_sample(self, limit):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT path, size, mtime_ns, hash FROM files ORDER BY random() LIMIT ?", (limit,)).fetchall()
+
+    def mark_verified(self, path, status, when=None):
+        with self.lock:
+            self.connection.execute("UPDATE files SET verified_at = ?, status = ? WHERE path = ?",
+                                    (when or time.time(), status, path))
+            self._changed()
+
+    def get_state(self, key, default=None):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, str(value)))
+            self.connection.commit()
+            self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+
+# CoolSync Backup
+# Live sync metrics.
+# The copy path only bumps a few counters under a lock; rates, ETA and the
+# temperature history are worked out when the dashboard asks for a snapshot.
+
+ROLLING_WINDOW = 10  # Seconds of history behind files/s and MB/s
+HISTORY_LENGTH = 120  # Temperature samples kept per device for the sparklines
+MAX_PAUSE_FRACTION = 0.95  # Keeps the ETA finite while a device is paused
+
+
+class SyncMetrics:
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.temperature_history = {}
+        self.start_run()
+
+    def start_run(self):
+        # One run may hold several jobs' passes, each adding to the same counters
+        with self.lock:
+            self.started = time.monotonic()
+            self.active_scans = 0
+            self.files_planned = 0
+            self.bytes_planned = 0
+            self.files_done = 0
+            self.bytes_done = 0
+            self.copy_seconds = 0.0
+            self.wait_seconds = 0.0
+            self.samples = deque([(self.started, 0, 0)])
+
+    def scan_started(self):
+        with self.lock:
+            self.active_scans += 1
+
+    def scan_complete(self):
+        with self.lock:
+            self.active_scans -= 1
+
+    def file_planned(self, size):
+        with self.lock:
+            self.files_planned += 1
+            self.bytes_planned += size
+
+    def thermal_wait(self, seconds):
+        with self.lock:
+            self.wait_seconds += seconds
+
+    def file_copied(self, size, seconds):
+        now = time.monotonic()
+        with self.lock:
+            self.files_done += 1
+            self.bytes_done += size
+            self.copy_seconds += seconds
+            self.samples.append((now, self.files_done, self.bytes_done))
+            while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+                self.samples.popleft()
+
+    def record_temperatures(self, temperatures):
+        with self.lock:
+            for device, temp in temperatures.items():
+                history = self.temperature_history.setdefault(device, deque(maxlen=HISTORY_LENGTH))
+                history.append(temp if isinstance(temp, (int, float)) else None)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            first_time, first_files, first_bytes = self.samples[0]
+            span = max(now - first_time, 1e-6)
+            files_per_s = (self.files_done - first_files) / span
+            bytes_per_s = (self.bytes_done - first_bytes) / span
+            bytes_remaining = max(self.bytes_planned - self.bytes_done, 0)
+            busy = self.copy_seconds + self.wait_seconds
+            pause_fraction = min(self.wait_seconds / busy, MAX_PAUSE_FRACTION) if busy else 0.0
+            eta = None
+            if self.copy_seconds > 0 and self.bytes_done > 0:
+                # Copy time at the measured rate, stretched by the share of time spent paused so far
+                active_rate = self.bytes_done / self.copy_seconds
+                eta = bytes_remaining / active_rate / (1 - pause_fraction)
+            return {
+                "files_per_s": files_per_s,
+                "mb_per_s": bytes_per_s / (1024 * 1024),
+                "files_done": self.files_done,
+                "files_planned": self.files_planned,
+                "bytes_remaining": bytes_remaining,
+                "pause_fraction": pause_fraction,
+                "eta_seconds": eta,
+                "scan_finished": self.active_scans <= 0,
+                "temperatures": {device: list(history) for device, history in self.temperature_history.items()},
+            }
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
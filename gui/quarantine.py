@@ -0,0 +1,78 @@
+import datetime
+import errno
+import os
+
+from snapshots import DELETING_PREFIX, remove_tree
+
+# CoolSync Backup
+# Quarantine for deletions.
+# Instead of deleting files that left the source, a sync moves them into a
+# trash folder for the pass inside the destination:
+#
+#   D:/Backup/.coolsync-trash/2024-05-01_013000/<original relative path>
+#
+# A rename on the same filesystem costs the same for one byte or a whole
+# tree, and a mistaken deletion can be undone by moving the file back.
+# Trash older than quarantine_days is purged after a pass, behind the
+# thermal gate. Every walk of a destination skips the trash folder.
+# Something mounted inside the destination cannot be renamed into the trash;
+# it is left in place and listed in `skipped` rather than deleted for good.
+
+TRASH_DIR = ".coolsync-trash"
+RUN_FORMAT = "%Y-%m-%d_%H%M%S"
+
+
+def skip_trash(rel_dir, dirs):
+    """Drop the trash folder from an os.walk() dirs list at the destination root."""
+    if rel_dir in ('', '.') and TRASH_DIR in dirs:
+        dirs.remove(TRASH_DIR)
+
+
+class Quarantine:
+    def __init__(self, destination, clock=datetime.datetime.now):
+        self.destination = destination
+        self.run_dir = os.path.join(destination, TRASH_DIR, clock().strftime(RUN_FORMAT))
+        self.moved = 0
+        self.skipped = []  # Paths on another filesystem, left where they are
+
+    def move(self, rel_path):
+        """Move destination/rel_path into this pass's trash folder. False if it had to be left in place."""
+        path = os.path.join(self.destination, rel_path)
+        target = os.path.join(self.run_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.rename(path, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Something mounted inside the destination: the trash cannot hold it, and deleting would be for good
+            self.skipped.append(rel_path)
+            return False
+        self.moved += 1
+        return True
+
+
+def purge_trash(destination, days, stop_event, report, gate, now=None):
+    """Remove trash folders older than days. Returns how many were removed, or None if stopped."""
+    trash = os.path.join(destination, TRASH_DIR)
+    if not os.path.isdir(trash):
+        return 0
+    dest_dev = gate.device_for_path(destination)
+    cutoff = (now or datetime.datetime.now()) - datetime.timedelta(days=days)
+    for name in sorted(os.listdir(trash)):
+        try:
+            expired = datetime.datetime.strptime(name, RUN_FORMAT) < cutoff
+        except ValueError:
+            continue
+        if expired:
+            os.rename(os.path.join(trash, name), os.path.join(trash, DELETING_PREFIX + name))
+    purged = 0
+    for name in sorted(os.listdir(trash)):
+        if not name.startswith(DELETING_PREFIX):
+            continue
+        if not remove_tree(os.path.join(trash, name), lambda: gate.wait_for({dest_dev}, stop_event)):
+            return None
+        purged += 1
+    if purged:
+        report(f"Purged {purged} expired trash folder{'s' if purged != 1 else ''}")
+    return purged
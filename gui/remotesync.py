@@ -0,0 +1,243 @@
+import collections
+import os
+import threading
+import time
+
+from agent import DIRECTORY, FILE, AgentClient, AgentError
+from eventlog import NullEvents
+from filters import FileFilter, join_rel, plan_vanished
+from runreport import PassProfile
+
+# CoolSync Backup
+# Mirror pass to a destination agent (agent.py) on another machine.
+# It walks the source like sync_pass, and for each folder sends one LIST of
+# its names. Up to LIST_AHEAD folders are in flight, so the walk never
+# waits on the network. A file the agent lacks, or holds with an older
+# mtime, is streamed at once. Acknowledgements come back on their own
+# thread, so no file costs a round trip. Names only the agent has are
+# deleted after the copying, and folder times are set last. Only the
+# source disk is thermally gated here; the agent's disk is not monitored.
+# The manifest, trash and compare modes other than "mtime" apply to local
+# destinations only.
+
+LIST_AHEAD = 64  # Folder listings requested before the first answer is used
+
+
+def remote_pass(source, url, stop_event, report, gate, metrics, filters=None, profile=None, events=None, token=None):
+    """sync_pass for an agent:// destination. Returns False if it was stopped or the agent was lost."""
+    filters = filters or FileFilter()
+    profile = profile or PassProfile()
+    events = events or NullEvents()
+    clock = profile.clock
+    src_dev = gate.device_for_path(source)
+    waited = 0.0
+    paused_at = {}
+
+    def on_pause(hot):
+        paused_at[threading.get_ident()] = time.monotonic()
+        report(f"High temperature on {', '.join(sorted(hot))}. Pausing work on it.")
+        with gate.lock:
+            temperatures = {device: gate.temperatures.get(device) for device in hot}
+        events.emit('thermal_pause', devices=sorted(hot), temperatures=temperatures)
+
+    def on_resume(devices):
+        started = paused_at.pop(threading.get_ident(), None)
+        report("Temperature dropped to safe level. Resuming sync.")
+        events.emit('thermal_resume', devices=sorted(device for device in devices if device),
+                    paused_seconds=time.monotonic() - started if started is not None else None)
+
+    def wait_for_source():
+        nonlocal waited
+        started = time.monotonic()
+        ready = gate.wait_for({src_dev}, stop_event, on_pause, on_resume)
+        elapsed = time.monotonic() - started
+        waited += elapsed
+        metrics.thermal_wait(elapsed)
+        profile.add_phase("thermal_wait", elapsed)
+        return ready
+
+    try:
+        client = AgentClient(url, token)
+    except (OSError, ValueError, AgentError) as e:
+        report(f"Cannot reach the destination agent: {e}")
+        profile.error(str(e))
+        return False
+
+    gate.begin_pass({src_dev})
+    metrics.scan_started()
+    counters = threading.Lock()
+    totals = {"files": 0, "bytes": 0, "deleted": 0}
+
+    def put_done(rel_path, size, started):
+        # Runs on the client's reader thread, so it only records
+        def on_done(error, value):
+            if error is not None:
+                report(f"Could not copy {rel_path}: {error}")
+                profile.error(f"{rel_path}: {error}")
+                events.emit('file_failed', path=rel_path, error=error)
+                return
+            elapsed = time.monotonic() - started
+            with counters:
+                totals["files"] += 1
+                totals["bytes"] += size
+            profile.count("files_copied")
+            profile.count("bytes_copied", size)
+            metrics.file_copied(size, elapsed)
+            events.emit('file_copied', path=rel_path, bytes=size, seconds=elapsed)
+        return on_done
+
+    def listed(slot):
+        def on_done(error, value):
+            slot["error"], slot["listing"] = error, value
+            slot["done"].set()
+        return on_done
+
+    def deleted(rel_path):
+        def on_done(error, value):
+            if error is not None:
+                report(f"Could not delete {rel_path}: {error}")
+                profile.error(f"{rel_path}: {error}")
+                return
+            with counters:
+                totals["deleted"] += value
+            profile.count("files_deleted", value)
+        return on_done
+
+    def dir_done(rel_dir):
+        def on_done(error, value):
+            if error is not None:
+                report(f"Could not set the times of {rel_dir}: {error}")
+        return on_done
+
+    directories = []  # (rel_dir, atime_ns, mtime_ns) of every source folder
+    gone = []  # Paths only the agent has, deleted once the copying is done
+    pending = collections.deque()
+
+    def list_remote(rel_dir):
+        # (file names, folder names) on the agent, for plan_vanished
+        slot = {"done": threading.Event(), "error": None, "listing": None}
+        client.list(rel_dir, [], listed(slot))
+        slot["done"].wait()
+        if slot["error"] is not None:
+            raise AgentError(slot["error"])
+        _, extras = slot["listing"]
+        return [name for kind, name in extras if kind != DIRECTORY], [name for kind, name in extras if kind == DIRECTORY]
+
+    def handle(rel_dir, root_dir, files, dirs, slot):
+        slot["done"].wait()
+        if slot["error"] is not None:
+            raise AgentError(slot["error"])
+        entries, extras = slot["listing"]
+        for name, (kind, size, mtime_ns) in zip(files, entries):
+            if stop_event.is_set():
+                return False
+            src_file = os.path.join(root_dir, name)
+            started = clock()
+            try:
+                src_stat = os.stat(src_file)
+            except OSError:
+                continue  # Gone since the walk
+            profile.add_call("stat", started)
+            profile.count("files_compared")
+            if kind == FILE and src_stat.st_mtime_ns <= mtime_ns:
+                continue
+            if kind == DIRECTORY:
+                gone.append(join_rel(rel_dir, name))  # A folder where the source has a file; retried next pass
+                continue
+            metrics.file_planned(src_stat.st_size)
+            if not wait_for_source():
+                return False
+            rel_path = join_rel(rel_dir, name)
+            started = clock()
+            try:
+                client.put(rel_path, src_file, src_stat, put_done(rel_path, src_stat.st_size, time.monotonic()))
+            except OSError as e:
+                report(f"Could not copy {rel_path}: {e}")
+                profile.error(f"{rel_path}: {e}")
+            profile.add_call("copy", started)
+        for name, (kind, _, _) in zip(dirs, entries[len(files):]):
+            if kind == FILE:
+                gone.append(join_rel(rel_dir, name))
+        # A vanished folder goes as a whole unless it is excluded itself or holds excluded entries
+        extra_dirs = [name for kind, name in extras if kind == DIRECTORY]
+        filters.prune(rel_dir, extra_dirs)
+        for name in extra_dirs:
+            if filters:
+                trees, files = plan_vanished(join_rel(rel_dir, name), list_remote, filters)
+                gone.extend(trees + files)
+            else:
+                gone.append(join_rel(rel_dir, name))
+        gone.extend(join_rel(rel_dir, name) for kind, name in extras
+                    if kind != DIRECTORY and not (filters and filters.excludes_name(join_rel(rel_dir, name))))
+        return True
+
+    scan_started = clock()
+    completed = False
+    try:
+        for root_dir, dirs, files in profile.walk(os.walk(source)):
+            if not wait_for_source():
+                break
+            rel_dir = os.path.relpath(root_dir, source)
+            if filters:
+                filters.prune(rel_dir, dirs)
+            dirs.sort()
+            files.sort()
+            if filters:
+                accepted = []
+                for name in files:
+                    try:
+                        stat = os.stat(os.path.join(root_dir, name)) if filters.needs_stat else None
+                    except OSError:
+                        continue  # Gone since the walk
+                    if filters.accepts_file(join_rel(rel_dir, name), stat):
+                        accepted.append(name)
+                files = accepted
+            try:
+                dir_stat = os.stat(root_dir)
+            except OSError:
+                continue  # Removed since the walk listed it
+            directories.append((rel_dir, dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+            slot = {"done": threading.Event(), "error": None, "listing": None}
+            client.list(rel_dir, files + dirs, listed(slot))
+            pending.append((rel_dir, root_dir, files, dirs, slot))
+            while len(pending) > LIST_AHEAD:
+                if not handle(*pending.popleft()):
+                    break
+            if stop_event.is_set():
+                break
+        while pending and not stop_event.is_set():
+            if not handle(*pending.popleft()):
+                break
+        profile.add_phase("scan", clock() - scan_started)
+        metrics.scan_complete()
+        client.drain()
+        profile.add_phase("copy", clock() - scan_started)
+        if stop_event.is_set():
+            report("Sync stopped by user")
+            return False
+
+        with profile.phase("delete"):
+            for rel_path in gone:
+                client.delete(rel_path, deleted(rel_path))
+            client.drain()
+        for rel_dir, atime_ns, mtime_ns in directories:
+            client.set_dir(rel_dir, atime_ns, mtime_ns, dir_done(rel_dir))
+        client.drain()
+        completed = True
+    except AgentError as e:
+        report(f"Sync to {url} failed: {e}")
+        profile.error(str(e))
+    finally:
+        client.close()
+    if not completed:
+        return False
+
+    if totals["files"] or totals["deleted"]:
+        report(f"Sync completed successfully.\nSource: {source}\nDestination: {url}\nFiles synced: {totals['files']} "
+               f"({totals['bytes'] / (1024 * 1024):.1f} MB)\nThermal waiting: {waited:.0f}s"
+               + (f"\nDeleted: {totals['deleted']} files" if totals["deleted"] else "")
+               + (f"\nFiles that could not be copied: {len(profile.errors)}" if profile.errors else "")
+               + f"\n{profile.summary()}")
+    else:
+        report("No files to sync or already synced")
+    return True
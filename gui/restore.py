@@ -0,0 +1,152 @@
+import os
+import shutil
+import threading
+import time
+
+from copyexec import CopyExecutor, copy_file
+from extsort import path_key
+from filetable import FileTable
+from quarantine import skip_trash
+from snapshots import list_snapshots
+from thermal import DISPLAY_INTERVAL
+
+# CoolSync Backup
+# Restore from a backup destination (or one of its snapshots) to a target
+# folder. Files are copied smallest first on the parallel copy executor, so
+# documents and configs are usable long before the big media files arrive.
+# Metadata is restored with the data (directory times last), and with a
+# manifest every restored file is checked against the hash recorded when it
+# was backed up. Files already in the target with the same size and mtime
+# are skipped, so an interrupted restore can simply be run again.
+
+DEFAULT_RESTORE_WORKERS = 4
+
+
+def restore_root(destination, snapshot=None):
+    """The folder to restore from: the mirror itself, a named snapshot, or "latest"."""
+    if snapshot is None:
+        return destination
+    if snapshot == "latest":
+        snapshots = list_snapshots(destination)
+        if not snapshots:
+            raise ValueError(f"No snapshots in {destination}")
+        snapshot = snapshots[-1]
+    root = os.path.join(destination, snapshot)
+    if not os.path.isdir(root):
+        raise ValueError(f"No snapshot {snapshot} in {destination}")
+    return root
+
+
+def plan_restore(root, subtree, stop_event, wait_for):
+    """
+    (directories, files, order) under root/subtree: files is a FileTable and
+    order its row numbers, smallest file first.
+    """
+    start = os.path.normpath(os.path.join(root, subtree))
+    if not os.path.exists(start):
+        raise ValueError(f"Nothing to restore at {start}")
+    files = FileTable()
+    if os.path.isfile(start):
+        rel_path = os.path.relpath(start, root)
+        files.add_file(files.intern(path_key(os.path.dirname(rel_path) or '.')), os.fsencode(os.path.basename(rel_path)),
+                       os.path.getsize(start))
+        return [], files, [0]
+    directories = []
+    for root_dir, dirs, names in os.walk(start):
+        if not wait_for():
+            return None, None, None
+        rel_dir = os.path.relpath(root_dir, root)
+        skip_trash(rel_dir, dirs)
+        directories.append(rel_dir)
+        folder = files.add_directory(path_key(rel_dir))
+        for name in names:
+            try:
+                files.add_file(folder, os.fsencode(name), os.path.getsize(os.path.join(root_dir, name)))
+            except OSError:
+                pass
+    return directories, files, sorted(range(len(files)), key=files.size.__getitem__)
+
+
+def restore(destination, subtree, target, stop_event, report, gate, manifest=None, snapshot=None,
+            workers=DEFAULT_RESTORE_WORKERS):
+    """
+    Copy destination[/snapshot]/subtree into target, keeping its relative layout.
+    Returns a summary dict, with "stopped" set if stop_event ended it early.
+    """
+    root = restore_root(destination, snapshot)
+    backup_dev = gate.device_for_path(root)
+    target_dev = gate.device_for_path(target)
+    # The manifest describes the mirror, so snapshots are restored unverified
+    verify = manifest is not None and snapshot is None
+
+    def wait_for(devices):
+        return gate.wait_for(devices, stop_event)
+
+    report(f"Planning restore of {os.path.join(root, subtree)}")
+    directories, files, order = plan_restore(root, subtree, stop_event, lambda: wait_for({backup_dev}))
+    if files is None:
+        report("Restore stopped by user")
+        return {"stopped": True}
+    for rel_dir in directories:
+        os.makedirs(os.path.join(target, rel_dir), exist_ok=True)
+    total_bytes = sum(files.size)
+    report(f"Restoring {len(files)} files ({total_bytes / (1024 * 1024):.1f} MB) to {target}, smallest first")
+
+    summary = {"files": 0, "skipped": 0, "bytes": 0, "mismatched": [], "unverified": 0, "stopped": False}
+    lock = threading.Lock()
+    started = time.monotonic()
+    last_report = started
+
+    def restore_one(rel_path, size):
+        src_file = os.path.join(root, rel_path)
+        dest_file = os.path.join(target, rel_path)
+        os.makedirs(os.path.dirname(dest_file), exist_ok=True)  # A single file restore has no directory list
+        try:
+            existing = os.stat(dest_file)
+            if existing.st_size == size and existing.st_mtime_ns == os.stat(src_file).st_mtime_ns:
+                return rel_path, size, None, True
+        except FileNotFoundError:
+            pass
+        return rel_path, size, copy_file(src_file, dest_file, want_hash=verify), False
+
+    def restored(result):
+        nonlocal last_report
+        rel_path, size, digest, skipped = result
+        status = None
+        if verify and not skipped:
+            row = manifest.lookup(rel_path)
+            status = "unverified" if row is None else ("ok" if row[2] == digest else "mismatch")
+        with lock:
+            if skipped:
+                summary["skipped"] += 1
+                return
+            summary["files"] += 1
+            summary["bytes"] += size
+            if status == "mismatch":
+                summary["mismatched"].append(rel_path)
+            elif status == "unverified":
+                summary["unverified"] += 1
+            now = time.monotonic()
+            if now - last_report >= DISPLAY_INTERVAL / 6:
+                last_report = now
+                report(f"Restored {summary['files']} of {len(files)} files ({summary['bytes'] / (1024 * 1024):.1f} MB)")
+        if status == "mismatch":
+            report(f"Restored file does not match the backup manifest: {rel_path}")
+
+    executor = CopyExecutor(workers, wait_for, stop_event)
+    for index in order:
+        row = files[index]
+        if not executor.submit({backup_dev, target_dev}, restore_one, row.path, row.size, on_done=restored):
+            break
+    executor.join()
+
+    summary["stopped"] = stop_event.is_set()
+    if not summary["stopped"]:
+        # Directory times last, deepest first, since restoring files into them changes their mtime
+        for rel_dir in sorted(directories, key=lambda path: path.count(os.sep), reverse=True):
+            shutil.copystat(os.path.join(root, rel_dir), os.path.join(target, rel_dir))
+    summary["seconds"] = time.monotonic() - started
+    report(f"Restore {'stopped' if summary['stopped'] else 'completed'}: {summary['files']} files "
+           f"({summary['bytes'] / (1024 * 1024):.1f} MB) in {summary['seconds']:.0f}s, {summary['skipped']} already present"
+           + (f", {len(summary['mismatched'])} not matching the manifest, {summary['unverified']} not in it" if verify else ""))
+    return summary
@@ -0,0 +1,223 @@
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+# CoolSync Backup
+# Per-pass profile and run reports.
+# A PassProfile collects wall clock per phase (scan, copy, delete, thermal
+# wait), count and time per kind of filesystem call (walk, stat, compare,
+# mkdir, copy, unlink, rename), files and bytes, errors, the time each
+# device held the pass up and how long each device spent in each thermal
+# state during it. Hot paths only take a perf_counter reading and
+# one short lock. RunReports writes each finished pass as JSON under
+# <dir>/<job>/ (the newest REPORTS_KEPT are kept), and optionally as a
+# Prometheus text file for node_exporter's textfile collector. With
+# "cprofile" it also saves a cProfile of the job's own thread per pass.
+#
+#   "reports": {"dir": "~/.coolsync/reports", "prometheus_dir": "/var/lib/node_exporter", "cprofile": false}
+
+REPORTS_KEPT = 200  # JSON reports kept per job
+PHASES = ("scan", "copy", "delete", "thermal_wait")
+CALLS = ("walk", "stat", "compare", "read", "mkdir", "copy", "unlink", "rename", "utime")
+COUNTERS = ("files_compared", "files_copied", "bytes_copied", "files_deleted", "moved_to_trash", "dirs_created")
+TIME_FORMAT = "%Y-%m-%d_%H%M%S"
+
+
+class PassProfile:
+    def __init__(self, job="default", clock=time.perf_counter):
+        self.job = job
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.calls = {category: [0, 0.0] for category in CALLS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.errors = []
+        self.paused = {}  # Device -> seconds it kept this pass waiting
+        self.states = {}  # Device -> {thermal state: seconds} during this pass
+        self.started_at = time.time()
+        self.started = clock()
+        self.seconds = None
+        self.completed = None
+
+    def add_call(self, category, started):
+        """Record one call of category that began at clock() == started."""
+        elapsed = self.clock() - started
+        with self.lock:
+            entry = self.calls[category]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def add_calls(self, category, count, seconds):
+        """Record count calls of category that took seconds altogether (e.g. a batch run by a pool)."""
+        with self.lock:
+            entry = self.calls[category]
+            entry[0] += count
+            entry[1] += seconds
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.add_phase(name, self.clock() - started)
+
+    def walk(self, walker):
+        """Wrap an os.walk() generator, timing each directory it lists."""
+        while True:
+            started = self.clock()
+            try:
+                entry = next(walker)
+            except StopIteration:
+                return
+            finally:
+                self.add_call("walk", started)
+            yield entry
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def error(self, message):
+        with self.lock:
+            self.errors.append(message)
+
+    def finish(self, completed, paused=None, states=None):
+        self.seconds = self.clock() - self.started
+        self.completed = completed
+        self.paused = dict(paused or {})
+        self.states = dict(states or {})
+
+    def state_summary(self):
+        """One line for the log: time outside COOL per device, or None if every device stayed COOL."""
+        parts = []
+        for device, seconds in sorted(self.states.items()):
+            other = [f"{state} {seconds[state]:.0f}s" for state in ("WARM", "HOT", "UNKNOWN") if seconds.get(state, 0.0) >= 0.5]
+            if other:
+                parts.append(f"{device} " + ", ".join(other) + f" of {sum(seconds.values()):.0f}s")
+        return "Thermal states: " + "; ".join(parts) if parts else None
+
+    def summary(self):
+        """One line for the log: where the time went."""
+        parts = [f"{name.replace('_', ' ')} {seconds:.1f}s" for name, seconds in self.phases.items() if seconds >= 0.05]
+        busiest = sorted(((seconds, category) for category, (count, seconds) in self.calls.items() if count), reverse=True)[:3]
+        if busiest:
+            parts.append("most time in " + ", ".join(f"{category} {seconds:.1f}s" for seconds, category in busiest))
+        return "Phases: " + ("; ".join(parts) if parts else "nothing measurable")
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job": self.job,
+                "started_at": self.started_at,
+                "seconds": self.seconds,
+                "completed": self.completed,
+                "phases": dict(self.phases),
+                "calls": {category: {"count": count, "seconds": seconds} for category, (count, seconds) in self.calls.items()},
+                "counters": dict(self.counters),
+                "errors": list(self.errors),
+                "paused_seconds": dict(self.paused),
+                "state_seconds": {device: dict(seconds) for device, seconds in self.states.items()},
+            }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(report):
+    """The report as Prometheus text exposition format."""
+    job = _label(report["job"])
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP coolsync_{name} {help_text}")
+        lines.append(f"# TYPE coolsync_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join([f'job="{job}"'] + [f'{key}="{_label(val)}"' for key, val in labels])
+            lines.append(f"coolsync_{name}{{{label_text}}} {float(value or 0)!r}")
+
+    metric("pass_seconds", "gauge", "Wall clock of the last pass.", [((), report["seconds"])])
+    metric("pass_completed", "gauge", "1 if the last pass ran to the end.", [((), 1 if report["completed"] else 0)])
+    metric("pass_end_timestamp_seconds", "gauge", "When the last pass ended.", [((), report["started_at"] + (report["seconds"] or 0))])
+    metric("pass_phase_seconds", "gauge", "Wall clock per phase of the last pass (scan overlaps copy).",
+           [((("phase", name),), seconds) for name, seconds in report["phases"].items()])
+    metric("pass_calls", "gauge", "Filesystem calls per kind in the last pass.",
+           [((("call", name),), entry["count"]) for name, entry in report["calls"].items()])
+    metric("pass_call_seconds", "gauge", "Time in filesystem calls per kind in the last pass.",
+           [((("call", name),), entry["seconds"]) for name, entry in report["calls"].items()])
+    for name, value in report["counters"].items():
+        metric(f"pass_{name}", "gauge", f"{name.replace('_', ' ').capitalize()} in the last pass.", [((), value)])
+    metric("pass_errors", "gauge", "Errors in the last pass.", [((), len(report["errors"]))])
+    metric("pass_paused_seconds", "gauge", "Time a hot device held the last pass up.",
+           [((("device", device),), seconds) for device, seconds in report["paused_seconds"].items()])
+    metric("pass_state_seconds", "gauge", "Time each device spent in each thermal state during the last pass.",
+           [((("device", device), ("state", state)), seconds)
+            for device, states in report.get("state_seconds", {}).items() for state, seconds in states.items()])
+    return "\n".join(lines) + "\n"
+
+
+def safe_name(job):
+    return re.sub(r'[^\w.-]', '_', job)
+
+
+def _write_atomic(path, text):
+    temporary = path + ".tmp"
+    with open(temporary, 'w') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+class RunReports:
+    def __init__(self, settings, default_dir):
+        settings = settings or {}
+        self.dir = os.path.expanduser(settings.get("dir") or default_dir)
+        self.prometheus_dir = settings.get("prometheus_dir")
+        self.cprofile = bool(settings.get("cprofile"))
+        self.keep = settings.get("keep", REPORTS_KEPT)
+
+    def job_dir(self, job):
+        return os.path.join(self.dir, safe_name(job))
+
+    @contextlib.contextmanager
+    def profiler(self, profile):
+        """cProfile the calling thread for the pass, if enabled; workers and the scanner are not included."""
+        if not self.cprofile:
+            yield
+            return
+        import cProfile  # Deferred: only needed when profiling is on
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            directory = self.job_dir(profile.job)
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, time.strftime(TIME_FORMAT, time.localtime(profile.started_at)) + ".prof"))
+
+    def write(self, profile):
+        report = profile.to_dict()
+        directory = self.job_dir(profile.job)
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime(TIME_FORMAT, time.localtime(profile.started_at))
+        text = json.dumps(report, indent=2)
+        _write_atomic(os.path.join(directory, name + ".json"), text)
+        _write_atomic(os.path.join(directory, "latest.json"), text)
+        old = sorted(entry for entry in os.listdir(directory) if entry.endswith((".json", ".prof")) and entry != "latest.json")
+        stamps = sorted({os.path.splitext(entry)[0] for entry in old})
+        expired = set(stamps[:-self.keep]) if self.keep else set()
+        for entry in old:
+            if os.path.splitext(entry)[0] in expired:
+                os.remove(os.path.join(directory, entry))
+        if self.prometheus_dir:
+            os.makedirs(self.prometheus_dir, exist_ok=True)
+            _write_atomic(os.path.join(self.prometheus_dir, f"coolsync_{safe_name(profile.job)}.prom"), prometheus_text(report))
+        return report
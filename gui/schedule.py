@@ -0,0 +1,226 @@
+import datetime
+import json
+import os
+import threading
+
+# CoolSync Backup
+# When backups may start.
+#   "always"  - whenever a job is due (the old behaviour)
+#   "windows" - only inside calendar windows, e.g. nightly 01:00-06:00
+#   "coolest" - inside the windows, only during the block of hours in which
+#               the recorded temperature history says the drives are least
+#               likely to be paused
+# A pass that has started is allowed to finish after its window closes.
+
+MODES = ("always", "windows", "coolest")
+CATCH_UP = ("run", "skip")  # What to do when a window went by without a pass
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DEFAULT_COOLEST_HOURS = 3
+MIN_HISTORY_SAMPLES = 3  # Readings an hour needs before it is trusted for "coolest"
+HISTORY_SAVE_INTERVAL = 600  # Seconds between writes of the temperature history
+
+
+def parse_clock(text):
+    hours, minutes = text.split(':')
+    minutes = int(hours) * 60 + int(minutes)
+    if not 0 <= minutes <= 24 * 60:
+        raise ValueError(f"Invalid time of day: {text}")
+    return minutes
+
+
+class TimeWindow:
+    """
+    A daily window on some weekdays, in local time. A window whose end is
+    before its start runs past midnight and belongs to the day it starts on.
+    """
+
+    def __init__(self, start, end, days=None):
+        self.start = parse_clock(start)
+        self.end = parse_clock(end)
+        if days in (None, "daily"):
+            days = WEEKDAYS
+        self.days = {WEEKDAYS.index(day[:3].lower()) for day in days}
+
+    @classmethod
+    def from_config(cls, window):
+        return cls(window['start'], window['end'], window.get('days'))
+
+    def length(self):
+        return (self.end - self.start) % (24 * 60) or 24 * 60
+
+    def occurrences(self, now, days_back=8):
+        # (start, end) datetimes of recent occurrences, oldest first
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for back in range(days_back, -1, -1):
+            day = midnight - datetime.timedelta(days=back)
+            if day.weekday() in self.days:
+                start = day + datetime.timedelta(minutes=self.start)
+                yield start, start + datetime.timedelta(minutes=self.length())
+
+    def contains(self, now):
+        return any(start <= now < end for start, end in self.occurrences(now, days_back=1))
+
+    def last_closed(self, now):
+        # Start of the most recent occurrence that has already ended, or None
+        closed = [start for start, end in self.occurrences(now) if end <= now]
+        return closed[-1] if closed else None
+
+    def hours(self):
+        first = self.start // 60
+        return {(first + i) % 24 for i in range((self.length() + 59) // 60)}
+
+
+class TemperatureHistory:
+    """
+    Per-device temperature profile by hour of day, kept across restarts.
+    For each hour it counts readings, their sum and how many were at or above
+    the device's high_temp, i.e. how often a backup at that hour would pause.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hours = {}  # device -> [[count, total, hot], ...] for hours 0..23
+        self.lock = threading.Lock()
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as file:
+                    self.hours = json.load(file)
+            except (OSError, ValueError):
+                self.hours = {}
+
+    def record(self, temperatures, devices, now=None):
+        hour = (now or datetime.datetime.now()).hour
+        with self.lock:
+            for device, temp in temperatures.items():
+                if not isinstance(temp, (int, float)) or device not in devices:
+                    continue
+                buckets = self.hours.setdefault(device, [[0, 0.0, 0] for _ in range(24)])
+                bucket = buckets[hour]
+                bucket[0] += 1
+                bucket[1] += temp
+                bucket[2] += temp >= devices[device]['high_temp']
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            data = json.dumps(self.hours)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as file:
+            file.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+    def hour_score(self, devices, hour):
+        """
+        (share of readings at this hour with every device below high_temp,
+        -mean temperature), or None if there is not enough history yet.
+        """
+        with self.lock:
+            buckets = [self.hours[device][hour] for device in devices if device in self.hours]
+        if len(buckets) < len(devices) or any(bucket[0] < MIN_HISTORY_SAMPLES for bucket in buckets):
+            return None
+        running = 1.0
+        for count, total, hot in buckets:
+            running *= 1 - hot / count
+        mean = sum(total / count for count, total, hot in buckets) / len(buckets)
+        return running, -mean
+
+    def coolest_block(self, devices, allowed_hours, length):
+        """
+        The run of `length` consecutive allowed hours with the best expected
+        sustained throughput, or None when the history cannot tell.
+        """
+        if not devices:
+            return None
+        best, best_score = None, None
+        for first in range(24):
+            block = [(first + i) % 24 for i in range(length)]
+            if not all(hour in allowed_hours for hour in block):
+                continue
+            scores = [self.hour_score(devices, hour) for hour in block]
+            if None in scores:
+                return None
+            score = (sum(s[0] for s in scores) / length, sum(s[1] for s in scores) / length)
+            if best_score is None or score > best_score:
+                best, best_score = set(block), score
+        return best
+
+
+class BackupSchedule:
+    """
+    Decides whether a job may start a pass, and remembers when each job last
+    started one (in state_path, so windows missed while the daemon was down
+    are caught up after a restart).
+    """
+
+    def __init__(self, config, history, state_path=None, clock=datetime.datetime.now):
+        config = config or {}
+        self.mode = config.get('mode', 'always')
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown schedule mode: {self.mode}")
+        self.catch_up = config.get('catch_up', 'run')
+        if self.catch_up not in CATCH_UP:
+            raise ValueError(f"Unknown catch_up rule: {self.catch_up}")
+        self.windows = [TimeWindow.from_config(window) for window in config.get('windows', [])]
+        self.coolest_hours = config.get('coolest_hours', DEFAULT_COOLEST_HOURS)
+        self.history = history
+        self.clock = clock
+        self.state_path = state_path
+        self.last_runs = {}  # Job name -> POSIX timestamp of its last pass start
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r') as file:
+                    self.last_runs = json.load(file)
+            except (OSError, ValueError):
+                self.last_runs = {}
+
+    def in_window(self, now):
+        return not self.windows or any(window.contains(now) for window in self.windows)
+
+    def allowed_hours(self):
+        if not self.windows:
+            return set(range(24))
+        hours = set()
+        for window in self.windows:
+            hours |= window.hours()
+        return hours
+
+    def missed_window(self, now, last_run):
+        # A window closed since the job's last pass started; a job that never ran waits for its first window
+        if last_run is None:
+            return False
+        for window in self.windows:
+            closed = window.last_closed(now)
+            if closed is not None and last_run < closed:
+                return True
+        return False
+
+    def last_run(self, name):
+        timestamp = self.last_runs.get(name)
+        return datetime.datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+    def pass_started(self, name):
+        self.last_runs[name] = self.clock().timestamp()
+        if self.state_path:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            with open(self.state_path, 'w') as file:
+                json.dump(self.last_runs, file)
+
+    def may_start(self, name, devices):
+        """Whether job `name`, on the given monitored devices, may start a pass now."""
+        if self.mode == 'always':
+            return True
+        now = self.clock()
+        last_run = self.last_run(name)
+        if self.catch_up == 'run' and self.missed_window(now, last_run):
+            return True
+        if not self.in_window(now):
+            return False
+        if self.mode == 'coolest':
+            block = self.history.coolest_block(sorted(devices), self.allowed_hours(), self.coolest_hours)
+            # Until enough history is recorded, any hour in the windows will do
+            return block is None or now.hour in block
+        return True
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+from manifest import new_hash
+
+# CoolSync Backup
+# Scrub: re-read backed-up files and compare them with the hashes recorded
+# when they were copied, to catch silent corruption on the backup drive.
+#   "rolling" - check the least recently verified fraction of the files, so
+#               a full scrub spreads over several nights and picks up where
+#               the last one stopped (verified_at is kept in the manifest)
+#   "sample"  - check a random fraction
+# Reads run on a small thread pool, share one bytes-per-second limit and
+# wait on the thermal gate like a sync does.
+
+SCRUB_MODES = ("rolling", "sample")
+DEFAULT_FRACTION = 0.05
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_MB_S = 50
+READ_CHUNK = 1024 * 1024
+SCRUB_INTERVAL = 20 * 60 * 60  # Scheduled scrubs run at most once per this many seconds
+
+OK = "ok"
+CORRUPT = "corrupt"  # Same size and mtime as recorded, different bytes
+CHANGED = "changed"  # Modified since it was copied; not something a scrub can judge
+MISSING = "missing"
+
+
+class RateLimiter:
+    """Token bucket shared by the scrub workers."""
+
+    def __init__(self, bytes_per_second, clock=time.monotonic, sleep=time.sleep):
+        self.rate = bytes_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.available = 0.0
+        self.last = clock()
+
+    def acquire(self, size):
+        if not self.rate:
+            return
+        with self.lock:
+            now = self.clock()
+            # At most one second's worth of burst
+            self.available = min(self.available + (now - self.last) * self.rate, self.rate)
+            self.last = now
+            self.available -= size
+            shortfall = -self.available
+        if shortfall > 0:
+            self.sleep(shortfall / self.rate)
+
+
+def verify_file(path, size, mtime_ns, expected, limiter, wait_for):
+    """Returns (status, bytes read); status is None if the scrub was stopped."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return MISSING, 0
+    if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+        return CHANGED, 0
+    digest = new_hash()
+    read = 0
+    with open(path, 'rb') as file:
+        while True:
+            if not wait_for():
+                return None, read
+            chunk = file.read(READ_CHUNK)
+            if not chunk:
+                break
+            limiter.acquire(len(chunk))
+            digest.update(chunk)
+            read += len(chunk)
+    return (OK if digest.hexdigest() == expected else CORRUPT), read
+
+
+def scrub(manifest, destination, stop_event, report, gate, fraction=DEFAULT_FRACTION, mode="rolling",
+          workers=DEFAULT_WORKERS, rate_mb_s=DEFAULT_RATE_MB_S):
+    """
+    Verify a fraction of the files in manifest against destination.
+    Returns a summary dict, with "stopped" set if stop_event ended it early.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if mode not in SCRUB_MODES:
+        raise ValueError(f"Unknown scrub mode: {mode}")
+    dest_dev = gate.device_for_path(destination)
+    limiter = RateLimiter(rate_mb_s * 1024 * 1024)
+
+    def wait_for():
+        return gate.wait_for({dest_dev}, stop_event)
+
+    total = manifest.count()
+    limit = max(1, int(total * fraction)) if total else 0
+    rows = manifest.least_recently_verified(limit) if mode == "rolling" else manifest.random_sample(limit)
+    summary = {OK: 0, CORRUPT: 0, CHANGED: 0, MISSING: 0, "bytes": 0, "files": len(rows), "stopped": False, "corrupt_paths": []}
+    report(f"Scrubbing {len(rows)} of {total} files ({mode})")
+    started = time.monotonic()
+
+    def check(row):
+        path, size, mtime_ns, expected = row
+        return row[0], verify_file(os.path.join(destination, path), size, mtime_ns, expected, limiter, wait_for)
+
+    rows = iter(rows)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        while True:
+            # Keep only a few files queued so stopping does not wait on a backlog
+            while len(in_flight) < workers * 2 and not stop_event.is_set():
+                row = next(rows, None)
+                if row is None:
+                    break
+                in_flight.add(pool.submit(check, row))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, (status, read) = future.result()
+                summary["bytes"] += read
+                if status is None:
+                    continue
+                summary[status] += 1
+                manifest.mark_verified(path, status)
+                if status == CORRUPT:
+                    summary["corrupt_paths"].append(path)
+                    report(f"Checksum mismatch: {path}")
+    manifest.flush()
+    summary["stopped"] = stop_event.is_set()
+    summary["seconds"] = time.monotonic() - started
+    report(f"Scrub {'stopped' if summary['stopped'] else 'completed'}: {summary[OK]} ok, {summary[CORRUPT]} corrupt, "
+           f"{summary[MISSING]} missing, {summary[CHANGED]} changed since copy, "
+           f"{summary['bytes'] / (1024 * 1024):.1f} MB read in {summary['seconds']:.0f}s")
+    return summary
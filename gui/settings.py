@@ -0,0 +1,50 @@
+import json
+import os
+from thermal import DEFAULT_DEVICES, DEFAULT_HIGH_TEMP, DEFAULT_SAFE_TEMP, default_device_settings
+
+# CoolSync Backup
+# config.json loading and saving, shared by the GUI and the sync daemon.
+
+CONFIG_FILE = "config.json"
+STATE_DIR = os.path.join(os.path.expanduser('~'), '.coolsync')  # Daemon socket and run state
+
+
+def load_config(path=CONFIG_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            config = json.load(file)
+            return migrate_config(config)
+    return migrate_config({"jobs": [], "monitor_interval": 1})
+
+
+def migrate_config(config):
+    # Older configs had one global safe_temp/high_temp pair; each device now has its own
+    safe_temp = config.pop('safe_temp', DEFAULT_SAFE_TEMP)
+    high_temp = config.pop('high_temp', DEFAULT_HIGH_TEMP)
+    if not config.get('devices'):
+        config['devices'] = {device: default_device_settings(safe_temp, high_temp) for device in DEFAULT_DEVICES}
+    # Older configs had a single source/destination pair; it becomes the "default" job
+    source = config.pop('source_folder', '')
+    destination = config.pop('destination_folder', '')
+    if 'jobs' not in config:
+        config['jobs'] = [{"name": "default", "source_folder": source, "destination_folder": destination}] if source or destination else []
+    return config
+
+
+def find_job(jobs, name):
+    for job in jobs:
+        if job['name'] == name:
+            return job
+    return None
+
+
+def save_config(config, path=CONFIG_FILE):
+    with open(path, 'w') as file:
+        json.dump(config, file)
+
+
+def update_config(changes, path=CONFIG_FILE):
+    """Rewrite only the given top-level keys, keeping every other section of the file."""
+    config = load_config(path)
+    config.update(changes)
+    save_config(config, path)
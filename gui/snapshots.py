@@ -0,0 +1,240 @@
+import datetime
+import os
+import time
+
+from copyexec import copy_file
+from eventlog import NullEvents
+from filters import FileFilter, join_rel
+from runreport import PassProfile
+from unlinker import remove_trees
+
+# CoolSync Backup
+# Versioned snapshots.
+# Instead of mirroring, a snapshot job writes each pass into its own
+# timestamped folder under the destination:
+#
+#   D:/Backup/2024-05-01_013000/...
+#   D:/Backup/2024-05-02_013000/...
+#
+# Files unchanged since the previous snapshot (same size and mtime) are
+# hardlinked to it, so a pass costs only the changed bytes plus directory
+# entries, and every snapshot is still a complete, browsable copy. A
+# snapshot is written as "<name>.partial" and renamed once it is complete;
+# an interrupted one is picked up by the next pass. Files that are hardlinked
+# share their metadata, so a permission change without a content change is
+# not recorded as a new version.
+
+SNAPSHOT_FORMAT = "%Y-%m-%d_%H%M%S"
+PARTIAL_SUFFIX = ".partial"
+DELETING_PREFIX = ".deleting-"  # Expired snapshots are renamed to this before they are removed
+RETENTION_PERIODS = (("daily", "%Y-%m-%d"), ("weekly", "%G-W%V"), ("monthly", "%Y-%m"))
+
+
+def snapshot_time(name):
+    try:
+        return datetime.datetime.strptime(name, SNAPSHOT_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_snapshots(destination):
+    """Complete snapshot names, oldest first."""
+    try:
+        names = os.listdir(destination)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if snapshot_time(name) is not None)
+
+
+def expired_snapshots(names, retention):
+    """
+    Snapshots the retention policy no longer keeps. retention holds
+    "keep_last" (newest N) and "daily"/"weekly"/"monthly" (newest snapshot
+    in each of the last N days/weeks/months that have one). The newest
+    snapshot is always kept.
+    """
+    if not names:
+        return []
+    keep = set(names[-retention.get('keep_last', 1):]) if retention.get('keep_last', 1) > 0 else set()
+    keep.add(names[-1])
+    for period, key_format in RETENTION_PERIODS:
+        count = retention.get(period, 0)
+        seen = set()
+        for name in reversed(names):
+            if len(seen) >= count:
+                break
+            key = snapshot_time(name).strftime(key_format)
+            if key not in seen:
+                seen.add(key)
+                keep.add(name)
+    return [name for name in names if name not in keep]
+
+
+def remove_tree(path, wait_for):
+    """Delete a tree bottom-up, waiting on the gate between directories. Returns False if stopped."""
+    return not remove_trees([path], wait_for)["stopped"]
+
+
+def prune_snapshots(destination, retention, stop_event, report, gate):
+    """
+    Remove expired snapshots, and stale partial ones left by snapshot_pass
+    whether or not there is a retention policy. Returns the number removed,
+    or None if stopped.
+    """
+    dest_dev = gate.device_for_path(destination)
+
+    def wait_for():
+        return gate.wait_for({dest_dev}, stop_event)
+
+    # Renaming first makes an expired snapshot disappear at once; the slow
+    # unlinking happens afterwards and resumes on the next pass if stopped
+    for name in expired_snapshots(list_snapshots(destination), retention) if retention else ():
+        os.rename(os.path.join(destination, name), os.path.join(destination, DELETING_PREFIX + name))
+    removed = 0
+    try:
+        names = sorted(os.listdir(destination))
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not name.startswith(DELETING_PREFIX):
+            continue
+        if not remove_tree(os.path.join(destination, name), wait_for):
+            return None
+        removed += 1
+    if removed:
+        report(f"Removed {removed} expired or stale snapshot{'s' if removed != 1 else ''}")
+    return removed
+
+
+def same_file(stat, other):
+    return stat.st_size == other.st_size and stat.st_mtime_ns == other.st_mtime_ns
+
+
+def snapshot_pass(source, destination, stop_event, report, gate, metrics, filters=None, profile=None, events=None,
+                  clock=datetime.datetime.now):
+    """
+    Write one snapshot of source under destination. Returns False if it was stopped.
+    A file that cannot be copied is reported and left out, like sync_pass does.
+    """
+    filters = filters or FileFilter()
+    profile = profile or PassProfile()
+    events = events or NullEvents()
+    src_dev = gate.device_for_path(source)
+    dest_dev = gate.device_for_path(destination)
+    waited = 0.0
+
+    def on_pause(hot):
+        report(f"High temperature on {', '.join(sorted(hot))}. Pausing work on it.")
+
+    def on_resume(devices):
+        report("Temperature dropped to safe level. Resuming sync.")
+
+    def wait_for(devices):
+        nonlocal waited
+        started = time.monotonic()
+        ready = gate.wait_for(devices, stop_event, on_pause, on_resume)
+        elapsed = time.monotonic() - started
+        waited += elapsed
+        metrics.thermal_wait(elapsed)
+        return ready
+
+    os.makedirs(destination, exist_ok=True)
+    snapshots = list_snapshots(destination)
+    previous = os.path.join(destination, snapshots[-1]) if snapshots else None
+    name = clock().strftime(SNAPSHOT_FORMAT)
+    if snapshots and snapshots[-1] >= name:
+        report(f"Snapshot {name} already exists")
+        return True
+    target = os.path.join(destination, name + PARTIAL_SUFFIX)
+    # Carry on from an interrupted snapshot rather than starting again
+    partials = sorted(entry for entry in os.listdir(destination) if entry.endswith(PARTIAL_SUFFIX))
+    if partials:
+        os.rename(os.path.join(destination, partials[-1]), target)
+        for stale in partials[:-1]:
+            os.rename(os.path.join(destination, stale), os.path.join(destination, DELETING_PREFIX + stale))
+
+    gate.begin_pass({src_dev, dest_dev})
+    metrics.scan_started()
+    linked = copied = bytes_copied = failed = 0
+    copy_seconds = 0.0
+    try:
+        for root_dir, dirs, files in os.walk(source):
+            if not wait_for({src_dev, dest_dev}):
+                report("Snapshot stopped by user")
+                return False
+            rel_dir = os.path.relpath(root_dir, source)
+            if filters:
+                filters.prune(rel_dir, dirs)
+            target_dir = os.path.normpath(os.path.join(target, rel_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            previous_dir = os.path.normpath(os.path.join(previous, rel_dir)) if previous else None
+            for file in files:
+                if stop_event.is_set():
+                    report("Snapshot stopped by user")
+                    return False
+                src_file = os.path.join(root_dir, file)
+                try:
+                    src_stat = os.stat(src_file)
+                except OSError:
+                    continue  # Gone since the walk
+                if filters and not filters.accepts_file(join_rel(rel_dir, file), src_stat if filters.needs_stat else None):
+                    continue
+                new_file = os.path.join(target_dir, file)
+                try:
+                    if same_file(src_stat, os.stat(new_file)):
+                        continue  # Already written before the pass was interrupted
+                    os.unlink(new_file)
+                except FileNotFoundError:
+                    pass
+                if previous_dir is not None:
+                    old_file = os.path.join(previous_dir, file)
+                    try:
+                        if same_file(src_stat, os.stat(old_file)):
+                            os.link(old_file, new_file)
+                            linked += 1
+                            continue
+                    except OSError:
+                        pass  # Missing, changed, or no hardlinks here (e.g. FAT): copy it instead
+                metrics.file_planned(src_stat.st_size)
+                if not wait_for({src_dev, dest_dev}):
+                    report("Snapshot stopped by user")
+                    return False
+                started = time.monotonic()
+                try:
+                    copy_file(src_file, new_file)
+                except OSError as e:
+                    # Nothing of it may stay behind, or a resumed pass would take it for complete
+                    try:
+                        os.unlink(new_file)
+                    except OSError:
+                        pass
+                    rel_path = join_rel(rel_dir, file)
+                    report(f"Could not copy {rel_path}: {e}")
+                    profile.error(f"{rel_path}: {e}")
+                    events.emit('file_failed', path=rel_path, error=str(e))
+                    failed += 1
+                    continue
+                elapsed = time.monotonic() - started
+                copy_seconds += elapsed
+                metrics.file_copied(src_stat.st_size, elapsed)
+                profile.count("files_copied")
+                profile.count("bytes_copied", src_stat.st_size)
+                events.emit('file_copied', path=join_rel(rel_dir, file), bytes=src_stat.st_size, seconds=elapsed)
+                copied += 1
+                bytes_copied += src_stat.st_size
+        if partials:
+            # A resumed snapshot may hold files deleted from the source since
+            for root_dir, dirs, files in os.walk(target):
+                rel_dir = os.path.relpath(root_dir, target)
+                for file in files:
+                    if not os.path.exists(os.path.join(source, rel_dir, file)):
+                        os.unlink(os.path.join(root_dir, file))
+    finally:
+        metrics.scan_complete()
+
+    os.rename(target, os.path.join(destination, name))
+    report(f"Snapshot {name} completed.\nSource: {source}\nDestination: {destination}\n"
+           f"Files copied: {copied} ({bytes_copied / (1024 * 1024):.1f} MB), unchanged and hardlinked: {linked}\n"
+           f"Copying: {copy_seconds:.0f}s, thermal waiting: {waited:.0f}s"
+           + (f"\nFiles that could not be copied: {failed}" if failed else ""))
+    return True
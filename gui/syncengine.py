@@ -0,0 +1,699 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+from compare import Comparator
+from eventlog import NullEvents
+from extsort import WRITE_BUFFER, join, key_path, path_key, read_records, write_record
+from filetable import DIRECTORY, FILE
+from filters import FileFilter, join_rel, plan_vanished
+from copyexec import CopyExecutor, copy_file
+from manifest import hash_bytes
+from quarantine import skip_trash
+from runreport import PassProfile
+from unlinker import remove_trees
+
+# CoolSync Backup
+# Sync engine: scans the source, copies new and changed files and removes
+# files that are gone from the source, waiting only on hot devices it touches.
+# Progress goes to a report(message) callback, so the engine runs the same
+# inside the daemon, a benchmark or a test harness.
+
+WORK_QUEUE_SIZE = 10000  # Scanned entries waiting for the destination
+READ_AHEAD_BYTES = 64 * 1024 * 1024  # Source data buffered while only the destination is hot
+READ_AHEAD_FILE_LIMIT = 8 * 1024 * 1024  # Larger files are always copied straight from disk
+VANISHED_BATCH = 1000  # Vanished folders handed to the unlinker at once in a streaming pass
+
+
+class ReadAheadBudget:
+    """Caps how many bytes of source data are held in memory at once."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def try_reserve(self, size):
+        with self.lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self.lock:
+            self.used -= size
+
+
+def existing_stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def put_work(work, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            work.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def read_ahead(src_file, budget):
+    try:
+        size = os.path.getsize(src_file)
+        if size > READ_AHEAD_FILE_LIMIT or not budget.try_reserve(size):
+            return None
+    except OSError:
+        return None
+    try:
+        mtime = os.path.getmtime(src_file)
+        with open(src_file, 'rb') as file:
+            data = file.read()
+    except OSError:
+        budget.release(size)
+        return None
+    if len(data) != size:
+        budget.release(size)
+        return None
+    return data, mtime
+
+
+def scan_source(source, destination, stop_event, gate, devices, work, budget, metrics, on_pause, on_resume, filters, comparator,
+                profile, directories):
+    """
+    Walk the source in sorted order and queue the plan: each directory once,
+    ahead of its files, then each file that may need copying. Every
+    directory's timestamps are appended to directories for the final pass.
+    """
+    src_dev, dest_dev = devices
+    clock = profile.clock
+    scan_started = clock()
+    missing_dirs = set()  # Destination directories known not to exist yet; nothing in them needs comparing
+    try:
+        for root_dir, dirs, files in profile.walk(os.walk(source)):
+            # Scanning only touches the source, so a hot destination does not stop it
+            if not gate.wait_for({src_dev}, stop_event, on_pause, on_resume):
+                return
+            rel_dir = os.path.relpath(root_dir, source)
+            if filters:
+                filters.prune(rel_dir, dirs)  # Excluded subtrees are never walked
+            dirs.sort()
+            files.sort()
+            started = clock()
+            try:
+                dir_stat = os.stat(root_dir)
+            except OSError:
+                continue  # Removed since the walk listed it
+            profile.add_call("stat", started)
+            directories.append((rel_dir, dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+            parent = os.path.dirname(rel_dir) or '.'
+            if rel_dir != '.' and parent in missing_dirs:
+                missing = True
+            elif dest_dev == src_dev or not gate.blocked({dest_dev}):
+                started = clock()
+                missing = not os.path.isdir(os.path.join(destination, rel_dir))
+                profile.add_call("stat", started)
+            else:
+                missing = None  # Destination hot: the copier checks when it gets there
+            if missing:
+                missing_dirs.add(rel_dir)
+            if not put_work(work, (rel_dir, None, None, missing), stop_event):
+                return
+            for file in files:
+                if stop_event.is_set():
+                    return
+                src_file = os.path.join(root_dir, file)
+                if filters and filters.needs_stat:
+                    started = clock()
+                    try:
+                        src_stat = os.stat(src_file)
+                    except OSError:
+                        continue  # Gone since the walk
+                    profile.add_call("stat", started)
+                else:
+                    src_stat = None
+                if filters and not filters.accepts_file(join_rel(rel_dir, file), src_stat):
+                    continue
+                prefetched = None
+                if missing:
+                    # Nothing to compare against in a directory that is about to be created
+                    started = clock()
+                    try:
+                        size = src_stat.st_size if src_stat is not None else os.stat(src_file).st_size
+                    except OSError:
+                        continue
+                    profile.add_call("stat", started)
+                    metrics.file_planned(size)
+                    decided = True
+                elif dest_dev == src_dev or not gate.blocked({dest_dev}):
+                    # Decide up front so the dashboard knows how much is left to copy
+                    started = clock()
+                    try:
+                        size = comparator.needs_copy(join_rel(rel_dir, file), src_file, os.path.join(destination, rel_dir, file))
+                    except OSError:
+                        continue  # Gone since the walk, or unreadable; the next pass tries again
+                    profile.add_call("compare", started)
+                    profile.count("files_compared")
+                    if size is None:
+                        continue
+                    metrics.file_planned(size)
+                    decided = True
+                else:
+                    # While only the destination is hot, keep the cool source busy reading ahead
+                    started = clock()
+                    prefetched = read_ahead(src_file, budget)
+                    profile.add_call("read", started)
+                    decided = False
+                if not put_work(work, (rel_dir, file, prefetched, decided), stop_event):
+                    return
+    finally:
+        profile.add_phase("scan", clock() - scan_started)
+        metrics.scan_complete()
+        put_work(work, None, stop_event)
+
+
+def list_sorted(root, runs, side, filters, wait, stop_event, profile):
+    """
+    List every folder and file under root into runs (an extsort.SortedRuns).
+    side is "source" or "destination": the source records folder times and
+    drops files the filters reject, the destination skips the trash and
+    keeps excluded names out of the listing. False if stopped.
+    """
+    clock = profile.clock
+    pending = ['.']
+    while pending:
+        if not wait() or stop_event.is_set():
+            return False
+        rel_dir = pending.pop()
+        dir_path = os.path.join(root, rel_dir)
+        dir_key = path_key(rel_dir)
+        dirs = []
+        started = clock()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue  # Removed since its parent was listed
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                    continue
+                try:
+                    if entry.is_symlink() and entry.is_dir():
+                        continue  # Like os.walk: a link to a folder is neither walked nor copied
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Broken link or gone meanwhile
+                if filters:
+                    rel_path = join_rel(rel_dir, entry.name)
+                    if side == "source" and not filters.accepts_file(rel_path, stat):
+                        continue
+                    if side == "destination" and filters.excludes_name(rel_path):
+                        continue
+                runs.add_file(dir_key, os.fsencode(entry.name), stat.st_size, stat.st_mtime_ns)
+        profile.add_call("walk", started)
+        if side == "source":
+            try:
+                dir_stat = os.stat(dir_path)
+            except OSError:
+                continue  # Removed while it was listed
+            runs.add_directory(dir_key, dir_stat.st_mtime_ns, dir_stat.st_atime_ns)
+        else:
+            runs.add_directory(dir_key)
+            skip_trash(rel_dir, dirs)
+        if filters:
+            filters.prune(rel_dir, dirs)
+        pending.extend(os.path.join(rel_dir, name) if rel_dir != '.' else name for name in dirs)
+    return True
+
+
+def scan_streaming(source, destination, stop_event, gate, devices, work, metrics, on_pause, on_resume, filters, comparator,
+                   profile, space):
+    """
+    scan_source for trees too large to list in memory. Both trees go into
+    sorted runs in space (an extsort.SortSpace), the runs are merged, and the
+    plan is queued from the merge. Source folder times are written to
+    space.path("directories") and what only the destination has to
+    space.path("gone"): a vanished folder once, without its contents.
+    """
+    src_dev, dest_dev = devices
+    clock = profile.clock
+    scan_started = clock()
+    try:
+        source_runs = space.runs("source")
+        if not list_sorted(source, source_runs, "source", filters,
+                           lambda: gate.wait_for({src_dev}, stop_event, on_pause, on_resume), stop_event, profile):
+            return
+        source_runs.spill()
+        dest_runs = space.runs("destination")
+        if os.path.isdir(destination) and not list_sorted(
+                destination, dest_runs, "destination", filters,
+                lambda: gate.wait_for({dest_dev}, stop_event, on_pause, on_resume), stop_event, profile):
+            return
+        directories = open(space.path("directories"), 'wb', buffering=WRITE_BUFFER)
+        gone = open(space.path("gone"), 'wb', buffering=WRITE_BUFFER)
+        with directories, gone:
+            gone_prefix = None  # Key prefix of the last vanished folder; its contents need no records
+            for src, dest in join(source_runs.merged(), dest_runs.merged()):
+                if stop_event.is_set():
+                    return
+                if src is None:
+                    if not (gone_prefix and dest[0].startswith(gone_prefix)):
+                        write_record(gone, *dest)
+                        if dest[1] == DIRECTORY:
+                            gone_prefix = dest[0] + b'\0'
+                    continue
+                key, kind, size, mtime_ns, atime_ns = src
+                rel_path = key_path(key)
+                if kind == DIRECTORY:
+                    write_record(directories, *src)
+                    if not put_work(work, (rel_path, None, None, dest is None or dest[1] != DIRECTORY), stop_event):
+                        return
+                    continue
+                if dest is None or dest[1] != FILE:
+                    metrics.file_planned(size)
+                    decided = True
+                elif comparator.mode != "checksum" and mtime_ns <= dest[3]:
+                    continue  # The listing already shows the backup is current
+                elif comparator.mode == "mtime":
+                    metrics.file_planned(size)
+                    decided = True
+                else:
+                    decided = False  # The copier compares contents
+                if not put_work(work, (os.path.dirname(rel_path) or '.', os.path.basename(rel_path), None, decided), stop_event):
+                    return
+    finally:
+        profile.add_phase("scan", clock() - scan_started)
+        metrics.scan_complete()
+        put_work(work, None, stop_event)
+
+
+def restore_directory_times(destination, directories, wait_for, profile):
+    """
+    Give destination directories their source times. directories is any iterable
+    of (rel_dir, atime_ns, mtime_ns); setting a folder's times does not change its
+    parent's, so a streaming pass can feed them straight from disk. False if stopped.
+    """
+    clock = profile.clock
+    for rel_dir, atime_ns, mtime_ns in directories:
+        if not wait_for():
+            return False
+        dest_dir = os.path.join(destination, rel_dir)
+        started = clock()
+        try:
+            if os.stat(dest_dir).st_mtime_ns != mtime_ns:
+                os.utime(dest_dir, ns=(atime_ns, mtime_ns))
+        except FileNotFoundError:
+            pass
+        profile.add_call("utime", started)
+    return True
+
+
+def deletion_rate(profile):
+    """Files deleted and how fast, for the pass report."""
+    files = profile.counters["files_deleted"]
+    seconds = profile.phases["delete"]
+    return f"{files} files in {seconds:.1f}s ({files / max(seconds, 1e-6):.0f} files/s)"
+
+
+def delete_missing(source, destination, stop_event, wait_for, devices, filters, manifest, quarantine, profile):
+    """Remove what is gone from the source; returns how many entries went, or None if stopped."""
+    clock = profile.clock
+    removed = 0
+    vanished = []  # Folders gone from the source, removed as whole trees after the walk
+    for root_dir, dirs, files in profile.walk(os.walk(destination)):
+        if not wait_for(set(devices)):
+            return None
+        rel_dir = os.path.relpath(root_dir, destination)
+        src_dir = os.path.join(source, rel_dir)
+        skip_trash(rel_dir, dirs)
+        if filters:
+            filters.prune(rel_dir, dirs)
+        for name in [name for name in dirs if not os.path.exists(os.path.join(src_dir, name))]:
+            dirs.remove(name)
+            removed += drop_vanished_folder(destination, join_rel(rel_dir, name), filters, manifest, quarantine, vanished,
+                                            profile)
+        for file in files:
+            if stop_event.is_set():
+                return None
+            if filters and filters.excludes_name(join_rel(rel_dir, file)):
+                continue
+            started = clock()
+            exists = os.path.exists(os.path.join(src_dir, file))
+            profile.add_call("stat", started)
+            if not exists:
+                removed += drop_gone(destination, join_rel(rel_dir, file), False, manifest, quarantine, vanished, profile)
+    if vanished:
+        gone = remove_vanished(vanished, lambda: wait_for({devices[1]}), profile)
+        if gone is None:
+            return None
+        removed += gone
+    return removed
+
+
+def delete_gone(destination, gone_path, stop_event, wait_for, dest_dev, filters, manifest, quarantine, profile):
+    """delete_missing for a streaming pass: removes what scan_streaming wrote to gone_path."""
+    removed = 0
+    vanished = []
+    last_dir = None
+    for key, kind, _, _, _ in read_records(gone_path):
+        if stop_event.is_set():
+            return None
+        rel_path = key_path(key)
+        rel_dir = os.path.dirname(rel_path)
+        if rel_dir != last_dir:
+            if not wait_for({dest_dev}):
+                return None
+            last_dir = rel_dir
+        if kind == DIRECTORY:
+            removed += drop_vanished_folder(destination, rel_path, filters, manifest, quarantine, vanished, profile)
+            if len(vanished) >= VANISHED_BATCH:
+                gone = remove_vanished(vanished, lambda: wait_for({dest_dev}), profile)
+                if gone is None:
+                    return None
+                removed += gone
+                vanished = []
+        else:
+            removed += drop_gone(destination, rel_path, False, manifest, quarantine, vanished, profile)
+    if vanished:
+        gone = remove_vanished(vanished, lambda: wait_for({dest_dev}), profile)
+        if gone is None:
+            return None
+        removed += gone
+    return removed
+
+
+def drop_vanished_folder(destination, rel_path, filters, manifest, quarantine, vanished, profile):
+    """
+    Delete a destination folder that is gone from the source. With filters,
+    whatever they exclude inside it stays, along with the folders holding it;
+    everything else goes, so no empty skeleton is left behind.
+    """
+    if filters:
+        trees, files = plan_vanished(rel_path, lambda rel: list_folder(os.path.join(destination, rel)), filters)
+    else:
+        trees, files = [rel_path], []
+    removed = 0
+    for tree in trees:
+        removed += drop_gone(destination, tree, True, manifest, quarantine, vanished, profile)
+    for file in files:
+        removed += drop_gone(destination, file, False, manifest, quarantine, vanished, profile)
+    return removed
+
+
+def drop_gone(destination, rel_path, is_dir, manifest, quarantine, vanished, profile):
+    """
+    Delete one entry gone from the source, or move it to the trash. Folders
+    are queued on vanished for the unlinker unless quarantined. Returns how
+    many entries went right away.
+    """
+    started = profile.clock()
+    if quarantine is not None:
+        # A folder gone from the source goes to the trash in one rename
+        moved = quarantine.move(rel_path)
+        profile.add_call("rename", started)
+        if not moved:
+            return 0
+        profile.count("moved_to_trash")
+        removed = 1
+    elif is_dir:
+        vanished.append(os.path.join(destination, rel_path))
+        removed = 0
+    else:
+        os.remove(os.path.join(destination, rel_path))
+        profile.add_call("unlink", started)
+        profile.count("files_deleted")
+        removed = 1
+    if manifest is not None:
+        if is_dir:
+            manifest.remove_tree(rel_path)
+        else:
+            manifest.remove(rel_path)
+    return removed
+
+
+def list_folder(path):
+    """(file names, folder names) in one destination folder."""
+    files, dirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            (dirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+    return files, dirs
+
+
+def remove_vanished(folders, wait, profile):
+    """Remove whole folders with the parallel unlinker; how many entries went, or None if stopped."""
+    summary = remove_trees(folders, wait)
+    profile.add_calls("unlink", summary["files"] + summary["folders"], summary["seconds"])
+    profile.count("files_deleted", summary["files"])
+    if summary["stopped"]:
+        return None
+    return summary["files"] + summary["folders"]
+
+
+def sync_pass(source, destination, stop_event, report, gate, metrics, filters=None, manifest=None, copy_workers=1,
+              quarantine=None, compare="mtime", hash_cache=None, profile=None, events=None, sort_space=None):
+    """
+    Run one pass for a source/destination pair. Returns False if it was stopped.
+    filters is a FileFilter; excluded files are neither copied nor deleted.
+    If a Manifest is given, every file written is hashed and recorded in it.
+    copy_workers > 1 copies that many files at a time.
+    With a Quarantine, files gone from the source are moved to its trash folder instead of deleted.
+    compare is one of compare.COMPARE_MODES; a HashCache saves rehashing unchanged files.
+    Timings and counts go to profile, a runreport.PassProfile; events (an EventLog or bound emitter)
+    gets file_copied, file_failed, thermal_pause and thermal_resume. A file that cannot be copied is
+    reported and skipped; the pass goes on.
+    With an extsort.SortSpace both trees are listed into sorted runs on disk and diffed by
+    merging them, so memory stays under its cap however many files there are.
+    """
+    filters = filters or FileFilter()
+    profile = profile or PassProfile()
+    events = events or NullEvents()
+    clock = profile.clock
+    comparator = Comparator(compare, manifest, hash_cache)
+    src_dev = gate.device_for_path(source)
+    dest_dev = gate.device_for_path(destination)
+    waited = 0.0  # Wall clock the copier spent waiting on hot devices
+
+    paused_at = {}  # Thread id -> when its current pause began
+
+    def on_pause(hot):
+        paused_at[threading.get_ident()] = time.monotonic()
+        report(f"High temperature on {', '.join(sorted(hot))}. Pausing work on it.")
+        with gate.lock:
+            temperatures = {device: gate.temperatures.get(device) for device in hot}
+        events.emit('thermal_pause', devices=sorted(hot), temperatures=temperatures)
+
+    def on_resume(devices):
+        started = paused_at.pop(threading.get_ident(), None)
+        report("Temperature dropped to safe level. Resuming sync.")
+        events.emit('thermal_resume', devices=sorted(device for device in devices if device),
+                    paused_seconds=time.monotonic() - started if started is not None else None)
+
+    def wait_for(devices):
+        nonlocal waited
+        started = time.monotonic()
+        ready = gate.wait_for(devices, stop_event, on_pause, on_resume)
+        elapsed = time.monotonic() - started
+        waited += elapsed
+        metrics.thermal_wait(elapsed)
+        profile.add_phase("thermal_wait", elapsed)
+        return ready
+
+    gate.begin_pass({src_dev, dest_dev})
+    metrics.scan_started()
+
+    sync_performed = False
+    file_count = 0  # Counter for the number of synced files
+    copy_seconds = 0.0  # Wall clock spent writing to the destination
+    counters = threading.Lock()
+    executor = CopyExecutor(copy_workers, wait_for, stop_event)
+
+    def copy_one(rel_dir, file, src_file, dest_file, data):
+        call_started = clock()
+        started = time.monotonic()
+        digest = None
+        before = existing_stat(dest_file)
+        try:
+            if data is not None:
+                with open(dest_file, 'wb') as out:
+                    out.write(data)
+                shutil.copystat(src_file, dest_file)
+                if manifest is not None:
+                    digest = hash_bytes(data)
+            else:
+                digest = copy_file(src_file, dest_file, want_hash=manifest is not None)
+        except OSError as e:
+            copy_failed(join_rel(rel_dir, file), dest_file, before, e)
+            return None
+        elapsed = time.monotonic() - started
+        dest_stat = os.stat(dest_file)
+        profile.add_call("copy", call_started)
+        profile.count("files_copied")
+        profile.count("bytes_copied", dest_stat.st_size)
+        metrics.file_copied(dest_stat.st_size, elapsed)
+        if manifest is not None:
+            manifest.record(join_rel(rel_dir, file), dest_stat.st_size, dest_stat.st_mtime_ns, digest)
+        events.emit('file_copied', path=join_rel(rel_dir, file), bytes=dest_stat.st_size, seconds=elapsed)
+        return elapsed
+
+    def copy_prefetched(rel_dir, file, src_file, dest_file, data):
+        try:
+            return copy_one(rel_dir, file, src_file, dest_file, data)
+        finally:
+            budget.release(len(data))
+
+    def copy_failed(rel_path, dest_file, before, error):
+        after = existing_stat(dest_file)
+        if after is not None and (before is None or (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns)):
+            # A half-written copy would look newer than the source and never be retried
+            try:
+                os.remove(dest_file)
+            except OSError:
+                pass
+        report(f"Could not copy {rel_path}: {error}")
+        profile.error(f"{rel_path}: {error}")
+        events.emit('file_failed', path=rel_path, error=str(error))
+
+    def copied(elapsed):
+        nonlocal sync_performed, file_count, copy_seconds
+        if elapsed is None:
+            return
+        with counters:
+            copy_seconds += elapsed
+            sync_performed = True
+            file_count += 1  # Increment file count
+
+    # Add or update files from source to destination
+    work = queue.Queue(maxsize=WORK_QUEUE_SIZE)
+    budget = ReadAheadBudget(READ_AHEAD_BYTES)
+    directories = []  # (rel_dir, atime_ns, mtime_ns) of every source directory, parents first
+    if sort_space is None:
+        scanner = threading.Thread(target=scan_source, args=(source, destination, stop_event, gate, (src_dev, dest_dev), work, budget, metrics, on_pause, on_resume, filters, comparator, profile, directories), daemon=True)
+    else:
+        scanner = threading.Thread(target=scan_streaming, args=(source, destination, stop_event, gate, (src_dev, dest_dev), work, metrics, on_pause, on_resume, filters, comparator, profile, sort_space), daemon=True)
+    copy_started = clock()
+    scanner.start()
+    while True:
+        try:
+            item = work.get(timeout=0.5)
+        except queue.Empty:
+            if stop_event.is_set():
+                break
+            continue
+        if item is None:
+            break
+        rel_dir, file, prefetched, decided = item
+        # Read-ahead bytes count against the budget until copy_prefetched has written them
+        held = len(prefetched[0]) if prefetched is not None else 0
+        try:
+            if not wait_for({dest_dev}):
+                break
+            dest_dir = os.path.normpath(os.path.join(destination, rel_dir))
+            if file is None:
+                # Parents always come first in the plan, so one mkdir per missing directory and none for the rest
+                missing = decided
+                if missing is not False:
+                    started = clock()
+                    try:
+                        if rel_dir == '.':
+                            os.makedirs(dest_dir)  # The destination itself may be several levels deep
+                        else:
+                            os.mkdir(dest_dir)
+                        profile.count("dirs_created")
+                    except FileExistsError:
+                        pass
+                    profile.add_call("mkdir", started)
+                continue
+            src_file = os.path.join(source, rel_dir, file)
+            dest_file = os.path.join(dest_dir, file)
+            if not decided:
+                started = clock()
+                try:
+                    size = comparator.needs_copy(join_rel(rel_dir, file), src_file, dest_file)
+                except OSError:
+                    continue  # Gone since it was planned, or unreadable; the next pass tries again
+                profile.add_call("compare", started)
+                profile.count("files_compared")
+                if size is None:
+                    continue
+                metrics.file_planned(size)
+            try:
+                fresh = prefetched is not None and os.path.getmtime(src_file) == prefetched[1]
+            except OSError:
+                continue  # Gone since it was planned
+            # Read-ahead data only needs the destination; everything else reads the source too
+            devices = {dest_dev} if fresh else {src_dev, dest_dev}
+            if fresh:
+                function, data, held = copy_prefetched, prefetched[0], 0
+            else:
+                function, data = copy_one, None
+            if not executor.submit(devices, function, rel_dir, file, src_file, dest_file, data, on_done=copied):
+                break
+        finally:
+            if held:
+                budget.release(held)
+    scanner.join()
+    try:
+        executor.join()
+    finally:
+        profile.add_phase("copy", clock() - copy_started)
+    if stop_event.is_set():
+        report("Sync stopped by user")
+        return False
+
+    # Remove files from destination that no longer exist in source
+    with profile.phase("delete"):
+        if sort_space is None:
+            removed = delete_missing(source, destination, stop_event, wait_for, (src_dev, dest_dev), filters, manifest, quarantine,
+                                     profile)
+        else:
+            removed = delete_gone(destination, sort_space.path("gone"), stop_event, wait_for, dest_dev, filters, manifest,
+                                  quarantine, profile)
+    if removed is None:
+        report("Sync stopped by user")
+        return False
+    sync_performed = sync_performed or removed > 0
+
+    # Copies and deletions touched directory times; put them back once, deepest first
+    if sort_space is None:
+        directories = sorted(directories, key=lambda entry: entry[0].count(os.sep), reverse=True)
+    else:
+        directories = ((key_path(key), atime_ns, mtime_ns)
+                       for key, _, _, mtime_ns, atime_ns in read_records(sort_space.path("directories")))
+    if not restore_directory_times(destination, directories, lambda: wait_for({dest_dev}), profile):
+        report("Sync stopped by user")
+        return False
+
+    if sync_performed:
+        report(f"Sync completed successfully.\nSource: {source}\nDestination: {destination}\nFiles synced: {file_count}\n"
+               f"Copying: {copy_seconds:.0f}s, thermal waiting: {waited:.0f}s"
+               + (f"\nMoved to trash: {quarantine.moved}" if quarantine is not None and quarantine.moved else "")
+               + (f"\nDeleted: {deletion_rate(profile)}" if profile.counters["files_deleted"] else "")
+               + (f"\nFiles that could not be copied: {len(profile.errors)}" if profile.errors else "")
+               + f"\n{profile.summary()}")
+    if quarantine is not None and quarantine.skipped:
+        shown = ', '.join(quarantine.skipped[:5]) + (', ...' if len(quarantine.skipped) > 5 else '')
+        report(f"Not moved to trash, as they are on another filesystem; left in place: {len(quarantine.skipped)} ({shown})")
+    if comparator.metadata_only:
+        report(f"Unchanged content, updated metadata only: {comparator.metadata_only} files, "
+               f"{comparator.avoided_bytes / (1024 * 1024):.1f} MB of copying avoided")
+    elif not sync_performed:
+        report("No files to sync or already synced")
+    return True
+
+
+def sync_files(source, destination, stop_event, report, gate, monitor_interval, metrics):
+    report("Sync in progress...")
+    metrics.start_run()
+    while not stop_event.is_set():
+        if not sync_pass(source, destination, stop_event, report, gate, metrics):
+            return
+        # Wait for the monitor interval before checking temperatures again
+        stop_event.wait(monitor_interval * 60)
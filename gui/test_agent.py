@@ -0,0 +1,131 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from agent import DIRECTORY, FILE, MISSING, AgentClient, AgentError, make_agent_server
+from filters import FileFilter
+from metrics import SyncMetrics
+from remotesync import remote_pass
+from thermal import ThermalGate
+
+# CoolSync Backup
+# Round trip against a destination agent on localhost: python -m pytest gui/test_agent.py
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def agent(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    server = make_agent_server(('127.0.0.1', 0), str(root), TOKEN)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def call(request, *args):
+    """Run one client request and wait for its (error, value)."""
+    done = threading.Event()
+    result = {}
+
+    def on_done(error, value):
+        result["error"], result["value"] = error, value
+        done.set()
+
+    request(*args, on_done)
+    assert done.wait(10)
+    return result["error"], result["value"]
+
+
+def test_round_trip(agent, tmp_path):
+    root, port = agent
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+    os.utime(source, ns=(1_000_000_000, 2_000_000_000))
+    client = AgentClient(f"agent://127.0.0.1:{port}/backup", TOKEN)
+    try:
+        assert call(client.put, "a/b/file.bin", str(source), os.stat(source)) == (None, source.stat().st_size)
+        copy = root / "backup" / "a" / "b" / "file.bin"
+        assert copy.read_bytes() == source.read_bytes()
+        assert copy.stat().st_mtime_ns == 2_000_000_000
+
+        (root / "backup" / "a" / "extra.txt").write_text("only on the agent")
+        error, (entries, extras) = call(client.list, "a", ["b", "missing"])
+        assert error is None
+        assert [entry[0] for entry in entries] == [DIRECTORY, MISSING]
+        assert extras == [(FILE, "extra.txt")]
+
+        assert call(client.set_dir, "a", 3_000_000_000, 4_000_000_000) == (None, 0)
+        assert (root / "backup" / "a").stat().st_mtime_ns == 4_000_000_000
+
+        assert call(client.delete, "a/extra.txt") == (None, 1)
+        assert call(client.delete, "a/b") == (None, 1)
+        assert sorted(os.listdir(root / "backup" / "a")) == []
+        client.drain()
+    finally:
+        client.close()
+
+
+def test_paths_outside_the_destination_are_refused(agent, tmp_path):
+    root, port = agent
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "victim.txt").write_text("keep me")
+    os.makedirs(root / "backup")
+    os.symlink(outside, root / "backup" / "link")
+    source = tmp_path / "source.txt"
+    source.write_text("payload")
+
+    with pytest.raises(AgentError):
+        AgentClient(f"agent://127.0.0.1:{port}/../x", TOKEN).close()
+    client = AgentClient(f"agent://127.0.0.1:{port}/backup", TOKEN)
+    try:
+        for path in ("../x", "a/../../x", "link/victim.txt", "link/new.txt"):
+            error, _ = call(client.put, path, str(source), os.stat(source))
+            assert error and "outside the destination" in error
+        for path in ("../x", "link/victim.txt"):
+            error, _ = call(client.delete, path)
+            assert error and "outside the destination" in error
+        error, _ = call(client.set_dir, "link", 0, 0)
+        assert error and "outside the destination" in error
+        # The link itself is inside and may go; what it points to stays
+        assert call(client.delete, "link") == (None, 1)
+    finally:
+        client.close()
+    assert (outside / "victim.txt").read_text() == "keep me"
+    assert not (tmp_path / "x").exists() and not (outside / "new.txt").exists()
+
+
+def test_wrong_token_is_refused(agent):
+    _, port = agent
+    with pytest.raises(AgentError, match="token"):
+        AgentClient(f"agent://127.0.0.1:{port}/backup", "wrong")
+
+
+def test_vanished_folder_keeps_excluded_entries(agent, tmp_path):
+    root, port = agent
+    source = tmp_path / "source"
+    for rel_path in ("keep.txt", "a/one.txt", "a/c/three.txt", "b/two.txt", "b/d/four.txt"):
+        os.makedirs((source / rel_path).parent, exist_ok=True)
+        (source / rel_path).write_text("data")
+    url = f"agent://127.0.0.1:{port}/backup"
+    gate = ThermalGate({}, sample=lambda device: 30)
+    filters = FileFilter({"exclude": ["*.tmp"]})
+
+    def run():
+        assert remote_pass(str(source), url, threading.Event(), lambda message: None, gate, SyncMetrics(), filters,
+                           token=TOKEN)
+
+    run()
+    (root / "backup" / "a" / "c" / "scratch.tmp").write_text("excluded")
+    shutil.rmtree(source / "a")
+    shutil.rmtree(source / "b")
+    run()
+    backup = root / "backup"
+    assert sorted(os.path.relpath(os.path.join(folder, name), backup)
+                  for folder, dirs, files in os.walk(backup) for name in dirs + files) == \
+        ["a", "a/c", "a/c/scratch.tmp", "keep.txt"]
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from compare import EDGE_BYTES, Comparator, hash_file, same_edges
+from hashcache import HashCache
+from manifest import Manifest
+
+# CoolSync Backup
+# When a changed-looking file is copied or only has its metadata fixed: python -m pytest gui/test_compare.py
+
+OLD, NEW = 1_000_000_000, 2_000_000_000  # mtime_ns of the backup copy and of a touched source
+
+
+@pytest.fixture
+def files(tmp_path):
+    source, backup = tmp_path / "source.bin", tmp_path / "backup.bin"
+    data = os.urandom(3 * EDGE_BYTES)
+    source.write_bytes(data)
+    backup.write_bytes(data)
+    os.utime(backup, ns=(OLD, OLD))
+    os.utime(source, ns=(NEW, NEW))
+    return str(source), str(backup)
+
+
+def change_middle(path):
+    with open(path, 'r+b') as file:
+        file.seek(EDGE_BYTES + 10)
+        file.write(b'changed')
+    os.utime(path, ns=(NEW, NEW))
+
+
+def test_mtime_copies_anything_newer(files):
+    source, backup = files
+    assert Comparator("mtime").needs_copy("f", source, backup) == os.path.getsize(source)
+    os.utime(source, ns=(OLD, OLD))
+    assert Comparator("mtime").needs_copy("f", source, backup) is None
+
+
+def test_metadata_fixes_times_of_a_touched_file(files, tmp_path):
+    source, backup = files
+    comparator = Comparator("metadata", hash_cache=HashCache(str(tmp_path / "cache.sqlite")))
+    assert comparator.needs_copy("f", source, backup) is None
+    assert os.stat(backup).st_mtime_ns == NEW
+    assert comparator.metadata_only == 1
+
+
+def test_metadata_copies_a_changed_middle(files, tmp_path):
+    source, backup = files
+    change_middle(source)
+    assert same_edges(source, backup, os.path.getsize(source))
+    comparator = Comparator("metadata", hash_cache=HashCache(str(tmp_path / "cache.sqlite")))
+    assert comparator.needs_copy("f", source, backup) == os.path.getsize(source)
+
+
+def test_metadata_without_a_full_hash_copies(files):
+    # Equal first and last bytes say nothing about the middle
+    source, backup = files
+    assert Comparator("metadata").needs_copy("f", source, backup) == os.path.getsize(source)
+
+
+def test_metadata_trusts_the_manifest_hash_of_the_backup(files, tmp_path):
+    source, backup = files
+    manifest = Manifest(str(tmp_path / "manifest.sqlite"))
+    manifest.record("f", os.path.getsize(backup), OLD, hash_file(backup))
+    assert Comparator("metadata", manifest).needs_copy("f", source, backup) is None
+    assert manifest.lookup("f")[1] == NEW
+
+
+def test_checksum_ignores_mtime(files, tmp_path):
+    source, backup = files
+    change_middle(backup)
+    os.utime(source, ns=(OLD, OLD))
+    os.utime(backup, ns=(NEW, NEW))
+    comparator = Comparator("checksum", hash_cache=HashCache(str(tmp_path / "cache.sqlite")))
+    assert comparator.needs_copy("f", source, backup) == os.path.getsize(source)
+
+
+def test_same_edges_compares_head_and_tail(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    data = bytearray(os.urandom(3 * EDGE_BYTES))
+    first.write_bytes(data)
+    data[-1] ^= 0xFF
+    second.write_bytes(data)
+    assert not same_edges(str(first), str(second), len(data))
+    data[-1] ^= 0xFF
+    data[EDGE_BYTES + 1] ^= 0xFF
+    second.write_bytes(data)
+    assert same_edges(str(first), str(second), len(data))
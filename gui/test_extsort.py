@@ -0,0 +1,76 @@
+import random
+
+import extsort
+from extsort import SortedRuns, join, key_path, path_key
+from filetable import DIRECTORY, FILE, FileTable
+
+# CoolSync Backup
+# Sorted runs and the file table agree on one key order: python -m pytest gui/test_extsort.py
+
+
+def random_tree(seed=7, folders=200, files=1500):
+    """(folder keys, file keys) with names that sort around the separator: 'a', 'a-b', 'a.c', 'a b'."""
+    rng = random.Random(seed)
+    alphabet = 'ab-. '
+    dirs = [b'']
+    for _ in range(folders):
+        parent = rng.choice(dirs)
+        name = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 3))).strip().encode() or b'x'
+        key = parent + b'\0' + name if parent else name
+        if key not in dirs:
+            dirs.append(key)
+    names = set()
+    for _ in range(files):
+        parent = rng.choice(dirs)
+        name = b'f' + ''.join(rng.choice(alphabet) for _ in range(4)).encode()
+        key = parent + b'\0' + name if parent else name
+        if key not in dirs:
+            names.add(key)
+    return dirs, sorted(names)
+
+
+def test_file_table_yields_key_order():
+    dirs, files = random_tree()
+    table = FileTable()
+    for key in dirs:
+        table.add_directory(key, 5, 6)
+    for key in reversed(files):
+        folder, _, name = key.rpartition(b'\0')
+        table.add_file(table.intern(folder), name, 1, 2)
+    records = list(table.sorted_records())
+    assert [record[0] for record in records] == sorted(dirs + files)
+    assert {record[0]: record[1] for record in records}[dirs[-1]] == DIRECTORY
+
+
+def test_merged_runs_keep_key_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(extsort, "MAX_FAN_IN", 3)  # Forces merging in rounds
+    dirs, files = random_tree()
+    entries = [(key, DIRECTORY) for key in dirs] + [(key, FILE) for key in files]
+    random.Random(1).shuffle(entries)
+    runs = SortedRuns(str(tmp_path), 4096, "test")
+    for key, kind in entries:
+        if kind == DIRECTORY:
+            runs.add_directory(key)
+        else:
+            folder, _, name = key.rpartition(b'\0')
+            runs.add_file(folder, name, len(key), 0)
+    assert len(runs.runs) > 3
+    merged = [record[0] for record in runs.merged()]
+    assert merged == sorted(dirs + files)
+    # A folder comes right before everything inside it
+    for index, key in enumerate(merged):
+        if key and key in dirs:
+            inside = [other for other in merged if other.startswith(key + b'\0')]
+            assert merged[index + 1:index + 1 + len(inside)] == inside
+
+
+def test_join_pairs_both_sides():
+    left = [(b'a', FILE), (b'b', FILE), (b'd', FILE)]
+    right = [(b'b', FILE), (b'c', FILE)]
+    pairs = [(l and l[0], r and r[0]) for l, r in join(left, right)]
+    assert pairs == [(b'a', None), (b'b', b'b'), (None, b'c'), (b'd', None)]
+
+
+def test_keys_round_trip():
+    assert path_key('.') == b''
+    assert key_path(path_key('a/b c/d')) == key_path(b'a\0b c\0d')
@@ -0,0 +1,59 @@
+from filters import FileFilter, plan_vanished
+
+# CoolSync Backup
+# gitignore semantics of the filter rules: python -m pytest gui/test_filters.py
+
+
+def test_negation_last_match_wins():
+    filters = FileFilter({"exclude": ["*.tmp", "!keep.tmp"]})
+    assert filters.excludes_name("a/scratch.tmp")
+    assert not filters.excludes_name("a/keep.tmp")
+    filters = FileFilter({"exclude": ["!keep.tmp", "*.tmp"]})
+    assert filters.excludes_name("a/keep.tmp")
+
+
+def test_slash_anchors_at_the_root():
+    filters = FileFilter({"exclude": ["build/out.log", "/top.txt", "notes.txt"]})
+    assert filters.excludes_name("build/out.log")
+    assert not filters.excludes_name("src/build/out.log")
+    assert filters.excludes_name("top.txt")
+    assert not filters.excludes_name("a/top.txt")
+    assert filters.excludes_name("a/b/notes.txt")
+
+
+def test_double_star_crosses_folders_and_single_star_does_not():
+    filters = FileFilter({"exclude": ["docs/**/draft.md", "src/*.o"]})
+    assert filters.excludes_name("docs/draft.md")
+    assert filters.excludes_name("docs/a/b/draft.md")
+    assert filters.excludes_name("src/main.o")
+    assert not filters.excludes_name("src/sub/main.o")
+
+
+def test_trailing_slash_matches_folders_only():
+    filters = FileFilter({"exclude": ["cache/"]})
+    dirs = ["cache", "photos"]
+    filters.prune("a", dirs)
+    assert dirs == ["photos"]
+    assert not filters.excludes_name("a/cache")
+
+
+def test_include_keeps_whole_folders():
+    filters = FileFilter({"include": ["*.jpg", "docs/"]})
+    assert not filters.excludes_name("2024/holiday.jpg")
+    assert not filters.excludes_name("docs/a/readme.txt")
+    assert filters.excludes_name("2024/holiday.mov")
+
+
+def test_plan_vanished_keeps_only_what_holds_excluded_entries():
+    listing = {
+        "a": (["one.txt", "x.tmp"], ["b", "c", "cache"]),
+        "a/b": (["two.txt"], []),
+        "a/c": (["three.txt"], ["d"]),
+        "a/c/d": (["y.tmp"], []),
+        "a/cache": (["blob"], []),
+    }
+    filters = FileFilter({"exclude": ["*.tmp", "cache/"]})
+    trees, files = plan_vanished("a", listing.__getitem__, filters)
+    assert sorted(trees) == ["a/b"]
+    assert sorted(files) == ["a/c/three.txt", "a/one.txt"]
+    assert plan_vanished("a/b", listing.__getitem__, filters) == (["a/b"], [])
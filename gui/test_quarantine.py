@@ -0,0 +1,80 @@
+import datetime
+import errno
+import os
+import threading
+
+import pytest
+
+import quarantine
+from metrics import SyncMetrics
+from quarantine import TRASH_DIR, Quarantine, purge_trash
+from syncengine import sync_pass
+from thermal import ThermalGate
+
+# CoolSync Backup
+# Trash moves, entries on another filesystem and expiry: python -m pytest gui/test_quarantine.py
+
+RUN = datetime.datetime(2024, 5, 1, 1, 30)
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """os.rename fails with EXDEV for a folder named "mount", as for a disk mounted there."""
+    rename = os.rename
+
+    def fake_rename(source, target):
+        if os.path.basename(source) == "mount":
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        rename(source, target)
+
+    monkeypatch.setattr(quarantine.os, "rename", fake_rename)
+
+
+def test_move_keeps_the_relative_path(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "old.txt").write_text("old")
+    trash = Quarantine(str(tmp_path), clock=lambda: RUN)
+    assert trash.move(os.path.join("a", "old.txt"))
+    assert (tmp_path / TRASH_DIR / "2024-05-01_013000" / "a" / "old.txt").read_text() == "old"
+    assert not (tmp_path / "a" / "old.txt").exists()
+    assert trash.moved == 1
+
+
+def test_other_filesystem_is_left_in_place(tmp_path, cross_device):
+    (tmp_path / "mount").mkdir()
+    (tmp_path / "mount" / "big.iso").write_text("data")
+    trash = Quarantine(str(tmp_path), clock=lambda: RUN)
+    assert not trash.move("mount")
+    assert (tmp_path / "mount" / "big.iso").exists()
+    assert trash.skipped == ["mount"] and trash.moved == 0
+
+
+def test_other_errors_are_raised(tmp_path):
+    trash = Quarantine(str(tmp_path), clock=lambda: RUN)
+    with pytest.raises(FileNotFoundError):
+        trash.move("missing.txt")
+
+
+def test_sync_reports_what_it_could_not_move(tmp_path, cross_device):
+    source, destination = tmp_path / "source", tmp_path / "destination"
+    source.mkdir()
+    (destination / "mount").mkdir(parents=True)
+    (destination / "mount" / "big.iso").write_text("data")
+    (destination / "gone.txt").write_text("old")
+    messages = []
+    assert sync_pass(str(source), str(destination), threading.Event(), messages.append,
+                     ThermalGate({}, sample=lambda device: 30), SyncMetrics(),
+                     quarantine=Quarantine(str(destination), clock=lambda: RUN))
+    assert (destination / "mount" / "big.iso").exists()
+    assert not (destination / "gone.txt").exists()
+    assert any("left in place: 1 (mount)" in message for message in messages)
+
+
+def test_purge_removes_expired_runs_only(tmp_path):
+    for name in ("2024-04-01_010000", "2024-04-29_010000", "not-a-run"):
+        (tmp_path / TRASH_DIR / name).mkdir(parents=True)
+        (tmp_path / TRASH_DIR / name / "file").write_text("x")
+    purged = purge_trash(str(tmp_path), 7, threading.Event(), lambda message: None,
+                         ThermalGate({}, sample=lambda device: 30), now=RUN)
+    assert purged == 1
+    assert sorted(os.listdir(tmp_path / TRASH_DIR)) == ["2024-04-29_010000", "not-a-run"]
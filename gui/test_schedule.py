@@ -0,0 +1,27 @@
+import datetime
+
+from schedule import BackupSchedule, TemperatureHistory
+
+# CoolSync Backup
+# Schedule windows and catch-up: python -m pytest gui/test_schedule.py
+
+NIGHTLY = {"mode": "windows", "windows": [{"start": "01:00", "end": "06:00"}], "catch_up": "run"}
+
+
+def schedule_at(now, tmp_path):
+    return BackupSchedule(NIGHTLY, TemperatureHistory(), str(tmp_path / "last_runs.json"), clock=lambda: now)
+
+
+def test_new_job_waits_for_its_first_window(tmp_path):
+    afternoon = datetime.datetime(2024, 5, 14, 15, 0)
+    assert not schedule_at(afternoon, tmp_path).may_start("photos", [])
+    assert schedule_at(afternoon.replace(hour=2), tmp_path).may_start("photos", [])
+
+
+def test_missed_window_is_caught_up(tmp_path):
+    night = datetime.datetime(2024, 5, 14, 2, 0)
+    schedule_at(night, tmp_path).pass_started("photos")
+    later_that_day = schedule_at(night.replace(hour=15), tmp_path)
+    assert not later_that_day.may_start("photos", [])
+    two_days_on = schedule_at(night + datetime.timedelta(days=2, hours=13), tmp_path)
+    assert two_days_on.may_start("photos", [])
@@ -0,0 +1,63 @@
+import os
+import threading
+
+import pytest
+
+from extsort import sort_space
+from filters import FileFilter
+from metrics import SyncMetrics
+from syncengine import sync_pass
+from thermal import ThermalGate
+
+# CoolSync Backup
+# Local passes, in memory and streaming through sorted runs: python -m pytest gui/test_syncengine.py
+
+# sort_space() memory in MB: None lists in memory, a tiny cap spills runs to disk
+ENGINES = [None, 0.001]
+
+
+def write(path, text="data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def run(source, destination, memory_mb, filters=None):
+    gate = ThermalGate({}, sample=lambda device: 30)
+    with sort_space(memory_mb) as space:
+        assert sync_pass(str(source), str(destination), threading.Event(), lambda message: None, gate, SyncMetrics(),
+                         filters=filters, sort_space=space)
+
+
+def tree(root):
+    return sorted(os.path.relpath(os.path.join(folder, name), root)
+                  for folder, dirs, files in os.walk(root) for name in dirs + files)
+
+
+@pytest.mark.parametrize("memory_mb", ENGINES)
+def test_vanished_folder_goes_whole_with_filters(tmp_path, memory_mb):
+    source, destination = tmp_path / "source", tmp_path / "destination"
+    for rel_path in ("keep.txt", "a/one.txt", "a/b/two.txt", "a/c/three.txt"):
+        write(str(source / rel_path))
+    filters = FileFilter({"exclude": ["*.tmp"]})
+    run(source, destination, memory_mb, filters)
+    assert "a/b/two.txt" in tree(destination)
+
+    os.rename(source / "a", tmp_path / "gone")
+    run(source, destination, memory_mb, filters)
+    assert tree(destination) == ["keep.txt"]
+
+
+@pytest.mark.parametrize("memory_mb", ENGINES)
+def test_vanished_folder_keeps_excluded_entries(tmp_path, memory_mb):
+    source, destination = tmp_path / "source", tmp_path / "destination"
+    for rel_path in ("keep.txt", "a/one.txt", "a/b/two.txt", "a/c/three.txt", "a/c/d/four.txt"):
+        write(str(source / rel_path))
+    filters = FileFilter({"exclude": ["*.tmp", "cache/"]})
+    run(source, destination, memory_mb, filters)
+    write(str(destination / "a" / "c" / "scratch.tmp"))
+    write(str(destination / "a" / "cache" / "blob"))
+
+    os.rename(source / "a", tmp_path / "gone")
+    run(source, destination, memory_mb, filters)
+    assert tree(destination) == ["a", "a/c", "a/c/scratch.tmp", "a/cache", "a/cache/blob", "keep.txt"]
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from thermal import COOL, HOT, UNKNOWN, WARM, ThermalGate, ThermalStateMachine
+
+# CoolSync Backup
+# Thermal state transitions and wait accounting: python -m pytest gui/test_thermal.py
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def machine(clock, **kwargs):
+    return ThermalStateMachine(40, 50, min_dwell=30, clock=clock, **kwargs)
+
+
+def test_one_raw_spike_makes_it_hot_at_once():
+    clock = Clock()
+    device = machine(clock)
+    for _ in range(3):
+        assert device.update(30) == COOL
+    assert device.update(55) == HOT  # The EMA is still far below high_temp
+    assert not device.allows_work()
+
+
+def test_hot_waits_for_cool_and_the_dwell():
+    clock = Clock()
+    device = machine(clock)
+    device.update(60)
+    clock.now += 60
+    for _ in range(4):
+        device.update(45)
+    assert 40 < device.ema < 50 and device.state == HOT  # Between the limits it stays HOT
+    for _ in range(5):
+        device.update(20)
+    assert device.state == COOL and device.allows_work()
+
+
+def test_warm_needs_the_dwell_to_change():
+    clock = Clock()
+    device = machine(clock)
+    device.update(30)
+    clock.now += 60
+    for _ in range(4):
+        device.update(45)  # The EMA climbs past safe_temp on the fourth reading
+    assert device.state == WARM and device.allows_work()
+    clock.now += 5
+    assert device.update(20) == WARM  # Too soon to leave WARM
+    clock.now += 30
+    assert device.update(20) == COOL
+
+
+def test_missing_readings_make_it_unknown():
+    clock = Clock()
+    device = machine(clock, unknown_policy="pause")
+    device.update(30)
+    for _ in range(3):
+        device.update(None)
+    assert device.state == UNKNOWN and not device.allows_work()
+    assert device.update(30) == COOL
+
+
+def test_time_in_states_adds_up():
+    clock = Clock()
+    device = machine(clock)
+    device.update(30)
+    clock.now += 40
+    device.update(60)
+    clock.now += 15
+    seconds = device.time_in_states()
+    assert seconds[COOL] == 40 and seconds[HOT] == 15
+
+
+def test_waiting_threads_count_once_per_device():
+    temperatures = {"disk": 60}
+    gate = ThermalGate({"disk": {"safe_temp": 40, "high_temp": 50, "min_dwell": 0}},
+                       sample=temperatures.__getitem__, poll_interval=0.02)
+    stop = threading.Event()
+    waiters = [threading.Thread(target=gate.wait_for, args=({"disk"}, stop)) for _ in range(4)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.3)
+    temperatures["disk"] = 20
+    for waiter in waiters:
+        waiter.join(5)
+    assert 0.25 < gate.device_wait_seconds()["disk"] < 0.9
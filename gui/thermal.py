@@ -0,0 +1,313 @@
+import os
+import threading
+import time
+
+# CoolSync Backup
+# Per-device temperature reading and thermal gating.
+# Every storage device has its own safe_temp/high_temp pair, and sync work only
+# waits on the devices it actually touches.
+
+DEFAULT_SAFE_TEMP = 31.0
+DEFAULT_HIGH_TEMP = 42.0
+DEFAULT_DEVICES = ["/dev/sda", "/dev/sdb"]
+POLL_INTERVAL = 5  # Seconds between smartctl reads while a device is hot
+DISPLAY_INTERVAL = 60  # Seconds between temperature display refreshes
+EMA_ALPHA = 0.3  # Weight of the newest reading in the smoothed temperature
+MIN_DWELL = 30  # Seconds a state must last before it may change (entering HOT is immediate)
+UNKNOWN_AFTER = 3  # Consecutive missing readings before a device becomes UNKNOWN
+UNKNOWN_POLICY = "hold"  # What UNKNOWN means: "hold" the last decision, "run" or "pause"
+
+COOL = "COOL"
+WARM = "WARM"
+HOT = "HOT"
+UNKNOWN = "UNKNOWN"
+STATES = (COOL, WARM, HOT, UNKNOWN)
+
+
+def default_device_settings(safe_temp=DEFAULT_SAFE_TEMP, high_temp=DEFAULT_HIGH_TEMP):
+    return {"mount": "", "safe_temp": safe_temp, "high_temp": high_temp}
+
+
+def run_smartctl_command(command, device_name):
+    import subprocess  # Deferred: only background samplers need it, not GUI startup
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        temperature = None
+        model_number = device_name  # Default to device name if model number is not found
+        for line in result.stdout.splitlines():
+            if "Temperature_Celsius" in line:
+                temp_str = line.split()[-1]
+                if temp_str == '-' or not temp_str.replace('.', '', 1).isdigit():
+                    continue
+                try:
+                    temperature = float(temp_str)
+                except ValueError:
+                    pass
+            elif device_name == "/dev/sda" and "Model Number" in line:
+                model_number = ' '.join(line.split()[2:])  # Extract model number for /dev/sda
+            elif device_name == "/dev/sdb" and "Device Model" in line:
+                model_number = ' '.join(line.split()[2:])  # Extract device model for /dev/sdb
+            elif "Temperature" in line:  # Try alternative keyword for temperature
+                temp_str = line.split()[-2]
+                if temp_str.isdigit():
+                    try:
+                        temperature = float(temp_str)
+                    except ValueError:
+                        pass
+        return temperature, model_number
+    except Exception as e:
+        print(f'Error fetching data with command {command}: {e}')
+    return None, device_name  # Default to device name if there's an error
+
+
+def read_device_temperature(device):
+    temp, _ = run_smartctl_command(["smartctl", "-A", device], device)
+    return temp
+
+
+def get_specific_device_temperatures(devices=DEFAULT_DEVICES):
+    temperatures = {}
+    for device in devices:
+        temp, model = run_smartctl_command(["smartctl", "-A", device], device)
+        if temp is None:
+            temperatures[model] = 'N/A'
+        else:
+            temperatures[model] = temp
+    return temperatures
+
+
+def _normalize_path(path):
+    return os.path.normcase(os.path.abspath(path)).replace('\\', '/').rstrip('/')
+
+
+def _block_device_for_path(path):
+    # Linux only: follow st_dev through sysfs to the whole disk (sda1 -> sda)
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    try:
+        st = os.stat(path)
+        node = os.path.realpath(f"/sys/dev/block/{os.major(st.st_dev)}:{os.minor(st.st_dev)}")
+    except (OSError, AttributeError):
+        return None
+    if not os.path.isdir(node):
+        return None
+    if os.path.exists(os.path.join(node, 'partition')):
+        node = os.path.dirname(node)
+    return "/dev/" + os.path.basename(node)
+
+
+def device_for_path(path, devices):
+    """
+    Return the configured device holding path, or None if it is not monitored.
+    The longest matching "mount" wins; on Linux, sysfs is used as a fallback.
+    """
+    target = _normalize_path(path)
+    best, best_len = None, -1
+    for device, settings in devices.items():
+        mount = settings.get('mount')
+        if not mount:
+            continue
+        mount = _normalize_path(mount)
+        if (target == mount or target.startswith(mount + '/') or mount == '') and len(mount) > best_len:
+            best, best_len = device, len(mount)
+    if best is None:
+        device = _block_device_for_path(path)
+        if device in devices:
+            best = device
+    return best
+
+
+class ThermalStateMachine:
+    """
+    COOL/WARM/HOT/UNKNOWN state of one device over EMA-smoothed readings.
+    A raw reading at or above high_temp makes it HOT at once. A device that
+    went HOT stays paused until its EMA is COOL again (hysteresis), and no
+    state is left before it has lasted min_dwell seconds.
+    """
+
+    def __init__(self, safe_temp, high_temp, alpha=EMA_ALPHA, min_dwell=MIN_DWELL,
+                 unknown_after=UNKNOWN_AFTER, unknown_policy=UNKNOWN_POLICY, clock=time.monotonic):
+        self.safe_temp = safe_temp
+        self.high_temp = high_temp
+        self.alpha = alpha
+        self.min_dwell = min_dwell
+        self.unknown_after = unknown_after
+        self.unknown_policy = unknown_policy
+        self.clock = clock
+        self.state = UNKNOWN
+        self.ema = None
+        self.missed = 0
+        self.held = False  # Paused until the device is COOL again
+        self.entered = clock()
+        self.state_seconds = dict.fromkeys(STATES, 0.0)
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        now = self.clock()
+        # Entering HOT and resolving UNKNOWN happen at once; everything else waits out the dwell
+        if state != HOT and self.state != UNKNOWN and state != UNKNOWN and now - self.entered < self.min_dwell:
+            return
+        self.state_seconds[self.state] += now - self.entered
+        self.state = state
+        self.entered = now
+        if state == HOT:
+            self.held = True
+        elif state == COOL:
+            self.held = False
+
+    def update(self, temp):
+        if temp is None:
+            self.missed += 1
+            if self.missed >= self.unknown_after:
+                self._transition(UNKNOWN)
+            return self.state
+        self.missed = 0
+        self.ema = temp if self.ema is None else self.alpha * temp + (1 - self.alpha) * self.ema
+        # A single raw reading at high_temp is enough to pause; smoothing only delays the way back
+        if temp >= self.high_temp or self.ema >= self.high_temp:
+            self._transition(HOT)
+        elif self.ema <= self.safe_temp:
+            self._transition(COOL)
+        elif self.state == HOT:
+            pass  # Still cooling down, stay HOT until safe_temp is reached
+        else:
+            self._transition(WARM)
+        return self.state
+
+    def hold_until_cool(self):
+        if self.state in (WARM, HOT):
+            self.held = True
+
+    def allows_work(self):
+        if self.state == UNKNOWN and self.unknown_policy == "run":
+            return True
+        if self.state == UNKNOWN and self.unknown_policy == "pause":
+            return False
+        return not self.held
+
+    def time_in_states(self):
+        seconds = dict(self.state_seconds)
+        seconds[self.state] += self.clock() - self.entered
+        return seconds
+
+
+class ThermalGate:
+    """
+    Shared view of device temperatures. Callers pass the set of devices an
+    operation touches and only wait while one of those devices is paused.
+    """
+
+    def __init__(self, devices, sample=read_device_temperature, poll_interval=POLL_INTERVAL):
+        self.devices = devices
+        self.sample = sample
+        self.poll_interval = poll_interval
+        self.temperatures = {device: None for device in devices}
+        self.machines = {device: ThermalStateMachine(
+            settings['safe_temp'], settings['high_temp'],
+            min_dwell=settings.get('min_dwell', MIN_DWELL),
+            unknown_policy=settings.get('unknown_policy', UNKNOWN_POLICY)) for device, settings in devices.items()}
+        # Wall clock per device during which at least one caller was blocked on it;
+        # several threads waiting at once count once, not once each
+        self.wait_seconds = dict.fromkeys(devices, 0.0)
+        self.waiters = dict.fromkeys(devices, 0)
+        self.blocked_since = {}  # Device -> when its first current waiter started waiting
+        self.last_refresh = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def device_for_path(self, path):
+        return device_for_path(path, self.devices)
+
+    def refresh(self, force=False):
+        # Only one thread runs smartctl at a time; the others keep the cached state
+        if not self.refresh_lock.acquire(blocking=force):
+            return
+        try:
+            now = time.monotonic()
+            if not force and self.last_refresh is not None and now - self.last_refresh < self.poll_interval:
+                return
+            readings = {device: self.sample(device) for device in self.devices}
+            self.last_refresh = time.monotonic()
+            with self.lock:
+                for device, temp in readings.items():
+                    self.temperatures[device] = temp
+                    self.machines[device].update(temp)
+        finally:
+            self.refresh_lock.release()
+
+    def begin_pass(self, devices=None):
+        # A new pass only starts on its devices once they are COOL
+        self.refresh(force=True)
+        with self.lock:
+            for device, machine in self.machines.items():
+                if devices is None or device in devices:
+                    machine.hold_until_cool()
+
+    def blocked(self, devices):
+        self.refresh()
+        with self.lock:
+            return {device for device in devices if device in self.machines and not self.machines[device].allows_work()}
+
+    def states(self):
+        with self.lock:
+            return {device: machine.state for device, machine in self.machines.items()}
+
+    def time_in_states(self):
+        with self.lock:
+            return {device: machine.time_in_states() for device, machine in self.machines.items()}
+
+    def device_wait_seconds(self):
+        with self.lock:
+            return self._wait_seconds()
+
+    def total_wait_seconds(self):
+        with self.lock:
+            return sum(self._wait_seconds().values())
+
+    def _wait_seconds(self):
+        # Caller holds self.lock; includes waits still going on
+        now = time.monotonic()
+        seconds = dict(self.wait_seconds)
+        for device, since in self.blocked_since.items():
+            seconds[device] += now - since
+        return seconds
+
+    def _waiting(self, started, stopped):
+        now = time.monotonic()
+        with self.lock:
+            for device in started:
+                self.waiters[device] += 1
+                if self.waiters[device] == 1:
+                    self.blocked_since[device] = now
+            for device in stopped:
+                self.waiters[device] -= 1
+                if self.waiters[device] == 0:
+                    self.wait_seconds[device] += now - self.blocked_since.pop(device)
+
+    def wait_for(self, devices, stop_event, on_pause=None, on_resume=None):
+        """
+        Block until none of devices is paused. Returns False if stop_event was set.
+        """
+        devices = {device for device in devices if device}
+        hot = self.blocked(devices)
+        if not hot:
+            return True
+        if on_pause:
+            on_pause(hot)
+        waiting = set()
+        try:
+            while hot:
+                self._waiting(hot - waiting, waiting - hot)
+                waiting = hot
+                if stop_event.wait(self.poll_interval):
+                    return False
+                hot = self.blocked(devices)
+        finally:
+            self._waiting((), waiting)
+        if on_resume:
+            on_resume(devices)
+        return True
@@ -0,0 +1,87 @@
+import queue
+import sys
+import time
+import traceback
+
+# CoolSync Backup
+# Main-thread-safe UI updates.
+# Worker threads never touch Tk widgets; they post events here and a single
+# root.after pump on the Tk main loop drains them once per frame.
+
+FRAME_INTERVAL_MS = 50  # 20 frames per second
+
+
+class UIBridge:
+    """
+    Hands events from worker threads to the Tk main loop.
+    Events of a coalesced kind (status text, temperatures) only deliver the
+    newest payload per frame; other kinds are delivered in order.
+    """
+
+    def __init__(self, root, frame_ms=FRAME_INTERVAL_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.events = queue.SimpleQueue()
+        self.handlers = {}
+        self.coalesced = set()
+        self.after_id = None
+        self.last_tick = None
+        self.worst_latency = 0.0  # Seconds from post() to the handler finishing
+        self.worst_stall = 0.0  # Seconds a frame started later than scheduled
+
+    def register(self, kind, handler, coalesce=True):
+        self.handlers[kind] = handler
+        if coalesce:
+            self.coalesced.add(kind)
+
+    def post(self, kind, payload=None):
+        # Safe from any thread
+        self.events.put((time.perf_counter(), kind, payload))
+
+    def start(self):
+        self.last_tick = time.perf_counter()
+        self.after_id = self.root.after(self.frame_ms, self.pump)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def pump(self):
+        started = time.perf_counter()
+        self.worst_stall = max(self.worst_stall, started - self.last_tick - self.frame_ms / 1000)
+        try:
+            self.drain()
+        finally:
+            # Whatever went wrong, the next frame must still come or the window freezes
+            self.last_tick = time.perf_counter()
+            self.after_id = self.root.after(self.frame_ms, self.pump)
+
+    def drain(self):
+        ordered = []
+        latest = {}
+        while True:
+            try:
+                posted, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind in self.coalesced:
+                # Keep the oldest post time so latency covers the events that were dropped
+                first_posted = latest[kind][0] if kind in latest else posted
+                latest[kind] = (first_posted, payload)
+            else:
+                ordered.append((posted, kind, payload))
+        ordered.extend((posted, kind, payload) for kind, (posted, payload) in latest.items())
+        for posted, kind, payload in ordered:
+            handler = self.handlers.get(kind)
+            if handler:
+                try:
+                    handler(payload)
+                except Exception:
+                    # One broken handler must not cost the other events of this frame
+                    print(f"UI handler for {kind!r} failed:", file=sys.stderr)
+                    traceback.print_exc()
+            self.worst_latency = max(self.worst_latency, time.perf_counter() - posted)
+
+    def latency_report(self):
+        return f"UI latency worst: {self.worst_latency * 1000:.0f} ms, main loop stall worst: {max(self.worst_stall, 0) * 1000:.0f} ms"